@@ -4,7 +4,9 @@
 # Orchestration layer for AI-powered command execution.
 #
 # Responsibilities:
+# - Run exact command names directly (fast path, no model / LLM)
 # - Route user intent via semantic router
+# - Split multi-intent prompts and run their commands concurrently
 # - Extract arguments via LLM (Groq)
 # - Execute ONLY registered commands
 # - Enforce safety + confirmation boundaries
@@ -17,18 +19,25 @@
 #
 # ============================================================
 
-from typing import List, Dict, Any
+import os
+import re
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from Core.command_contract import command_result
-from Core.Function_Router import route_command
+from Core.Function_Router import is_semantic_route, record_success, route_commands_detailed
 from Core.server_api import extract_arguments
-from Core.db_reader import get_function_schema
-from Core.db_writer import log_ai_decision
+from Core.db_reader import get_command_by_name, get_function_schema
+from Core.db_writer import TurnRecord, log_ai_decision
 
 from External_Commands import commands as external_commands
+from General_Commands import commands as general_commands
 
 
 # ============================================================
@@ -81,6 +90,33 @@ COMMAND_REGISTRY = {
 }
 
 
+# ============================================================
+# FAST PATH (EXACT COMMAND NAMES)
+# ============================================================
+# Input that starts with a shell command name ("weather London",
+# "github-repos") is parsed like RULE mode and executed directly:
+# no embedding, no schema-driven LLM extraction.
+#
+# General commands are the RULE-mode FUNCTION_MAP entries that
+# are not in COMMAND_REGISTRY.
+# ============================================================
+
+GENERAL_COMMANDS = {
+    "exit": general_commands.shell_exit,
+    "quit": general_commands.shell_exit,
+    "help": general_commands.shell_help,
+    "status": general_commands.shell_status,
+    "clear": general_commands.shell_clear,
+    "history": general_commands.shell_history,
+    "logs": general_commands.shell_logs,
+}
+
+# General commands take at most one positional argument
+GENERAL_MAX_ARGS = 1
+
+FAST_PATH_CONFIDENCE = 1.0
+
+
 # ============================================================
 # TOKENIZATION (AUXILIARY, EXPLAINABLE)
 # ============================================================
@@ -123,35 +159,325 @@ def execute_command(
         )
 
 
+def parse_fast_path(prompt: str) -> Optional[Dict[str, Any]]:
+    """
+    Recognize a prompt written as a shell command.
+
+    The first shlex token must be a command name and the argument
+    count must fit the command's schema, so natural sentences that
+    merely start with a command word ("open my downloads folder")
+    still go through the semantic router.
+
+    Returns:
+        {"command_name", "command_id", "args"} or None
+    """
+    try:
+        tokens = shlex.split(prompt)
+    except ValueError:
+        return None
+
+    if not tokens:
+        return None
+
+    command_name = tokens[0].lower()
+    args = tokens[1:]
+
+    if command_name in GENERAL_COMMANDS:
+        if len(args) > GENERAL_MAX_ARGS:
+            return None
+        return {"command_name": command_name, "command_id": None, "args": args}
+
+    if command_name not in COMMAND_REGISTRY:
+        return None
+
+    schema = get_command_by_name(command_name)
+    if not schema or len(args) > len(schema.get("schema_json") or {}):
+        return None
+
+    return {
+        "command_name": command_name,
+        "command_id": schema["command_id"],
+        "args": args,
+    }
+
+
+def run_fast_path(match: Dict[str, Any], context: Dict[str, Any]) -> Dict:
+    """
+    Execute a command recognized by parse_fast_path.
+    """
+    command_name = match["command_name"]
+
+    if command_name in GENERAL_COMMANDS:
+        result = GENERAL_COMMANDS[command_name](match["args"], context)
+    else:
+        result = execute_command(command_name, match["args"], context)
+
+    result["confidence"] = FAST_PATH_CONFIDENCE
+    return result
+
+
+# ============================================================
+# MULTI-INTENT SPLITTING
+# ============================================================
+# "check server state and show weather in Delhi" holds two
+# commands. The prompt is split on conjunctions, and the prompt
+# plus every segment are routed in one batched encode. The split
+# is kept only if every segment routes to a command on its own,
+# so "weather in Delhi and Mumbai" stays one intent.
+# ============================================================
+
+INTENT_SEPARATORS = re.compile(
+    r"\s*(?:;|&&|,?\s*\b(?:and then|and also|and|then)\b)\s*",
+    re.IGNORECASE
+)
+
+MAX_INTENTS = 4
+
+# Worker threads for independent commands of one prompt
+AI_MAX_WORKERS = int(os.getenv("AI_MAX_WORKERS", "4"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def split_intents(prompt: str) -> List[str]:
+    """
+    Candidate intent segments of a prompt.
+
+    Returns a single-element list when the prompt has no
+    separator or too many segments to be a command list.
+    """
+    segments = [
+        segment.strip(" ,.")
+        for segment in INTENT_SEPARATORS.split(prompt)
+    ]
+    segments = [segment for segment in segments if segment]
+
+    if len(segments) < 2 or len(segments) > MAX_INTENTS:
+        return [prompt]
+
+    return segments
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=AI_MAX_WORKERS,
+                    thread_name_prefix="ai-intent"
+                )
+    return _executor
+
+
+def combine_results(segments: List[str], results: List[Dict]) -> Dict:
+    """
+    Merge per-intent results into one command_result.
+
+    data["results"] keeps each command's own status, message and
+    confidence; the combined status is 'error' if any failed.
+    """
+    failed = sum(result.get("status") != "success" for result in results)
+
+    content: List[str] = []
+    effects: List[str] = []
+    per_command = []
+
+    for segment, result in zip(segments, results):
+        content.append(f"[{result.get('status')}] {segment}")
+        if result.get("message"):
+            content.append(result["message"])
+
+        lines = (result.get("data") or {}).get("content")
+        if isinstance(lines, list):
+            content.extend(str(line) for line in lines)
+        elif lines:
+            content.append(str(lines))
+
+        for effect in result.get("effects", []):
+            if effect not in effects:
+                effects.append(effect)
+
+        per_command.append({
+            "input": segment,
+            "status": result.get("status"),
+            "message": result.get("message"),
+            "confidence": result.get("confidence"),
+        })
+
+    confidences = [
+        result.get("confidence") for result in results
+        if result.get("confidence") is not None
+    ]
+
+    summary = f"Ran {len(results)} commands"
+    if failed:
+        summary += f" ({failed} failed)"
+
+    return command_result(
+        status="error" if failed else "success",
+        message=summary + ".",
+        data={"content": content, "results": per_command},
+        confidence=min(confidences) if confidences else None,
+        effects=effects
+    )
+
 # ============================================================
 # AI ENGINE (MAIN ENTRY POINT)
 # ============================================================
 
-def ai_engine(prompt: str, context: Dict[str, Any]) -> Dict:
+def _log_decision(
+    turn: Optional[TurnRecord],
+    session_id,
+    raw_input: str,
+    command_id,
+    decision: str,
+    confidence: float,
+    margin: float = None,
+    truncated_at: int = None,
+    reason: str = None
+):
+    """
+    Log an AI decision (even if rejected): into the turn's record
+    when CoreShell passed one, otherwise on its own.
+    """
+    try:
+        if turn is not None:
+            turn.add_decision(
+                chosen_command_id=command_id,
+                confidence=confidence,
+                decision_type=decision,
+                reason=reason,
+                margin=margin,
+                truncated_at=truncated_at,
+                raw_input=raw_input
+            )
+        else:
+            log_ai_decision(
+                session_id=session_id,
+                raw_input=raw_input,
+                chosen_command_id=command_id,
+                confidence=confidence,
+                decision_type=decision,
+                reason=reason,
+                margin=margin,
+                truncated_at=truncated_at
+            )
+    except Exception:
+        # Logging failure must NEVER break execution
+        pass
+
+
+def ai_engine(prompt: str, context: Dict[str, Any], turn: Optional[TurnRecord] = None) -> Dict:
     """
     Main AI orchestration entry point.
+
+    Decisions go into `turn` when given, so they commit together
+    with the rest of the shell turn.
     """
 
     session_id = context.get("session_id")
 
     # --------------------------------------------------------
-    # 1. Route intent (semantic)
+    # 0. Fast path (exact command name)
     # --------------------------------------------------------
-    command_id, decision, confidence = route_command(prompt)
-
-    # Log AI decision (even if rejected)
     try:
-        log_ai_decision(
-            session_id=session_id,
-            raw_input=prompt,
-            chosen_command_id=command_id,
-            confidence=confidence,
-            decision_type=decision,
-            reason=None
-        )
+        fast_path = parse_fast_path(prompt)
     except Exception:
-        # Logging failure must NEVER break execution
-        pass
+        # A failed lookup just means the semantic router decides
+        fast_path = None
+
+    if fast_path:
+        _log_decision(
+            turn,
+            session_id,
+            prompt,
+            fast_path["command_id"],
+            "FAST_PATH",
+            FAST_PATH_CONFIDENCE,
+            reason=f"exact command name: {fast_path['command_name']}"
+        )
+        return run_fast_path(fast_path, context)
+
+    # --------------------------------------------------------
+    # 1. Route intent(s) (semantic, one batched encode)
+    # --------------------------------------------------------
+    segments = split_intents(prompt)
+    queries = [prompt] + segments if len(segments) > 1 else [prompt]
+    routed = route_commands_detailed(queries)
+
+    if len(segments) > 1 and all(
+        command_id is not None and decision != "REJECT"
+        for command_id, decision, *_ in routed[1:]
+    ):
+        return run_intents(segments, routed[1:], context, turn)
+
+    _log_decision(turn, session_id, prompt, *routed[0])
+    return run_routed_command(prompt, routed[0], context)
+
+
+def run_intents(
+    segments: List[str],
+    routed: List[tuple],
+    context: Dict[str, Any],
+    turn: Optional[TurnRecord] = None
+) -> Dict:
+    """
+    Run independent intents of one prompt concurrently.
+
+    Argument extraction and execution are network-bound, so the
+    turn takes about as long as the slowest command, not the sum.
+    """
+    session_id = context.get("session_id")
+
+    for n, (segment, result) in enumerate(zip(segments, routed), start=1):
+        _log_decision(turn, session_id, segment, *result, reason=f"intent {n}/{len(segments)}")
+
+    executor = _get_executor()
+    futures = [
+        executor.submit(_timed_routed_command, segment, result, context)
+        for segment, result in zip(segments, routed)
+    ]
+
+    results = []
+    for segment, result, future in zip(segments, routed, futures):
+        duration_ms = None
+        try:
+            outcome, duration_ms = future.result()
+        except Exception as e:
+            outcome = command_result(
+                status="error",
+                message=f"Execution failed: {e}"
+            )
+        results.append(outcome)
+
+        # One execution row per intent, under the segment's text, so
+        # it lines up with the segment's decision
+        if turn is not None:
+            turn.add_execution(
+                raw_input=segment,
+                status=outcome.get("status"),
+                function_called="ai_engine",
+                command_id=result[0],
+                duration_ms=duration_ms
+            )
+
+    return combine_results(segments, results)
+
+
+def _timed_routed_command(prompt: str, routed: tuple, context: Dict[str, Any]):
+    started = time.perf_counter()
+    outcome = run_routed_command(prompt, routed, context)
+    return outcome, int((time.perf_counter() - started) * 1000)
+
+
+def run_routed_command(prompt: str, routed: tuple, context: Dict[str, Any]) -> Dict:
+    """
+    Resolve, confirm, extract arguments for and execute one routed
+    intent.
+    """
+    command_id, decision, confidence, *_ = routed
 
     if decision == "REJECT" or command_id is None:
         return command_result(
@@ -234,7 +560,17 @@ def ai_engine(prompt: str, context: Dict[str, Any]) -> Dict:
     )
 
     # --------------------------------------------------------
-    # 7. Attach AI confidence
+    # 7. Learn from the success (semantic routes only)
+    # --------------------------------------------------------
+    if result.get("status") == "success" and is_semantic_route(routed):
+        try:
+            record_success(prompt, command_id)
+        except Exception:
+            # Adaptation is best-effort, like logging
+            pass
+
+    # --------------------------------------------------------
+    # 8. Attach AI confidence
     # --------------------------------------------------------
     result["confidence"] = confidence
     return result
@@ -15,10 +15,11 @@
 # - Call AI or Chat engines
 # ============================================================
 
-from datetime import datetime
 from typing import Dict, Any, Optional
 import json
 
+from Core.timestamps import now_ms
+
 
 # ============================================================
 # CONTEXT CREATION
@@ -36,7 +37,7 @@ def create_context(
         "session_id": session_id,
         "user_name": user_name,
         "mode": initial_mode,
-        "start_time": datetime.now().isoformat(),
+        "start_time": now_ms(),
         "turn_id": 0,
         "memory": {
             "short_term": [],
@@ -7,8 +7,8 @@
 import os
 import sys
 import shlex
+import threading
 import time
-from datetime import datetime
 from pathlib import Path
 
 # ------------------------------------------------------------
@@ -29,12 +29,13 @@ sys.path.append(str(ROOT_DIR))
 # CORE MODULES
 # ------------------------------------------------------------
 from Core.db_init import init_db
+from Core.db_connection import checkpoint, start_wal_checkpointer
 from Core.db_writer import (
+    TurnRecord,
     log_session_start,
     log_session_end,
-    log_command_execution,
     log_error,
-    log_conversation_turn,
+    flush_logs,
 )
 from Core.command_contract import command_result
 from Core.ContextManager import (
@@ -42,6 +43,8 @@ from Core.ContextManager import (
     next_turn,
     set_mode,
     set_last_command,
+    set_flag,
+    get_flag,
     serialize_context,
 )
 
@@ -69,6 +72,9 @@ USER_NAME = os.getenv("USER_NAME", "user")
 DEFAULT_MODE = "rule"
 TYPING_SPEED = 0.003
 
+# Load the AI stack in the background at boot (set to 0 to disable)
+AI_WARMUP = os.getenv("AI_WARMUP", "1") == "1"
+
 # ------------------------------------------------------------
 # RULE MODE COMMAND MAP
 # ------------------------------------------------------------
@@ -158,6 +164,46 @@ def _flatten_output(result: dict) -> str:
     return "\n".join(lines).strip()
 
 
+# ============================================================
+# AI WARM-UP
+# ============================================================
+
+def start_ai_warmup(context: dict):
+    """
+    Import AICore and warm the router on a daemon thread.
+
+    Progress is tracked in the 'ai_warmup' context flag
+    (shown by 'status'). RULE mode never waits on it.
+    """
+    # Set before the thread starts so the flags dict never changes
+    # size while the main thread serializes it
+    set_flag(context, "ai_warmup", "starting")
+
+    def _run():
+        try:
+            set_flag(context, "ai_warmup", "importing AICore")
+            import AICore.AICore  # noqa: F401
+            from Core.Function_Router import warm_up
+
+            warm_up(progress=lambda stage: set_flag(context, "ai_warmup", stage))
+        except Exception as e:
+            set_flag(context, "ai_warmup", f"failed ({e})")
+
+    thread = threading.Thread(target=_run, name="ai-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_ai_warmup(context: dict, thread):
+    """
+    Block the first AI turn until warm-up has finished.
+    """
+    if thread is None or not thread.is_alive():
+        return
+
+    type_print(f"AI engine warming up ({get_flag(context, 'ai_warmup')})...")
+    thread.join()
+
 # ============================================================
 # MAIN LOOP
 # ============================================================
@@ -168,6 +214,7 @@ def main():
     # ---------------------------
     type_print("Initializing core systems...")
     init_db()
+    start_wal_checkpointer()
 
     context = create_context(
         session_id=int(time.time()),
@@ -180,6 +227,8 @@ def main():
     except Exception as e:
         type_print(f"Warning: session logging unavailable ({e})")
 
+    warmup_thread = start_ai_warmup(context) if AI_WARMUP else None
+
     type_print(f"Welcome, {context['user_name']}.")
     type_print("JaiShell is online.")
     type_print("Type 'help' to see available commands.\n")
@@ -188,6 +237,7 @@ def main():
     # INTERACTIVE LOOP
     # ---------------------------
     while True:
+        turn = None
         try:
             prompt_label = context["mode"].upper()
             raw_input = input(f"JaiShell [{prompt_label}] ▸ ").strip()
@@ -202,6 +252,11 @@ def main():
             if lowered == "mode ai":
                 set_mode(context, "ai")
                 type_print("Switched to AI mode.")
+                if warmup_thread is not None and warmup_thread.is_alive():
+                    type_print(
+                        f"AI engine still warming up "
+                        f"({get_flag(context, 'ai_warmup')})."
+                    )
                 continue
 
             if lowered == "mode rule":
@@ -218,6 +273,7 @@ def main():
             # TURN START
             # -----------------------
             turn_id = next_turn(context)
+            turn = TurnRecord(context["session_id"], turn_id, context["mode"], raw_input)
             result = None
             function_name = None
 
@@ -251,9 +307,10 @@ def main():
             # AI MODE
             # -----------------------
             elif context["mode"] == "ai":
+                wait_for_ai_warmup(context, warmup_thread)
                 from AICore.AICore import ai_engine
                 function_name = "ai_engine"
-                result = ai_engine(raw_input, context)
+                result = ai_engine(raw_input, context, turn=turn)
 
             # -----------------------
             # CHAT MODE
@@ -271,20 +328,15 @@ def main():
             # -----------------------
             # LOGGING
             # -----------------------
+            # Decision(s), execution, conversation row and error
+            # commit together as one transaction
             try:
-                log_command_execution(
-                    session_id=context["session_id"],
-                    raw_input=raw_input,
+                turn.set_execution(
                     status=result.get("status"),
-                    mode=context["mode"],
                     function_called=function_name,
                 )
 
-                log_conversation_turn(
-                    session_id=context["session_id"],
-                    turn_id=turn_id,
-                    mode=context["mode"],
-                    user_input=raw_input,
+                turn.set_conversation(
                     assistant_output=_flatten_output(result),
                     command_called=function_name,
                     status=result.get("status"),
@@ -292,17 +344,18 @@ def main():
                     context_snapshot=serialize_context(context),
                 )
 
+                if result.get("status") == "error":
+                    turn.add_error(
+                        "CommandError",
+                        result.get("message"),
+                        function_name or "unknown",
+                    )
+
+                turn.commit()
+
             except Exception as e:
                 type_print(f"Logging error: {e}")
 
-            if result.get("status") == "error":
-                log_error(
-                    context["session_id"],
-                    "CommandError",
-                    result.get("message"),
-                    function_name or "unknown",
-                )
-
             set_last_command(context, function_name)
 
             # -----------------------
@@ -315,26 +368,40 @@ def main():
                     print("\n" * 100)
 
         except KeyboardInterrupt:
+            # Ctrl-C mid-turn: keep what the turn already recorded
+            if turn is not None and not turn.committed:
+                turn.commit()
+            flush_logs()
             type_print("\nSession terminating.")
             break
 
         except Exception as e:
             type_print(f"Critical shell error: {e}")
-            log_error(
-                context["session_id"],
-                "CriticalCrash",
-                str(e),
-                "main_loop",
-            )
+
+            # Keep what the turn already logged next to its crash
+            if turn is not None and not turn.committed:
+                turn.add_error("CriticalCrash", str(e), "main_loop")
+                turn.commit()
+            else:
+                log_error(
+                    context["session_id"],
+                    "CriticalCrash",
+                    str(e),
+                    "main_loop",
+                )
 
     # ---------------------------
     # SHUTDOWN
     # ---------------------------
-    log_session_end(
-        context["session_id"],
-        graceful=True,
-        end_timestamp=datetime.now().isoformat(),
-    )
+    log_session_end(context["session_id"], graceful=True)
+
+    # Commit queued logs before the process exits, then fold them
+    # into the main database file
+    flush_logs()
+    try:
+        checkpoint()
+    except Exception:
+        pass
     type_print("Session closed.")
 
 # ============================================================
@@ -6,6 +6,8 @@
 # This module is responsible ONLY for:
 #   - Loading the sentence embedding model
 #   - Comparing user input against stored command embeddings
+#   - Fusing in lexical (BM25) matches from lexical_index.py
+#   - Applying per-user corrections from route_adaptation.py
 #   - Producing ranked routing decisions
 #
 # It does NOT:
@@ -15,16 +17,39 @@
 #   - Know anything about UX
 # ============================================================
 
-import json
 import os
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 
-from Core.db_connection import get_connection
+from Core.embedding_backend import EMBEDDING_BACKEND, backend_identity, load_embedding_model
+from Core.db_reader import (
+    get_command_adaptations,
+    get_command_texts,
+    get_routing_embedding_rows,
+    get_setting,
+)
+from Core.db_writer import save_command_adaptation
+from Core.embedding_codec import normalize_rows, pack_embedding, unpack_embedding
+from Core.command_index import (
+    CATALOG_GENERATION_KEY,
+    build_routing_matrix,
+    load_command_index,
+)
+from Core.query_cache import get_cached_embedding, store_embedding
+from Core.vector_index import ROUTER_INDEX, ExactIndex, create_index
+from Core.dim_reduction import RERANK_TOP, load_reduced_index
+from Core.embedding_daemon import daemon_adapt, daemon_encode, daemon_info, daemon_route
+from Core.lexical_index import (
+    LEXICAL_EARLY_EXIT,
+    LEXICAL_WEIGHT,
+    LexicalIndex,
+    fuse_scores,
+)
+from Core.route_adaptation import ADAPT_CANDIDATES, ADAPT_WEIGHT, AdaptationTable
 
 # ============================================================
 # MODEL CONFIGURATION (SINGLE SOURCE OF TRUTH)
@@ -33,90 +58,672 @@ from Core.db_connection import get_connection
 DEFAULT_MODEL_DIR = Path(__file__).resolve().parents[1] / "Finetuned-gte-large-en-v1.5"
 MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH", str(DEFAULT_MODEL_DIR))
 
-# Thresholds (explicit + explainable)
+# Thresholds (explicit + explainable). Defaults; values written to
+# the settings table by threshold_calibration.py override them
 AUTO_EXECUTE_THRESHOLD = 0.75
 CONFIRM_THRESHOLD = 0.60
 MIN_MARGIN = 0.08
 
+# settings key -> module threshold it overrides
+THRESHOLD_SETTINGS = {
+    "router_auto_execute_threshold": "AUTO_EXECUTE_THRESHOLD",
+    "router_confirm_threshold": "CONFIRM_THRESHOLD",
+    "router_min_margin": "MIN_MARGIN",
+}
+
+# Batch size for multi-query encodes (predict_intents / route_commands)
+ENCODE_BATCH_SIZE = int(os.getenv("ROUTER_ENCODE_BATCH_SIZE", "32"))
+
+# Tokens per encoded sequence (lowered to the model's own limit) and
+# sequences per query. Longer inputs are encoded as chunks and pooled;
+# whatever is pasted, one query costs at most
+# ROUTER_MAX_SEQ_LENGTH x ROUTER_MAX_CHUNKS tokens
+MAX_SEQ_LENGTH = int(os.getenv("ROUTER_MAX_SEQ_LENGTH", "128"))
+MAX_CHUNKS = int(os.getenv("ROUTER_MAX_CHUNKS", "4"))
+
+# [CLS] + [SEP] around every chunk
+SPECIAL_TOKENS = 2
+
+# Characters handed to the tokenizer at most (bounds tokenization too)
+MAX_QUERY_CHARS = MAX_SEQ_LENGTH * MAX_CHUNKS * 16
+
 # ============================================================
 # MODEL LOADING
 # ============================================================
 
-_model: SentenceTransformer | None = None
+_model = None
+_model_lock = threading.Lock()
 
-def get_model() -> SentenceTransformer:
+def get_model():
     """
-    Lazy-load the embedding model.
+    Lazy-load the embedding model on the configured backend
+    (EMBEDDING_BACKEND: torch | onnx | onnx-int8).
+
+    Guarded by a lock so a background warm-up and the first AI
+    turn never build two copies.
+
+    The sequence length is capped at ROUTER_MAX_SEQ_LENGTH, so no
+    single forward pass can exceed it.
     """
     global _model
     if _model is None:
-        _model = SentenceTransformer(
-            MODEL_PATH,
-            trust_remote_code=True
-        )
+        with _model_lock:
+            if _model is None:
+                _model = _cap_sequence_length(
+                    load_embedding_model(MODEL_PATH, EMBEDDING_BACKEND)
+                )
     return _model
 
+
+def _cap_sequence_length(model):
+    """
+    Limit `model` to ROUTER_MAX_SEQ_LENGTH tokens per sequence.
+    """
+    limit = getattr(model, "max_seq_length", None)
+    model.max_seq_length = min(limit or MAX_SEQ_LENGTH, MAX_SEQ_LENGTH)
+    return model
+
+def _model_identity() -> str:
+    """
+    Identity of the embedding model + backend, used to key cached
+    query vectors (an int8 vector must never be served to fp32).
+    """
+    return backend_identity(MODEL_PATH, EMBEDDING_BACKEND)
+
+
+def _query_cache_identity() -> str:
+    """
+    Model identity plus the truncation / chunking caps. A query's
+    vector depends on both, so a cap change must miss the cache.
+    """
+    return f"{_model_identity()}|seq={MAX_SEQ_LENGTH}x{MAX_CHUNKS}"
+
+
+# Encoder for query-cache misses inside the embedding daemon
+# (its batching queue); None everywhere else
+_uncached_encoder = None
+
+def set_uncached_encoder(encoder: Optional[Callable[[List[str]], np.ndarray]]):
+    """
+    Route every query-cache miss through `encoder` (None restores
+    the default: daemon if running, else the local model).
+    """
+    global _uncached_encoder
+    _uncached_encoder = encoder
+
+
+@lru_cache(maxsize=256)
+def _chunk_query(text: str, model=None):
+    """
+    Split a text into sequences the capped model encodes whole.
+
+    Only the first MAX_CHUNKS chunks are kept.
+
+    Returns:
+        (chunks, token counts, truncated_at) where truncated_at is
+        the number of tokens kept when the rest was dropped, else None
+    """
+    window = max(MAX_SEQ_LENGTH - SPECIAL_TOKENS, 1)
+
+    # Every token spans at least one byte: short texts need no tokenizer
+    if len(text.encode("utf-8")) <= window:
+        return (text,), (1,), None
+
+    tokenizer = getattr(model or get_model(), "tokenizer", None)
+    if tokenizer is None:
+        return (text,), (1,), None
+
+    ids = tokenizer(text[:MAX_QUERY_CHARS], add_special_tokens=False)["input_ids"]
+    kept = ids[:window * MAX_CHUNKS]
+
+    truncated_at = None
+    if len(kept) < len(ids) or len(text) > MAX_QUERY_CHARS:
+        truncated_at = len(kept)
+
+    if len(kept) <= window and truncated_at is None:
+        return (text,), (1,), None
+
+    chunks = [kept[start:start + window] for start in range(0, len(kept), window)]
+    return (
+        tuple(tokenizer.decode(chunk) for chunk in chunks),
+        tuple(len(chunk) for chunk in chunks),
+        truncated_at,
+    )
+
+
+# Truncation points of over-long texts encoded in this process,
+# taken by query_truncation (bounded: only truncated texts land here)
+_truncations = {}
+_truncations_lock = threading.Lock()
+MAX_PENDING_TRUNCATIONS = 256
+
+
+def query_truncation(query: str) -> Optional[int]:
+    """
+    Tokens of `query` that were encoded, if it was cut short
+    (ROUTER_MAX_SEQ_LENGTH x ROUTER_MAX_CHUNKS), otherwise None.
+
+    Only known where the query was just encoded in-process: query
+    cache hits and vectors from the embedding daemon's encode op
+    report None rather than loading the model to re-tokenize.
+    """
+    with _truncations_lock:
+        return _truncations.pop(query, None)
+
+
+def _encode_local(texts: List[str], model=None) -> np.ndarray:
+    """
+    Encode with the in-process model (or `model`, e.g. a benchmark
+    candidate already capped by _cap_sequence_length).
+
+    Texts longer than one sequence are encoded as chunks in the
+    same batch and pooled back into one vector, weighted by each
+    chunk's token count.
+    """
+    model = model or get_model()
+    plans = [_chunk_query(text, model) for text in texts]
+    flat = [chunk for chunks, _, _ in plans for chunk in chunks]
+
+    with _truncations_lock:
+        for text, (_, _, truncated_at) in zip(texts, plans):
+            if truncated_at is not None:
+                if len(_truncations) >= MAX_PENDING_TRUNCATIONS:
+                    _truncations.clear()
+                _truncations[text] = truncated_at
+
+    vectors = model.encode(
+        flat,
+        batch_size=ENCODE_BATCH_SIZE,
+        normalize_embeddings=True
+    )
+
+    if len(flat) == len(texts):
+        return vectors
+
+    weights = np.concatenate([counts for _, counts, _ in plans]).astype(np.float32)
+    starts = np.cumsum([0] + [len(chunks) for chunks, _, _ in plans[:-1]])
+
+    pooled = np.add.reduceat(np.asarray(vectors, dtype=np.float32) * weights[:, None], starts, axis=0)
+    return normalize_rows(pooled)
+
+
+def _encode_uncached(texts: List[str]) -> np.ndarray:
+    """
+    Encode texts that missed the query cache: on the embedding
+    daemon when one is running for this model, otherwise locally.
+    """
+    if _uncached_encoder is not None:
+        return _uncached_encoder(texts)
+
+    vectors = daemon_encode(texts, model_id=_query_cache_identity())
+    if vectors is not None:
+        return vectors
+
+    return _encode_local(texts)
+
+
+def _encode_queries(queries: List[str]) -> np.ndarray:
+    """
+    Encode many queries into an (n, dim) matrix.
+
+    Cached vectors skip the model entirely; all misses go through
+    a single batched encode call.
+    """
+    model_id = _query_cache_identity()
+
+    vectors: List[Optional[np.ndarray]] = [
+        get_cached_embedding(query, model_id) for query in queries
+    ]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+    if missing:
+        # Duplicates inside one batch are encoded once
+        unique = list(dict.fromkeys(queries[i] for i in missing))
+
+        encoded = np.asarray(_encode_uncached(unique), dtype=np.float32)
+
+        by_text = dict(zip(unique, encoded))
+        for text, vector in by_text.items():
+            store_embedding(text, model_id, vector)
+
+        for i in missing:
+            vectors[i] = by_text[queries[i]]
+
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+
+    return np.vstack(vectors)
+
+
+def _encode_query(query: str) -> np.ndarray:
+    """
+    Encode a single query, skipping the forward pass on cache hits.
+    """
+    return _encode_queries([query])[0]
+
 # ============================================================
 # EMBEDDING CACHE
 # ============================================================
 
 _cached_embeddings = None
+_cached_generation = None
+_embeddings_lock = threading.Lock()
+
+# Vector index over the cached matrix (ROUTER_INDEX: exact | ivf)
+_vector_index = None
+_vector_index_generation = None
+
+# Reduced-dimension projection of the cached matrix (ROUTER_REDUCED_DIM)
+_reduction = None
+_reduction_generation = None
+
+# Per-user corrections aligned with the cached matrix (ROUTER_ADAPT_WEIGHT)
+_adaptations = None
+_adaptations_generation = None
+
+def _catalog_generation():
+    """
+    Current catalog generation (bumped by seed_commands and
+    db_vector_manager whenever commands or embeddings change).
+
+    Returns None if it cannot be read; callers keep what they have.
+    """
+    try:
+        return int(get_setting(CATALOG_GENERATION_KEY, 0))
+    except Exception:
+        return None
+
+
+def _read_command_embeddings(generation):
+    """
+    Build (command_ids, command_names, matrix, row_offsets) for a
+    generation. The matrix stacks one row per description and per
+    example utterance; row_offsets marks where each command starts.
+
+    Prefers the prebuilt memory-mapped index (shared page cache,
+    no DB scan). Falls back to the database when the index is
+    missing or belongs to another catalog generation; BLOBs are
+    then decoded straight into one contiguous float32 matrix.
+
+    Either way the matrix has unit-length rows.
+    """
+    index = load_command_index(generation)
+    if index is not None:
+        return index
+
+    return build_routing_matrix(get_routing_embedding_rows())
+
 
 def _load_command_embeddings():
     """
-    Fetch and cache command embeddings from the database.
+    Return cached command embeddings, reloading them only when the
+    catalog generation has moved since they were loaded.
+
+    The staleness check is a single settings-row lookup, so a
+    long-lived shell picks up re-seeded or re-embedded commands on
+    its next turn without restarting.
     """
-    global _cached_embeddings
+    global _cached_embeddings, _cached_generation
 
-    if _cached_embeddings is not None:
+    generation = _catalog_generation()
+
+    if _cached_embeddings is not None and (
+        generation is None or generation == _cached_generation
+    ):
         return _cached_embeddings
 
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT
-                c.command_id,
-                c.command_name,
-                ce.embedding_json
-            FROM commands c
-            JOIN command_embeddings ce
-                ON c.command_id = ce.command_id
-            ORDER BY c.command_id ASC
-            """
-        )
-
-        rows = cur.fetchall()
-
-        if not rows:
-            _cached_embeddings = ([], [], np.array([], dtype="float32"))
-            return _cached_embeddings
-
-        command_ids = []
-        command_names = []
-        embeddings = []
-
-        for command_id, command_name, embedding_json in rows:
-            command_ids.append(command_id)
-            command_names.append(command_name)
-            embeddings.append(json.loads(embedding_json))
-
-        _cached_embeddings = (
-            command_ids,
-            command_names,
-            np.array(embeddings, dtype="float32")
-        )
+    with _embeddings_lock:
+        if _cached_embeddings is None or generation != _cached_generation:
+            _cached_embeddings = _read_command_embeddings(generation)
+            _cached_generation = generation
+            load_calibrated_thresholds()
 
-        return _cached_embeddings
+    return _cached_embeddings
+
+
+def load_calibrated_thresholds():
+    """
+    Apply thresholds stored by threshold_calibration.py.
+
+    Read whenever the command embeddings are (re)loaded. Missing or
+    unreadable values leave the current thresholds untouched.
+    """
+    for key, name in THRESHOLD_SETTINGS.items():
+        try:
+            value = get_setting(key)
+            if value is not None:
+                globals()[name] = float(value)
+        except Exception:
+            continue
+
+
+def invalidate_command_embeddings():
+    """
+    Force the next routing call to reload command embeddings.
+    """
+    global _cached_embeddings, _cached_generation, _vector_index, _lexical_index
+    global _reduction, _reduction_generation, _adaptations
+
+    with _embeddings_lock:
+        _cached_embeddings = None
+        _cached_generation = None
+        _vector_index = None
+        _lexical_index = None
+        _reduction = None
+        _reduction_generation = None
+        _adaptations = None
+
+
+def _get_vector_index(matrix: np.ndarray):
+    """
+    Index used to score the routing matrix, built lazily and kept
+    for as long as the cached embeddings stay current.
+
+    An approximate index that is missing or stale falls back to
+    the exact scan, so routing never depends on it existing.
+    """
+    global _vector_index, _vector_index_generation
+
+    with _embeddings_lock:
+        if (
+            _vector_index is None
+            or _vector_index.matrix is not matrix
+            or _vector_index_generation != _cached_generation
+        ):
+            _vector_index = create_index(ROUTER_INDEX, matrix, _cached_generation)
+            _vector_index_generation = _cached_generation
+
+        return _vector_index
+
+
+def _get_reduction(matrix: np.ndarray):
+    """
+    Reduced-dimension projection for the cached matrix, or None
+    when reduction is disabled or its file is missing or stale
+    (routing then scores the full vectors).
+    """
+    global _reduction, _reduction_generation
+
+    with _embeddings_lock:
+        if _reduction_generation != _cached_generation:
+            _reduction = load_reduced_index(_cached_generation, matrix.shape[0])
+            _reduction_generation = _cached_generation
+
+        return _reduction
+
+
+def _get_adaptations(command_ids, matrix: np.ndarray) -> AdaptationTable:
+    """
+    Per-user routing corrections for the cached matrix, read from
+    the database once per catalog generation. Afterwards this
+    process keeps them current itself (record_success).
+    """
+    global _adaptations, _adaptations_generation
+
+    with _embeddings_lock:
+        if (
+            _adaptations is None
+            or _adaptations_generation != _cached_generation
+            or _adaptations.dim != matrix.shape[1]
+        ):
+            try:
+                rows = [
+                    (command_id, unpack_embedding(centroid), hits)
+                    for command_id, centroid, hits
+                    in get_command_adaptations(_model_identity())
+                ]
+            except Exception:
+                rows = []
+
+            _adaptations = AdaptationTable(command_ids, matrix.shape[1], rows)
+            _adaptations_generation = _cached_generation
+
+        return _adaptations
+
+# ============================================================
+# LEXICAL INDEX
+# ============================================================
+
+_lexical_index = None
+_lexical_generation = None
+
+def _load_lexical_index() -> LexicalIndex:
+    """
+    BM25 index over the commands table, rebuilt only when the
+    catalog generation moves (same rule as the embedding cache).
+    """
+    global _lexical_index, _lexical_generation
+
+    generation = _catalog_generation()
+
+    if _lexical_index is not None and (
+        generation is None or generation == _lexical_generation
+    ):
+        return _lexical_index
+
+    with _embeddings_lock:
+        if _lexical_index is None or generation != _lexical_generation:
+            _lexical_index = LexicalIndex(get_command_texts())
+            _lexical_generation = generation
+
+    return _lexical_index
+
+
+def _lexical_scores(queries: List[str], command_ids) -> np.ndarray:
+    """
+    Squashed BM25 scores (q, n_commands), aligned with the routing
+    matrix's command order. Commands unknown to the lexical index
+    score 0.
+    """
+    lexical = _load_lexical_index()
+    command_ids = np.asarray(command_ids, dtype=np.int64)
+
+    scores = np.zeros((len(queries), len(command_ids)), dtype=np.float32)
+    if not len(lexical):
+        return scores
+
+    positions = np.searchsorted(lexical.command_ids, command_ids)
+    positions = np.minimum(positions, len(lexical) - 1)
+    known = lexical.command_ids[positions] == command_ids
+
+    for q, query in enumerate(queries):
+        scores[q, known] = lexical.normalized_scores(query)[positions[known]]
+
+    return scores
+
+
+def _lexical_shortcut(query: str):
+    """
+    (command_id, "AUTO_EXECUTE", confidence, None, None) when the
+    lexical index alone settles the query, otherwise None.
+
+    The decisive match still goes through the thresholds; only an
+    AUTO_EXECUTE skips the encode, anything else is routed
+    semantically. Costs a tokenization and a BM25 pass.
+
+    The margin is reported as None: BM25 scores are not on the
+    cosine scale, so calibration and adaptation skip these routes.
+    """
+    if not LEXICAL_EARLY_EXIT:
+        return None
 
-    finally:
-        conn.close()
+    ranked = _load_lexical_index().decisive_match(query)
+    if ranked is None:
+        return None
+
+    command_id, decision, confidence, _ = _decide_detailed(ranked)
+    if decision != "AUTO_EXECUTE":
+        return None
+    return command_id, decision, confidence, None, None
 
 # ============================================================
 # ROUTING CORE
 # ============================================================
 
+def _reduce_per_command(row_scores: np.ndarray, row_offsets: np.ndarray) -> np.ndarray:
+    """
+    Max-pool row scores into one score per command.
+
+    Rows of a command are contiguous, so a single
+    np.maximum.reduceat over the segment starts does the reduction
+    for every query at once, with no Python loop per command.
+    """
+    if len(row_offsets) == row_scores.shape[-1]:
+        # One row per command: nothing to pool
+        return row_scores
+
+    return np.maximum.reduceat(row_scores, row_offsets, axis=-1)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores along the last axis, best first.
+
+    Works on a single score vector (n,) or a batch (q, n).
+    np.argpartition selects the candidates in O(n); only those k
+    are then sorted.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    order = np.argsort(
+        -np.take_along_axis(scores, candidates, axis=-1),
+        axis=-1,
+        kind="stable"
+    )
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def _rerank_full(
+    scores: np.ndarray,
+    q_embeddings: np.ndarray,
+    matrix: np.ndarray,
+    row_offsets: np.ndarray,
+    n: int
+) -> np.ndarray:
+    """
+    Re-score the n best commands of a reduced-space scan with the
+    full vectors. Every other command is dropped (-inf).
+    """
+    candidates = _top_k(scores, n)
+    row_ends = np.r_[row_offsets[1:], matrix.shape[0]]
+
+    full = np.full(scores.shape, -np.inf, dtype=np.float32)
+    for q, commands in enumerate(candidates):
+        rows = np.concatenate([np.arange(row_offsets[c], row_ends[c]) for c in commands])
+
+        row_scores = np.full(matrix.shape[0], -np.inf, dtype=np.float32)
+        row_scores[rows] = matrix[rows] @ q_embeddings[q]
+        full[q] = _reduce_per_command(row_scores, row_offsets)
+
+    return full
+
+
+def rank_embeddings(
+    queries: List[str],
+    q_embeddings: np.ndarray,
+    top_k: int = 3,
+    routing=None,
+    reduction=None,
+    rerank_top: int = RERANK_TOP
+) -> List[List[Tuple[int, str, float]]]:
+    """
+    Rank commands for already-encoded queries.
+
+    Query vectors are scored against the stacked description +
+    example matrix through the vector index (one matrix-matrix
+    product for the exact scan). Both sides are unit-normalized,
+    so the product is the cosine similarity; each command then
+    keeps its best-matching row. Commands an approximate index
+    never visited are dropped from the ranking. A bounded BM25
+    boost (ROUTER_LEXICAL_WEIGHT) is added, then the best few
+    candidates get their per-user correction (ROUTER_ADAPT_WEIGHT).
+
+    With a reduced-dimension projection (ROUTER_REDUCED_DIM) the
+    scan runs in the reduced space and the best `rerank_top`
+    commands are re-scored with the full vectors.
+
+    `routing` overrides the cached (command_ids, command_names,
+    matrix, row_offsets), e.g. a catalog encoded by a candidate
+    model in the benchmark; it is always scanned exactly, never
+    adapted, and only reduced when `reduction` is passed explicitly.
+
+    Returns:
+        One list of (command_id, command_name, score) per query
+    """
+    adaptations = None
+
+    if routing is None:
+        command_ids, command_names, matrix, row_offsets = _load_command_embeddings()
+        if matrix.size:
+            index = _get_vector_index(matrix)
+            if reduction is None:
+                reduction = _get_reduction(matrix)
+            if ADAPT_WEIGHT > 0:
+                adaptations = _get_adaptations(command_ids, matrix)
+    else:
+        command_ids, command_names, matrix, row_offsets = routing
+        index = ExactIndex(matrix)
+
+    if matrix.size == 0:
+        return [[] for _ in queries]
+
+    if reduction is not None:
+        reduced = reduction.project(q_embeddings) @ reduction.matrix.T
+        scores = _reduce_per_command(reduced, row_offsets)
+        if rerank_top > 0:
+            scores = _rerank_full(
+                scores, q_embeddings, matrix, row_offsets, max(rerank_top, top_k)
+            )
+    else:
+        scores = _reduce_per_command(index.score(q_embeddings), row_offsets)
+
+    if LEXICAL_WEIGHT > 0:
+        scores = fuse_scores(scores, _lexical_scores(list(queries), command_ids))
+
+    if adaptations is not None and len(adaptations):
+        candidates = _top_k(scores, max(top_k, ADAPT_CANDIDATES))
+        scores = adaptations.apply(scores, q_embeddings, candidates)
+
+    top = _top_k(scores, top_k)
+
+    return [
+        [
+            (command_ids[i], command_names[i], float(row_scores[i]))
+            for i in row_top
+            if np.isfinite(row_scores[i])
+        ]
+        for row_scores, row_top in zip(scores, top)
+    ]
+
+
+def predict_intents(
+    queries: List[str],
+    top_k: int = 3
+) -> List[List[Tuple[int, str, float]]]:
+    """
+    Rank commands for many queries at once.
+
+    Queries are encoded in batches (cache misses only), then
+    ranked by rank_embeddings.
+
+    Returns:
+        One list of (command_id, command_name, score) per query
+    """
+    if not queries:
+        return []
+
+    q_embeddings = _encode_queries(list(queries))
+    return rank_embeddings(list(queries), q_embeddings, top_k=top_k)
+
+
 def predict_intent(query: str, top_k: int = 3) -> List[Tuple[int, str, float]]:
     """
     Rank commands by semantic similarity.
@@ -124,49 +731,206 @@ def predict_intent(query: str, top_k: int = 3) -> List[Tuple[int, str, float]]:
     Returns:
         List of (command_id, command_name, score)
     """
-    model = get_model()
-    q_embedding = model.encode(query, normalize_embeddings=True)
+    return predict_intents([query], top_k=top_k)[0]
+
+# ============================================================
+# WARM-UP
+# ============================================================
+
+def warm_up(progress: Optional[Callable[[str], None]] = None):
+    """
+    Pay every first-use cost ahead of the first AI turn:
+    model load, one dummy forward pass and the embedding matrix.
 
-    command_ids, command_names, command_embeddings = _load_command_embeddings()
+    When an embedding daemon serves this model nothing is loaded
+    in-process; routing goes through the daemon.
 
-    if command_embeddings.size == 0:
-        return []
+    `progress` receives a short stage name before each step and
+    "ready" once everything is loaded.
+    """
+    report = progress or (lambda stage: None)
 
-    scores = cosine_similarity(
-        [q_embedding],
-        command_embeddings
-    )[0]
+    info = daemon_info()
+    if info is not None and info.get("model_id") == _query_cache_identity():
+        report(f"ready (embedding daemon, pid {info.get('pid')})")
+        return
 
-    ranked = sorted(
-        zip(command_ids, command_names, scores),
-        key=lambda x: x[2],
-        reverse=True
-    )
+    report("loading model")
+    model = get_model()
+
+    # Bypasses the query cache on purpose: nothing worth keeping
+    report("first encode")
+    model.encode("warm up", normalize_embeddings=True)
 
-    return ranked[:top_k]
+    report("loading embeddings")
+    _load_command_embeddings()
+
+    report("ready")
 
 # ============================================================
 # DECISION LOGIC
 # ============================================================
 
-def route_command(query: str):
-    """
-    Determine routing action based on similarity confidence.
+def _decide_detailed(ranked: List[Tuple[int, str, float]]):
     """
-    ranked = predict_intent(query, top_k=2)
+    Apply confidence thresholds to a ranked candidate list.
 
+    Returns:
+        (command_id, decision, confidence, margin) where margin is
+        the lead of the best command over the runner-up
+    """
     if not ranked:
-        return None, "REJECT", 0.0
+        return None, "REJECT", 0.0, 0.0
 
     (cmd_id_1, _, score_1) = ranked[0]
     score_2 = ranked[1][2] if len(ranked) > 1 else 0.0
+    margin = score_1 - score_2
 
     # High confidence + clear margin
-    if score_1 >= AUTO_EXECUTE_THRESHOLD and (score_1 - score_2) >= MIN_MARGIN:
-        return cmd_id_1, "AUTO_EXECUTE", score_1
+    if score_1 >= AUTO_EXECUTE_THRESHOLD and margin >= MIN_MARGIN:
+        return cmd_id_1, "AUTO_EXECUTE", score_1, margin
 
     # Medium confidence
     if score_1 >= CONFIRM_THRESHOLD:
-        return cmd_id_1, "CONFIRM", score_1
+        return cmd_id_1, "CONFIRM", score_1, margin
+
+    return None, "REJECT", score_1, margin
+
+
+def _decide(ranked: List[Tuple[int, str, float]]):
+    """
+    Apply confidence thresholds to a ranked candidate list.
+    """
+    return _decide_detailed(ranked)[:3]
+
+
+def route_commands_detailed(queries: List[str]):
+    """
+    Route many queries with one batched encode and one scoring pass.
+
+    Queries settled by the lexical shortcut (ROUTER_LEXICAL_EARLY_EXIT)
+    are left out of the encode; the rest go to the embedding
+    daemon when one is running.
+
+    Returns:
+        One (command_id, decision, confidence, margin, truncated_at)
+        tuple per query; margin is None for lexical-shortcut routes
+        (see is_semantic_route), truncated_at is None unless the query
+        was cut to ROUTER_MAX_SEQ_LENGTH x ROUTER_MAX_CHUNKS tokens
+    """
+    results = [None] * len(queries)
+    semantic = []
+
+    for i, query in enumerate(queries):
+        shortcut = _lexical_shortcut(query)
+        if shortcut is not None:
+            results[i] = shortcut
+        else:
+            semantic.append(i)
+
+    if not semantic:
+        return results
+
+    pending = [queries[i] for i in semantic]
+
+    routed = daemon_route(pending, model_id=_query_cache_identity())
+    if routed is None:
+        routed = [
+            _decide_detailed(ranked) + (query_truncation(query),)
+            for query, ranked in zip(pending, predict_intents(pending, top_k=2))
+        ]
+
+    for i, result in zip(semantic, routed):
+        results[i] = result
+
+    return results
+
+
+def is_semantic_route(routed: tuple) -> bool:
+    """
+    True if a route_commands_detailed result was scored by the model.
+
+    Only those carry a cosine confidence and margin; lexical-shortcut
+    routes must not feed threshold calibration or record_success.
+    """
+    return routed[3] is not None
+
+
+def route_command_detailed(query: str):
+    """
+    route_command plus the top-1 / top-2 margin, logged for
+    threshold calibration, and the truncation point of an
+    over-long query.
+    """
+    return route_commands_detailed([query])[0]
+
+
+def route_command(query: str):
+    """
+    Determine routing action based on similarity confidence.
+
+    With ROUTER_LEXICAL_EARLY_EXIT=1, a query that decisively
+    names one command can be auto-executed from the lexical index
+    alone, before the model is consulted. The rest goes to the
+    embedding daemon when one is running.
+    """
+    return route_command_detailed(query)[:3]
+
+
+def route_commands(queries: List[str]):
+    """
+    Route many queries with one batched encode and one scoring pass.
+
+    Returns:
+        One (command_id, decision, confidence) tuple per query
+    """
+    return [result[:3] for result in route_commands_detailed(queries)]
+
+# ============================================================
+# ONLINE ADAPTATION
+# ============================================================
+
+def _record_success_local(query: str, command_id: int) -> bool:
+    command_ids, _, matrix, _ = _load_command_embeddings()
+    if matrix.size == 0:
+        return False
+
+    adaptations = _get_adaptations(command_ids, matrix)
+
+    # Only semantic routes get here (is_semantic_route), so the
+    # query was just encoded: a query-cache hit, not a forward pass
+    vector = _encode_query(query)
+
+    with _embeddings_lock:
+        updated = adaptations.update(command_id, vector)
+
+    if updated is None:
+        return False
+
+    mean, hits = updated
+    save_command_adaptation(int(command_id), _model_identity(), pack_embedding(mean), hits)
+    return True
+
+
+def record_success(query: str, command_id: int) -> bool:
+    """
+    Learn from a semantically routed query that executed
+    successfully: its vector moves command_id's correction.
+    Callers check is_semantic_route first; a lexical shortcut was
+    never encoded and says nothing about the embedding space.
+
+    Runs on the embedding daemon when one routes for this model
+    (so the daemon's scoring sees it); otherwise in-process.
+    Other shells pick the change up on their next catalog reload.
+
+    Returns:
+        True if a correction was updated
+    """
+    if ADAPT_WEIGHT <= 0 or command_id is None:
+        return False
+
+    adapted = daemon_adapt(query, command_id, model_id=_query_cache_identity())
+    if adapted is not None:
+        return adapted
 
-    return None, "REJECT", score_1
+    return _record_success_local(query, command_id)
@@ -0,0 +1,224 @@
+# ============================================================
+# command_index.py
+# ============================================================
+# Prebuilt on-disk embedding index for the semantic router.
+#
+# Layout (next to the database):
+#   command_index.<generation>.<token>.npy
+#                       - (rows, dim) float32 matrix, row-normalized
+#   command_index.json  - sidecar: format version, catalog
+#                         generation, the matrix file name, command
+#                         ids and names, and row_offsets (first
+#                         matrix row of each command; a command owns
+#                         every row up to the next offset)
+#
+# The matrix is opened with mmap_mode="r", so every shell process
+# on a host shares the same page-cache copy and startup does not
+# scan SQLite.
+#
+# Every write goes to a new matrix file and only the sidecar is
+# swapped. A file that running shells still have mapped is never
+# replaced (Windows refuses that); superseded files are deleted
+# on a best-effort basis and retried on the next write.
+#
+# This module is responsible ONLY for:
+#   - Stacking per-row vectors into the routing matrix
+#   - Writing the index files atomically
+#   - Opening and validating them
+#   - Advancing the catalog generation that readers validate against
+#
+# It does NOT generate embeddings or read the commands table.
+# ============================================================
+
+import json
+import os
+import uuid
+
+import numpy as np
+
+from Core.db_connection import BASE_DIR
+from Core.embedding_codec import normalize_rows, unpack_matrix
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+INDEX_FORMAT_VERSION = 3
+
+INDEX_SIDECAR_PATH = BASE_DIR / "command_index.json"
+
+# Matrix files live next to the sidecar, which names the current one
+INDEX_MATRIX_PATTERN = "command_index.*.npy"
+
+# Single matrix file of format version 2 (removed on the next write)
+LEGACY_MATRIX_NAME = "command_index.npy"
+
+# settings key bumped whenever stored embeddings change
+CATALOG_GENERATION_KEY = "catalog_generation"
+
+# ============================================================
+# CATALOG GENERATION
+# ============================================================
+
+def bump_catalog_generation(cur):
+    """
+    Advance the catalog generation inside the caller's transaction.
+
+    Called whenever commands or their embeddings change. Routers
+    compare it against their cached matrix and the index sidecar.
+    """
+    cur.execute(
+        """
+        INSERT INTO settings (key, value)
+        VALUES (?, '1')
+        ON CONFLICT(key) DO UPDATE SET
+            value = CAST(value AS INTEGER) + 1
+        """,
+        (CATALOG_GENERATION_KEY,)
+    )
+
+# ============================================================
+# MATRIX ASSEMBLY
+# ============================================================
+
+def build_routing_matrix(rows):
+    """
+    Stack (command_id, command_name, blob) rows into routing data.
+
+    Rows must be grouped by command (see get_routing_embedding_rows).
+
+    Returns:
+        (command_ids, command_names, matrix, row_offsets)
+    """
+    if not rows:
+        return [], [], np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.intp)
+
+    row_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    row_offsets = np.flatnonzero(np.r_[True, row_ids[1:] != row_ids[:-1]])
+
+    command_ids = [int(row_ids[i]) for i in row_offsets]
+    command_names = [rows[i][1] for i in row_offsets]
+    matrix = normalize_rows(unpack_matrix(row[2] for row in rows))
+
+    return command_ids, command_names, matrix, row_offsets.astype(np.intp)
+
+# ============================================================
+# WRITING
+# ============================================================
+
+def write_command_index(
+    command_ids,
+    command_names,
+    matrix: np.ndarray,
+    row_offsets,
+    generation: int,
+    model_path: str
+):
+    """
+    Persist the routing matrix and its sidecar.
+
+    Rows are normalized before writing, so readers can score with
+    a plain dot product straight off the memory map.
+
+    The matrix is written first, to a file name nobody has mapped
+    yet, and the sidecar last, so a reader never sees a sidecar
+    that describes a half-written matrix.
+    """
+    matrix = np.ascontiguousarray(normalize_rows(matrix), dtype="<f4")
+
+    if matrix.ndim != 2 or len(row_offsets) != len(command_ids):
+        raise ValueError("Index matrix shape does not match command list")
+
+    directory = INDEX_SIDECAR_PATH.parent
+    matrix_name = f"command_index.{int(generation)}.{uuid.uuid4().hex[:8]}.npy"
+
+    tmp_matrix = directory / f"{matrix_name}.tmp"
+    with open(tmp_matrix, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_matrix, directory / matrix_name)
+
+    sidecar = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "generation": int(generation),
+        "matrix_file": matrix_name,
+        "model_path": str(model_path),
+        "dtype": "float32",
+        "normalized": True,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "command_ids": [int(c) for c in command_ids],
+        "command_names": list(command_names),
+        "row_offsets": [int(o) for o in row_offsets],
+    }
+
+    tmp_sidecar = INDEX_SIDECAR_PATH.with_suffix(".json.tmp")
+    tmp_sidecar.write_text(json.dumps(sidecar), encoding="utf-8")
+    os.replace(tmp_sidecar, INDEX_SIDECAR_PATH)
+
+    remove_stale_matrices(keep=matrix_name)
+
+
+def remove_stale_matrices(keep: str = None):
+    """
+    Delete matrix files other than `keep`.
+
+    Best effort: a file still mapped by a running shell cannot be
+    deleted on Windows and is left for a later write.
+    """
+    directory = INDEX_SIDECAR_PATH.parent
+    candidates = list(directory.glob(INDEX_MATRIX_PATTERN))
+    candidates.append(directory / LEGACY_MATRIX_NAME)
+
+    for path in candidates:
+        if path.name == keep:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+# ============================================================
+# READING
+# ============================================================
+
+def load_command_index(expected_generation: int):
+    """
+    Open the prebuilt index if it matches the catalog generation.
+
+    Returns:
+        (command_ids, command_names, matrix, row_offsets) with matrix
+        memory-mapped read-only, or None if the index is missing,
+        stale or invalid.
+    """
+    if not INDEX_SIDECAR_PATH.exists():
+        return None
+
+    try:
+        sidecar = json.loads(INDEX_SIDECAR_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    if sidecar.get("format_version") != INDEX_FORMAT_VERSION:
+        return None
+
+    if sidecar.get("generation") != expected_generation:
+        return None
+
+    matrix_file = sidecar.get("matrix_file")
+    if not matrix_file:
+        return None
+
+    try:
+        matrix = np.load(INDEX_SIDECAR_PATH.parent / os.path.basename(matrix_file), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    if matrix.dtype != np.float32 or matrix.shape != (sidecar["count"], sidecar["dim"]):
+        return None
+
+    return (
+        sidecar["command_ids"],
+        sidecar["command_names"],
+        matrix,
+        np.asarray(sidecar["row_offsets"], dtype=np.intp),
+    )
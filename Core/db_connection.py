@@ -6,6 +6,9 @@
 # This module is responsible ONLY for:
 #   - Defining where the database lives
 #   - Creating safe, configured SQLite connections
+#   - Keeping one persistent connection per thread for the
+#     per-turn readers and writers
+#   - Applying the PRAGMA profile and checkpointing the WAL
 #
 # It must:
 #   - Have no side effects
@@ -15,7 +18,10 @@
 # All database access flows through this file.
 # ============================================================
 
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 # ============================================================
@@ -26,6 +32,89 @@ BASE_DIR = Path(__file__).resolve().parent
 DB_NAME = "Shell_Warehouse.db"
 DB_PATH = BASE_DIR / DB_NAME
 
+# ============================================================
+# PRAGMA PROFILES
+# ============================================================
+# Per-connection settings. The database runs in WAL mode
+# (db_init), where synchronous=NORMAL cannot corrupt it: a power
+# loss may only drop the last commits, while FULL pays an fsync
+# per commit to keep them.
+#
+#   synchronous         FULL: fsync every commit
+#                       NORMAL: fsync at checkpoints only
+#   cache_size          page cache per connection; negative = KiB
+#   mmap_size           bytes of the file read through mmap
+#                       (0 = plain reads)
+#   temp_store          MEMORY keeps temp tables / sort spill in RAM
+#   busy_timeout        ms to wait on a locked database
+#   journal_size_limit  bytes the -wal file is truncated back to
+#                       after a checkpoint
+#
+# Selected by DB_PRAGMA_PROFILE, else the settings key
+# 'db_pragma_profile', else DEFAULT_PRAGMA_PROFILE. The default
+# is "durability" (synchronous=FULL, as before profiles existed);
+# "throughput" is opt-in and trades the last commits on power
+# loss for fewer fsyncs.
+# ============================================================
+
+PRAGMA_PROFILES = {
+    "durability": {
+        "synchronous": "FULL",
+        "cache_size": -8000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 30000,
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+    "throughput": {
+        "synchronous": "NORMAL",
+        "cache_size": -32000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+        "journal_size_limit": 16 * 1024 * 1024,
+    },
+}
+
+DEFAULT_PRAGMA_PROFILE = "durability"
+PRAGMA_PROFILE_KEY = "db_pragma_profile"
+
+
+def _profile_name(conn) -> str:
+    """
+    Configured profile name; unknown names fall back to the default.
+    """
+    name = os.getenv("DB_PRAGMA_PROFILE")
+
+    if not name:
+        try:
+            row = conn.execute(
+                "SELECT value FROM settings WHERE key = ?",
+                (PRAGMA_PROFILE_KEY,)
+            ).fetchone()
+            name = row[0] if row else None
+        except sqlite3.Error:
+            # Fresh database: settings does not exist yet
+            name = None
+
+    name = (name or DEFAULT_PRAGMA_PROFILE).lower()
+    return name if name in PRAGMA_PROFILES else DEFAULT_PRAGMA_PROFILE
+
+
+def apply_pragma_profile(conn, name: str = None) -> str:
+    """
+    Apply a PRAGMA profile to a connection.
+
+    Returns the name of the profile applied.
+    """
+    name = name if name in PRAGMA_PROFILES else _profile_name(conn)
+
+    for pragma, value in PRAGMA_PROFILES[name].items():
+        # Drain result rows so no statement stays active
+        conn.execute(f"PRAGMA {pragma} = {value};").fetchall()
+
+    return name
+
 # ============================================================
 # CONNECTION FACTORY
 # ============================================================
@@ -36,6 +125,7 @@ def get_connection():
     Configuration applied:
     - Foreign key enforcement
     - WAL journal mode (handled in db_init)
+    - PRAGMA profile (durability | throughput)
     - Explicit timeout to avoid lock contention
     - Row factory disabled (explicit tuples for clarity)
     """
@@ -48,6 +138,8 @@ def get_connection():
         # Enforce relational integrity
         conn.execute("PRAGMA foreign_keys = ON;")
 
+        apply_pragma_profile(conn)
+
         return conn
 
     except sqlite3.Error as e:
@@ -55,3 +147,137 @@ def get_connection():
         raise ConnectionError(
             f"Failed to connect to database at {DB_PATH}: {e}"
         )
+
+# ============================================================
+# PER-THREAD PERSISTENT CONNECTIONS
+# ============================================================
+# A shell turn touches the database several times (decision,
+# schema, execution, conversation, errors). Opening a connection
+# for each costs a connect + PRAGMA and throws away SQLite's page
+# cache on every close, so readers and writers share one
+# long-lived connection per thread instead.
+#
+# SQLite connections must not cross threads, which is why the
+# "pool" is thread-local: worker threads (AI multi-intent pool,
+# warm-up, daemon handlers) each get their own on first use.
+# ============================================================
+
+_local = threading.local()
+
+
+def _thread_connection():
+    """
+    The calling thread's connection, opened on first use.
+
+    Reopened when DB_PATH changes or after a fork (a connection
+    must never be shared with a child process).
+    """
+    conn = getattr(_local, "conn", None)
+    key = (str(DB_PATH), os.getpid())
+
+    if conn is not None and _local.key == key:
+        return conn
+
+    if conn is not None and _local.key[1] == os.getpid():
+        conn.close()
+
+    conn = get_connection()
+    _local.conn = conn
+    _local.key = key
+    return conn
+
+
+@contextmanager
+def connection():
+    """
+    Borrow the calling thread's persistent connection.
+
+    Leaving the block commits any open transaction; an exception
+    rolls it back. The connection stays open for the next caller
+    on this thread.
+
+    Blocks do not merge into one transaction: an inner block
+    commits what the outer one wrote so far.
+    """
+    conn = _thread_connection()
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    else:
+        if conn.in_transaction:
+            conn.commit()
+
+
+def close_thread_connection():
+    """
+    Close the calling thread's persistent connection, if any.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+# ============================================================
+# WAL CHECKPOINTS
+# ============================================================
+# SQLite only checkpoints when a commit pushes the -wal file past
+# wal_autocheckpoint pages, and never while a reader holds an old
+# snapshot, so the file can keep growing in a long session.
+# A background thread runs a PASSIVE checkpoint every
+# DB_CHECKPOINT_SECONDS: it copies what it can without waiting on
+# readers or blocking writers, and journal_size_limit then
+# truncates the file.
+# ============================================================
+
+CHECKPOINT_INTERVAL = float(os.getenv("DB_CHECKPOINT_SECONDS", "30"))
+
+_checkpointer = None
+
+
+def checkpoint(mode: str = "PASSIVE"):
+    """
+    Checkpoint the WAL on the calling thread's connection.
+
+    Returns:
+        (busy, wal_frames, checkpointed_frames) as reported by SQLite
+    """
+    with connection() as conn:
+        return conn.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+
+
+def _checkpoint_loop(stop: threading.Event, interval: float):
+    while not stop.wait(interval):
+        try:
+            checkpoint("PASSIVE")
+        except sqlite3.Error:
+            # Busy or locked: the next round tries again
+            continue
+
+
+def start_wal_checkpointer(interval: float = CHECKPOINT_INTERVAL):
+    """
+    Start the background checkpoint thread (once per process).
+
+    Returns the Event that stops it, or None when disabled
+    (interval <= 0).
+    """
+    global _checkpointer
+
+    if interval <= 0:
+        return None
+
+    if _checkpointer is None:
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=_checkpoint_loop,
+            args=(stop, interval),
+            name="wal-checkpoint",
+            daemon=True
+        )
+        thread.start()
+        _checkpointer = stop
+
+    return _checkpointer
@@ -6,11 +6,12 @@
 # This module is responsible ONLY for:
 #   - Creating the database schema
 #   - Ensuring tables, constraints, and indexes exist
+#   - Migrating older databases to the current schema
 #
 # It must be:
 #   - Safe to run multiple times
 #   - Free of business logic
-#   - Free of data mutation beyond schema creation
+#   - Free of data mutation beyond schema creation / migration
 #
 # Any logic beyond schema definition does NOT belong here.
 # ============================================================
@@ -23,14 +24,16 @@ from Core.db_connection import DB_PATH, get_connection
 # ============================================================
 SCHEMA_SQL = """
 
+-- All timestamps are INTEGER epoch milliseconds (timestamps.py).
+
 -- ============================================================
 -- 1. Sessions
 -- Tracks individual shell lifecycles.
 -- ============================================================
 CREATE TABLE IF NOT EXISTS sessions (
     session_id INTEGER PRIMARY KEY,
-    start_timestamp TEXT NOT NULL,
-    end_timestamp TEXT,
+    start_timestamp INTEGER NOT NULL,
+    end_timestamp INTEGER,
     grace_termination BOOLEAN DEFAULT 0
 );
 
@@ -51,10 +54,13 @@ CREATE TABLE IF NOT EXISTS commands (
 -- ============================================================
 -- 3. Command Embeddings
 -- Semantic representation for AI routing.
+-- Vectors are packed float32 BLOBs (see embedding_codec.py).
 -- ============================================================
 CREATE TABLE IF NOT EXISTS command_embeddings (
     command_id INTEGER PRIMARY KEY,
-    embedding_json TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    content_hash TEXT,
+    model_version TEXT,
     FOREIGN KEY (command_id) REFERENCES commands (command_id)
 );
 
@@ -70,7 +76,8 @@ CREATE TABLE IF NOT EXISTS command_executions (
     status TEXT NOT NULL,
     mode TEXT NOT NULL,
     function_called TEXT,
-    timestamp TEXT NOT NULL,
+    duration_ms INTEGER,
+    timestamp INTEGER NOT NULL,
     FOREIGN KEY (session_id) REFERENCES sessions (session_id),
     FOREIGN KEY (command_id) REFERENCES commands (command_id)
 );
@@ -85,9 +92,12 @@ CREATE TABLE IF NOT EXISTS ai_decisions (
     raw_input TEXT NOT NULL,
     chosen_command_id INTEGER,
     confidence REAL,
+    margin REAL,
     decision_type TEXT NOT NULL,
     reason TEXT,
-    timestamp TEXT NOT NULL,
+    truncated_at INTEGER,
+    turn_id INTEGER,
+    timestamp INTEGER NOT NULL,
     FOREIGN KEY (session_id) REFERENCES sessions (session_id),
     FOREIGN KEY (chosen_command_id) REFERENCES commands (command_id)
 );
@@ -102,7 +112,7 @@ CREATE TABLE IF NOT EXISTS errors (
     error_name TEXT NOT NULL,
     error_description TEXT,
     origin_function TEXT,
-    timestamp TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
     FOREIGN KEY (session_id) REFERENCES sessions (session_id)
 );
 
@@ -140,25 +150,88 @@ CREATE TABLE IF NOT EXISTS conversation_history (
     status TEXT,
     confidence REAL,
     context_snapshot TEXT,
-    timestamp TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
     FOREIGN KEY (session_id) REFERENCES sessions (session_id)
 );
 
+-- ============================================================
+-- 10. Query Embedding Cache
+-- Router-side cache of encoded AI-mode queries.
+-- Keyed on normalized query text + model identity.
+-- ============================================================
+CREATE TABLE IF NOT EXISTS query_embedding_cache (
+    cache_key TEXT PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    query_text TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    created_at INTEGER NOT NULL
+);
+
+-- ============================================================
+-- 11. Command Examples
+-- Paraphrase utterances per command (seeded).
+-- ============================================================
+CREATE TABLE IF NOT EXISTS command_examples (
+    example_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command_id INTEGER NOT NULL,
+    utterance TEXT NOT NULL,
+    UNIQUE (command_id, utterance),
+    FOREIGN KEY (command_id) REFERENCES commands (command_id)
+);
+
+-- ============================================================
+-- 12. Command Example Embeddings
+-- One vector per example; stacked with description vectors
+-- into the routing matrix and max-pooled per command.
+-- ============================================================
+CREATE TABLE IF NOT EXISTS command_example_embeddings (
+    example_id INTEGER PRIMARY KEY,
+    embedding BLOB NOT NULL,
+    content_hash TEXT,
+    model_version TEXT,
+    FOREIGN KEY (example_id) REFERENCES command_examples (example_id)
+        ON DELETE CASCADE
+);
+
+-- ============================================================
+-- 13. Command Adaptations
+-- Per-user routing corrections: running mean of the query
+-- vectors that successfully executed each command, per model.
+-- ============================================================
+CREATE TABLE IF NOT EXISTS command_adaptations (
+    command_id INTEGER NOT NULL,
+    model_id TEXT NOT NULL,
+    centroid BLOB NOT NULL,
+    hits INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (command_id, model_id),
+    FOREIGN KEY (command_id) REFERENCES commands (command_id)
+        ON DELETE CASCADE
+);
+
 -- ============================================================
 -- INDEXES
 -- ============================================================
 
--- Command executions
-CREATE INDEX IF NOT EXISTS idx_exec_session
-    ON command_executions (session_id);
+-- Per-session lookups and per-session time windows
+CREATE INDEX IF NOT EXISTS idx_exec_session_time
+    ON command_executions (session_id, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_error_session_time
+    ON errors (session_id, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_ai_session_time
+    ON ai_decisions (session_id, timestamp);
 
--- Errors
-CREATE INDEX IF NOT EXISTS idx_error_session
-    ON errors (session_id);
+-- Time windows across all sessions (analytics)
+CREATE INDEX IF NOT EXISTS idx_exec_time
+    ON command_executions (timestamp);
 
--- AI decisions
-CREATE INDEX IF NOT EXISTS idx_ai_session
-    ON ai_decisions (session_id);
+CREATE INDEX IF NOT EXISTS idx_error_time
+    ON errors (timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_ai_time
+    ON ai_decisions (timestamp);
 
 -- Conversation history lookups
 CREATE INDEX IF NOT EXISTS idx_conversation_session
@@ -171,12 +244,250 @@ CREATE INDEX IF NOT EXISTS idx_conversation_turn
 CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_session_turn
     ON conversation_history (session_id, turn_id);
 
+-- Examples per command
+CREATE INDEX IF NOT EXISTS idx_examples_command
+    ON command_examples (command_id);
+
+-- Query cache pruning (oldest first)
+CREATE INDEX IF NOT EXISTS idx_query_cache_created
+    ON query_embedding_cache (created_at);
+
 -- Optimize session resume / lookup
 CREATE INDEX IF NOT EXISTS idx_sessions_start_time
     ON sessions (start_timestamp);
 
 """
 
+# ============================================================
+# SCHEMA MIGRATIONS
+# ============================================================
+# Each migration upgrades an existing database by one version.
+# The applied version is tracked in PRAGMA user_version.
+# Migrations must be idempotent: a fresh database already has
+# the current schema and simply gets its version stamped.
+# ============================================================
+
+def _table_columns(cursor, table: str):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _migrate_embeddings_to_blob(cursor):
+    """
+    v1: command_embeddings.embedding_json (JSON text)
+        -> command_embeddings.embedding (packed float32 BLOB)
+    """
+    if "embedding_json" not in _table_columns(cursor, "command_embeddings"):
+        return
+
+    import json
+    from Core.embedding_codec import pack_embedding
+
+    cursor.execute(
+        """
+        CREATE TABLE command_embeddings_v1 (
+            command_id INTEGER PRIMARY KEY,
+            embedding BLOB NOT NULL,
+            FOREIGN KEY (command_id) REFERENCES commands (command_id)
+        )
+        """
+    )
+
+    cursor.execute("SELECT command_id, embedding_json FROM command_embeddings")
+    rows = cursor.fetchall()
+
+    cursor.executemany(
+        "INSERT INTO command_embeddings_v1 (command_id, embedding) VALUES (?, ?)",
+        [
+            (command_id, pack_embedding(json.loads(embedding_json)))
+            for command_id, embedding_json in rows
+        ]
+    )
+
+    cursor.execute("DROP TABLE command_embeddings")
+    cursor.execute("ALTER TABLE command_embeddings_v1 RENAME TO command_embeddings")
+
+
+def _migrate_embedding_provenance(cursor):
+    """
+    v2: command_embeddings gains content_hash + model_version, used
+        by db_vector_manager for incremental regeneration. Existing
+        rows keep NULLs and are re-embedded on the next run.
+    """
+    columns = _table_columns(cursor, "command_embeddings")
+
+    if "content_hash" not in columns:
+        cursor.execute("ALTER TABLE command_embeddings ADD COLUMN content_hash TEXT")
+
+    if "model_version" not in columns:
+        cursor.execute("ALTER TABLE command_embeddings ADD COLUMN model_version TEXT")
+
+
+def _migrate_decision_margin(cursor):
+    """
+    v3: ai_decisions gains margin (top-1 minus top-2 score), used by
+        threshold_calibration.py. Older rows keep NULL.
+    """
+    if "margin" not in _table_columns(cursor, "ai_decisions"):
+        cursor.execute("ALTER TABLE ai_decisions ADD COLUMN margin REAL")
+
+
+def _migrate_decision_truncation(cursor):
+    """
+    v4: ai_decisions gains truncated_at (tokens the router encoded
+        from an over-long input). Older rows keep NULL.
+    """
+    if "truncated_at" not in _table_columns(cursor, "ai_decisions"):
+        cursor.execute("ALTER TABLE ai_decisions ADD COLUMN truncated_at INTEGER")
+
+
+def _migrate_execution_duration(cursor):
+    """
+    v5: command_executions gains duration_ms (wall time of the turn,
+        written by TurnRecord). Older rows keep NULL.
+    """
+    if "duration_ms" not in _table_columns(cursor, "command_executions"):
+        cursor.execute("ALTER TABLE command_executions ADD COLUMN duration_ms INTEGER")
+
+
+EPOCH_MS_COLUMNS = {
+    "sessions": ("start_timestamp", "end_timestamp"),
+    "command_executions": ("timestamp",),
+    "ai_decisions": ("timestamp",),
+    "errors": ("timestamp",),
+    "conversation_history": ("timestamp",),
+    "query_embedding_cache": ("created_at",),
+    "command_adaptations": ("updated_at",),
+}
+
+
+def _column_types(cursor, table: str):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1]: row[2].upper() for row in cursor.fetchall()}
+
+
+def _migrate_timestamps_to_epoch_ms(cursor):
+    """
+    v6: ISO-8601 TEXT timestamps -> INTEGER epoch milliseconds.
+
+        SQLite cannot change a column's type in place, so each
+        affected table is rebuilt from its SCHEMA_SQL definition and
+        its rows copied across with the timestamps converted (naive
+        ISO text is local time). Values that cannot be parsed become
+        NULL, or 0 in NOT NULL columns. Indexes dropped with the old
+        tables are recreated by init_db.
+    """
+    import re
+    from Core.timestamps import to_epoch_ms
+
+    cursor.connection.create_function(
+        "to_epoch_ms", 1, to_epoch_ms, deterministic=True
+    )
+
+    for table, ts_columns in EPOCH_MS_COLUMNS.items():
+        types = _column_types(cursor, table)
+        if all(types.get(column) == "INTEGER" for column in ts_columns):
+            continue
+
+        create = re.search(
+            rf"CREATE TABLE IF NOT EXISTS {table} \(.*?\n\);",
+            SCHEMA_SQL,
+            re.DOTALL
+        ).group(0)
+        rebuilt = f"{table}_v6"
+
+        cursor.execute(
+            create.replace(f"IF NOT EXISTS {table} (", f"{rebuilt} (", 1)
+        )
+
+        cursor.execute(f"PRAGMA table_info({rebuilt})")
+        not_null = {row[1]: bool(row[3]) for row in cursor.fetchall()}
+
+        columns = [column for column in types if column in not_null]
+        select = []
+        for column in columns:
+            if column not in ts_columns:
+                select.append(column)
+            elif not_null[column]:
+                select.append(f"COALESCE(to_epoch_ms({column}), 0)")
+            else:
+                select.append(f"to_epoch_ms({column})")
+
+        cursor.execute(
+            f"INSERT INTO {rebuilt} ({', '.join(columns)}) "
+            f"SELECT {', '.join(select)} FROM {table}"
+        )
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {rebuilt} RENAME TO {table}")
+
+    # Replaced by the (session_id, timestamp) indexes
+    for index in ("idx_exec_session", "idx_error_session", "idx_ai_session"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def _migrate_decision_turn(cursor):
+    """
+    v7: ai_decisions gains turn_id, which tells the intents of one
+        multi-intent turn apart from a re-phrased follow-up query
+        (threshold_calibration.py). Older rows keep NULL.
+    """
+    if "turn_id" not in _table_columns(cursor, "ai_decisions"):
+        cursor.execute("ALTER TABLE ai_decisions ADD COLUMN turn_id INTEGER")
+
+
+MIGRATIONS = [
+    (1, _migrate_embeddings_to_blob),
+    (2, _migrate_embedding_provenance),
+    (3, _migrate_decision_margin),
+    (4, _migrate_decision_truncation),
+    (5, _migrate_execution_duration),
+    (6, _migrate_timestamps_to_epoch_ms),
+    (7, _migrate_decision_turn),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def _apply_migrations(conn):
+    """
+    Run every migration newer than the database's user_version.
+    Each migration runs in its own transaction.
+
+    Foreign keys are off while migrating (table rebuilds drop
+    parent tables) and checked once all migrations are done.
+
+    Returns:
+        True if any migration ran
+    """
+    cursor = conn.cursor()
+    current = cursor.execute("PRAGMA user_version").fetchall()[0][0]
+
+    pending = [(v, m) for v, m in MIGRATIONS if current < v]
+    if not pending:
+        return False
+
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for version, migration in pending:
+            cursor.execute("BEGIN")
+            try:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            print(f"Database migrated to schema version {version}.")
+
+        violations = cursor.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            print(f"Warning: {len(violations)} foreign key violation(s) after migration.")
+    finally:
+        cursor.execute("PRAGMA foreign_keys = ON")
+
+    return True
+
 # ============================================================
 # INITIALIZATION ROUTINE
 # ============================================================
@@ -187,6 +498,7 @@ def init_db():
     This function:
     - Enables SQLite foreign key enforcement
     - Creates all tables and indexes if missing
+    - Applies pending schema migrations
     - Is safe to run multiple times
     """
     print(f"Initializing database at: {DB_PATH}")
@@ -198,12 +510,19 @@ def init_db():
 
         # Ensure SQLite behaves correctly
         cursor.execute("PRAGMA foreign_keys = ON;")
-        cursor.execute("PRAGMA journal_mode = WAL;")
+        # Drain the result row so the statement does not stay
+        # active (an active statement blocks DROP TABLE in migrations)
+        cursor.execute("PRAGMA journal_mode = WAL;").fetchall()
 
         # Apply schema
         cursor.executescript(SCHEMA_SQL)
         conn.commit()
 
+        # Table rebuilds drop their indexes: re-apply the schema
+        if _apply_migrations(conn):
+            cursor.executescript(SCHEMA_SQL)
+            conn.commit()
+
         print("Database schema ready.")
 
     except sqlite3.Error as e:
@@ -14,10 +14,13 @@
 # - No business logic
 # - No AI reasoning
 # - No schema mutation
+# - Reads of logged tables flush the write-behind queue first
+#   (a turn always sees its own logs)
 # ============================================================
 
 import json
-from Core.db_connection import get_connection
+from Core.db_connection import connection
+from Core.db_writer import flush_logs
 
 # ============================================================
 # SESSION & STATS
@@ -27,21 +30,18 @@ def get_total_sessions():
     """
     Return total number of recorded sessions.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute("SELECT COUNT(*) FROM sessions")
         return cur.fetchone()[0]
-    finally:
-        conn.close()
 
 
 def get_session_stats(session_id: int):
     """
     Return basic statistics for a given session.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -55,8 +55,6 @@ def get_session_stats(session_id: int):
         return {
             "command_count": command_count
         }
-    finally:
-        conn.close()
 
 # ============================================================
 # COMMAND HISTORY (GLOBAL)
@@ -66,8 +64,8 @@ def get_recent_commands(limit: int = 10):
     """
     Fetch recent command executions across all sessions.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -83,16 +81,14 @@ def get_recent_commands(limit: int = 10):
             (limit,),
         )
         return cur.fetchall()
-    finally:
-        conn.close()
 
 
 def get_session_commands(session_id: int, limit: int = 20):
     """
     Fetch command executions for a specific session.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -109,8 +105,6 @@ def get_session_commands(session_id: int, limit: int = 20):
             (session_id, limit),
         )
         return cur.fetchall()
-    finally:
-        conn.close()
 
 # ============================================================
 # ERROR LOGS
@@ -120,8 +114,8 @@ def get_recent_errors(limit: int = 5):
     """
     Fetch recent system or command errors.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -137,8 +131,128 @@ def get_recent_errors(limit: int = 5):
             (limit,),
         )
         return cur.fetchall()
-    finally:
-        conn.close()
+
+# ============================================================
+# TIME WINDOWS (ANALYTICS)
+# ============================================================
+# Windows are half-open [start_ms, end_ms) in epoch milliseconds
+# (see timestamps.window). end_ms=None means "up to now". With a
+# session_id they use the (session_id, timestamp) indexes,
+# otherwise the timestamp indexes.
+
+def _window_clause(start_ms: int, end_ms=None, session_id=None):
+    clauses = ["timestamp >= ?"]
+    params = [int(start_ms)]
+
+    if end_ms is not None:
+        clauses.append("timestamp < ?")
+        params.append(int(end_ms))
+
+    if session_id is not None:
+        clauses.append("session_id = ?")
+        params.append(session_id)
+
+    return " AND ".join(clauses), params
+
+
+def get_commands_between(start_ms: int, end_ms=None, session_id=None):
+    """
+    Command executions inside a time window, oldest first.
+    """
+    where, params = _window_clause(start_ms, end_ms, session_id)
+
+    flush_logs()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT
+                raw_input,
+                status,
+                mode,
+                duration_ms,
+                timestamp
+            FROM command_executions
+            WHERE {where}
+            ORDER BY timestamp ASC
+            """,
+            params,
+        )
+        return cur.fetchall()
+
+
+def get_command_counts_between(start_ms: int, end_ms=None, session_id=None):
+    """
+    (mode, status, count) of command executions inside a time window.
+    """
+    where, params = _window_clause(start_ms, end_ms, session_id)
+
+    flush_logs()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT mode, status, COUNT(*)
+            FROM command_executions
+            WHERE {where}
+            GROUP BY mode, status
+            ORDER BY mode, status
+            """,
+            params,
+        )
+        return cur.fetchall()
+
+
+def get_errors_between(start_ms: int, end_ms=None, session_id=None):
+    """
+    Errors inside a time window, oldest first.
+    """
+    where, params = _window_clause(start_ms, end_ms, session_id)
+
+    flush_logs()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT
+                error_name,
+                error_description,
+                origin_function,
+                timestamp
+            FROM errors
+            WHERE {where}
+            ORDER BY timestamp ASC
+            """,
+            params,
+        )
+        return cur.fetchall()
+
+
+def get_ai_decisions_between(start_ms: int, end_ms=None, session_id=None):
+    """
+    AI routing decisions inside a time window, oldest first.
+    """
+    where, params = _window_clause(start_ms, end_ms, session_id)
+
+    flush_logs()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT
+                raw_input,
+                chosen_command_id,
+                confidence,
+                margin,
+                decision_type,
+                timestamp
+            FROM ai_decisions
+            WHERE {where}
+            ORDER BY timestamp ASC
+            """,
+            params,
+        )
+        return cur.fetchall()
 
 # ============================================================
 # REGISTRY (OPEN COMMAND)
@@ -148,8 +262,7 @@ def get_registry_entries():
     """
     Fetch all registered shortcuts.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -159,16 +272,13 @@ def get_registry_entries():
             """
         )
         return cur.fetchall()
-    finally:
-        conn.close()
 
 
 def get_registry_entry(name: str):
     """
     Fetch a specific registry entry by name.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -179,8 +289,6 @@ def get_registry_entry(name: str):
             (name,),
         )
         return cur.fetchone()
-    finally:
-        conn.close()
 
 # ============================================================
 # COMMAND REGISTRY (AI SOURCE OF TRUTH)
@@ -190,8 +298,7 @@ def get_all_commands():
     """
     Fetch all registered command definitions.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -221,16 +328,13 @@ def get_all_commands():
             })
 
         return commands
-    finally:
-        conn.close()
 
 
 def get_command_by_name(command_name: str):
     """
     Fetch a single command definition by name.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -261,8 +365,127 @@ def get_command_by_name(command_name: str):
             "is_destructive": bool(row[5]),
             "requires_confirmation": bool(row[6]),
         }
-    finally:
-        conn.close()
+
+# ============================================================
+# ROUTING EMBEDDINGS
+# ============================================================
+
+def get_routing_embedding_rows():
+    """
+    Fetch every routing vector: one per description plus one per
+    example utterance, ordered so each command's rows are adjacent.
+
+    Returns list of (command_id, command_name, embedding_blob).
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                c.command_id,
+                c.command_name,
+                ce.embedding
+            FROM commands c
+            JOIN command_embeddings ce
+                ON c.command_id = ce.command_id
+
+            UNION ALL
+
+            SELECT
+                c.command_id,
+                c.command_name,
+                xe.embedding
+            FROM commands c
+            JOIN command_examples x
+                ON x.command_id = c.command_id
+            JOIN command_example_embeddings xe
+                ON xe.example_id = x.example_id
+
+            ORDER BY 1 ASC
+            """
+        )
+        return cur.fetchall()
+
+
+def get_routing_texts():
+    """
+    Fetch the text behind every routing vector, in the same order
+    as get_routing_embedding_rows (used to re-encode the catalog
+    with a candidate model).
+
+    Returns list of (command_id, command_name, text).
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                c.command_id,
+                c.command_name,
+                c.description
+            FROM commands c
+            JOIN command_embeddings ce
+                ON c.command_id = ce.command_id
+
+            UNION ALL
+
+            SELECT
+                c.command_id,
+                c.command_name,
+                x.utterance
+            FROM commands c
+            JOIN command_examples x
+                ON x.command_id = c.command_id
+            JOIN command_example_embeddings xe
+                ON xe.example_id = x.example_id
+
+            ORDER BY 1 ASC
+            """
+        )
+        return cur.fetchall()
+
+
+def get_command_texts():
+    """
+    Fetch the searchable text of every command for lexical routing.
+
+    Returns list of (command_id, command_name, category, description).
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                command_id,
+                command_name,
+                category,
+                description
+            FROM commands
+            ORDER BY command_id ASC
+            """
+        )
+        return cur.fetchall()
+
+def get_command_adaptations(model_id: str):
+    """
+    Fetch the per-command routing corrections learned for a model.
+
+    Returns list of (command_id, centroid BLOB, hits).
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                command_id,
+                centroid,
+                hits
+            FROM command_adaptations
+            WHERE model_id = ?
+            """,
+            (model_id,)
+        )
+        return cur.fetchall()
 
 # ============================================================
 # SCHEMA ACCESS (AI CORE)
@@ -272,8 +495,7 @@ def get_function_schema(command_id: int):
     """
     Fetch full command metadata for AI execution.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -297,8 +519,6 @@ def get_function_schema(command_id: int):
             "is_destructive": bool(row[2]),
             "requires_confirmation": bool(row[3]),
         }
-    finally:
-        conn.close()
 
 # ============================================================
 # CONVERSATION HISTORY (SESSION-AWARE MEMORY)
@@ -309,8 +529,8 @@ def get_conversation_history(session_id: int, limit: int = 20):
     Fetch recent conversation turns for a session.
     Returns list[dict] in DESC order.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -349,16 +569,13 @@ def get_conversation_history(session_id: int, limit: int = 20):
             for r in rows
         ]
 
-    finally:
-        conn.close()
-
 
 def get_last_conversation_turn(session_id: int):
     """
     Fetch the most recent conversation turn for a session.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -380,16 +597,14 @@ def get_last_conversation_turn(session_id: int):
             (session_id,)
         )
         return cur.fetchone()
-    finally:
-        conn.close()
 
 
 def get_conversation_turns_after(session_id: int, turn_id: int):
     """
     Fetch conversation turns after a given turn_id.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -410,8 +625,6 @@ def get_conversation_turns_after(session_id: int, turn_id: int):
             (session_id, turn_id)
         )
         return cur.fetchall()
-    finally:
-        conn.close()
 
 # ============================================================
 # SESSION RESUME HELPERS
@@ -421,8 +634,7 @@ def get_last_session_id():
     """
     Fetch the most recent session_id.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -434,16 +646,14 @@ def get_last_session_id():
         )
         row = cur.fetchone()
         return row[0] if row else None
-    finally:
-        conn.close()
 
 
 def get_last_turn_id(session_id: int):
     """
     Fetch the last recorded turn_id for a session.
     """
-    conn = get_connection()
-    try:
+    flush_logs()
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -455,5 +665,24 @@ def get_last_turn_id(session_id: int):
         )
         row = cur.fetchone()
         return row[0] if row and row[0] is not None else 0
-    finally:
-        conn.close()
+
+# ============================================================
+# SETTINGS
+# ============================================================
+
+def get_setting(key: str, default=None):
+    """
+    Fetch a single value from the settings table.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT value
+            FROM settings
+            WHERE key = ?
+            """,
+            (key,)
+        )
+        row = cur.fetchone()
+        return row[0] if row else default
@@ -4,9 +4,13 @@
 # Embedding generation and persistence for JaiShell commands.
 #
 # Responsibilities:
-# - Read command descriptions from database
+# - Read command descriptions and example utterances from database
+# - Detect new / changed / deleted commands (content hash + model version)
 # - Generate sentence embeddings using the SAME model as router
-# - Persist embeddings back to database
+# - Persist embeddings back to database (packed float32 BLOBs)
+# - Publish the memory-mapped routing index (command_index.py)
+# - Build the approximate (IVF) vector index (vector_index.py)
+# - Fit the reduced-dimension projection (dim_reduction.py)
 #
 # RULES:
 # - Commands table is the source of truth
@@ -15,12 +19,24 @@
 # - Model choice MUST stay consistent with Function_Router
 # ============================================================
 
-import json
+import argparse
+import hashlib
 import os
 from pathlib import Path
 
-from sentence_transformers import SentenceTransformer
 from Core.db_connection import get_connection
+from Core.embedding_backend import EMBEDDING_BACKEND, load_embedding_model, model_version
+from Core.db_reader import get_routing_embedding_rows, get_setting
+from Core.embedding_codec import pack_embedding
+from Core.command_index import (
+    CATALOG_GENERATION_KEY,
+    build_routing_matrix,
+    bump_catalog_generation,
+    write_command_index,
+)
+from Core.vector_index import write_ivf_index
+from Core.dim_reduction import REDUCED_DIM, REDUCTION_METHOD, write_reduced_index
+from Core.embedding_daemon import daemon_encode
 
 # ============================================================
 # MODEL CONFIGURATION (SINGLE SOURCE OF TRUTH)
@@ -29,14 +45,85 @@ from Core.db_connection import get_connection
 DEFAULT_MODEL_DIR = Path(__file__).resolve().parents[1] / "Finetuned-gte-large-en-v1.5"
 MODEL_PATH = Path(os.getenv("EMBEDDING_MODEL_PATH", DEFAULT_MODEL_DIR))
 
+# Texts encoded per model.encode call
+ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# ============================================================
+# CHANGE DETECTION
+# ============================================================
+
+def content_hash(text: str) -> str:
+    """
+    Hash of the text an embedding was generated from.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# ============================================================
+# EMBEDDING SOURCES
+# ============================================================
+# Every routing vector comes from one of these sources. Each is
+# (source query -> (key, text)), target table, target key column.
+# ============================================================
+
+EMBEDDING_SOURCES = [
+    {
+        "label": "descriptions",
+        "query": "SELECT command_id, description FROM commands ORDER BY command_id ASC",
+        "table": "command_embeddings",
+        "key": "command_id",
+    },
+    {
+        "label": "examples",
+        "query": "SELECT example_id, utterance FROM command_examples ORDER BY example_id ASC",
+        "table": "command_example_embeddings",
+        "key": "example_id",
+    },
+]
+
+
+def _plan_source(cur, source: dict, version: str, full_rebuild: bool):
+    """
+    Work out what one source needs.
+
+    Returns:
+        (pending [(key, text, digest)], orphaned [key], total)
+    """
+    cur.execute(source["query"])
+    items = cur.fetchall()
+
+    cur.execute(
+        f"""
+        SELECT {source["key"]}, content_hash, model_version
+        FROM {source["table"]}
+        """
+    )
+    stored = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+    live_keys = {key for key, _ in items}
+    orphaned = [key for key in stored if key not in live_keys]
+
+    pending = []
+    for key, text in items:
+        digest = content_hash(text)
+        if full_rebuild or stored.get(key) != (digest, version):
+            pending.append((key, text, digest))
+
+    return pending, orphaned, len(items)
+
 # ============================================================
 # EMBEDDING PIPELINE
 # ============================================================
 
-def generate_and_store_command_embeddings():
+def generate_and_store_command_embeddings(full_rebuild: bool = False):
     """
-    Generate embeddings for all commands defined in the database
-    and store them in the command_embeddings table.
+    Bring stored embeddings in line with the commands table and
+    the command example utterances.
+
+    Incremental by default: each row stores the hash of the text
+    it was built from and the model version, so only new or
+    changed texts (or all of them, after a model change) are
+    re-encoded, in one batched pass. Embeddings whose source row
+    was deleted are removed. `full_rebuild` re-encodes everything.
 
     This operation is:
     - Deterministic
@@ -49,12 +136,7 @@ def generate_and_store_command_embeddings():
             f"Embedding model not found at: {MODEL_PATH}"
         )
 
-    print(f"[Embeddings] Loading model from: {MODEL_PATH}")
-
-    model = SentenceTransformer(
-        str(MODEL_PATH),
-        trust_remote_code=True
-    )
+    version = model_version(MODEL_PATH, EMBEDDING_BACKEND)
 
     conn = get_connection()
     try:
@@ -63,45 +145,83 @@ def generate_and_store_command_embeddings():
         # Explicit safety (even though enforced globally)
         cur.execute("PRAGMA foreign_keys = ON;")
 
-        # Always work in deterministic order
-        cur.execute(
-            """
-            SELECT command_id, description
-            FROM commands
-            ORDER BY command_id ASC
-            """
-        )
-        commands = cur.fetchall()
+        plans = [
+            (source, *_plan_source(cur, source, version, full_rebuild))
+            for source in EMBEDDING_SOURCES
+        ]
+
+        texts = [text for _, pending, _, _ in plans for _, text, _ in pending]
+        orphan_count = sum(len(orphaned) for _, _, orphaned, _ in plans)
 
-        if not commands:
+        if not any(total for _, _, _, total in plans) and not orphan_count:
             print("[Embeddings] No commands found. Nothing to embed.")
             return
 
-        print(f"[Embeddings] Generating embeddings for {len(commands)} commands...")
+        if not texts and not orphan_count:
+            # Seeding may still have moved the generation (e.g. an
+            # example was removed and cascaded), so refresh the index
+            print("[Embeddings] All command embeddings are up to date.")
+            rebuild_command_index()
+            return
+
+        embeddings = []
+        if texts:
+            # A running daemon with the same model version already
+            # holds the model; only load it here when there is none
+            embeddings = daemon_encode(texts, version=version)
+
+            if embeddings is not None:
+                print(f"[Embeddings] Encoded {len(texts)} texts on the embedding daemon.")
+            else:
+                print(f"[Embeddings] Loading model from: {MODEL_PATH} (backend: {EMBEDDING_BACKEND})")
+                model = load_embedding_model(MODEL_PATH, EMBEDDING_BACKEND)
+
+                print(f"[Embeddings] Encoding {len(texts)} texts (batch size {ENCODE_BATCH_SIZE})...")
+                embeddings = model.encode(
+                    texts,
+                    batch_size=ENCODE_BATCH_SIZE,
+                    normalize_embeddings=True
+                )
 
         # Begin atomic transaction
         conn.execute("BEGIN")
 
-        # Remove stale embeddings
-        cur.execute("DELETE FROM command_embeddings")
+        offset = 0
+        for source, pending, orphaned, total in plans:
+            table, key = source["table"], source["key"]
+
+            if full_rebuild:
+                cur.execute(f"DELETE FROM {table}")
+            elif orphaned:
+                cur.executemany(
+                    f"DELETE FROM {table} WHERE {key} = ?",
+                    [(k,) for k in orphaned]
+                )
 
-        for command_id, description in commands:
-            embedding = model.encode(
-                description,
-                normalize_embeddings=True
-            ).tolist()
+            source_embeddings = embeddings[offset:offset + len(pending)]
+            offset += len(pending)
 
-            cur.execute(
-                """
-                INSERT INTO command_embeddings
-                (command_id, embedding_json)
-                VALUES (?, ?)
+            cur.executemany(
+                f"""
+                INSERT OR REPLACE INTO {table}
+                ({key}, embedding, content_hash, model_version)
+                VALUES (?, ?, ?, ?)
                 """,
-                (command_id, json.dumps(embedding))
+                [
+                    (k, pack_embedding(embedding), digest, version)
+                    for (k, _, digest), embedding in zip(pending, source_embeddings)
+                ]
             )
 
+            print(
+                f"[Embeddings] {source['label']}: {len(pending)} of {total} written, "
+                f"{len(orphaned)} orphaned removed."
+            )
+
+        bump_catalog_generation(cur)
+
         conn.commit()
-        print("[Embeddings] Command embeddings regenerated successfully.")
+        print("[Embeddings] Command embeddings updated successfully.")
 
     except Exception:
         conn.rollback()
@@ -110,9 +230,71 @@ def generate_and_store_command_embeddings():
     finally:
         conn.close()
 
+    rebuild_command_index()
+
+# ============================================================
+# PREBUILT ROUTING INDEX
+# ============================================================
+
+def rebuild_command_index():
+    """
+    Export the stored embeddings to the memory-mapped index file.
+
+    Reads BLOBs only, so it is cheap and never loads the model.
+    """
+    # Generation first: if a writer slips in between, the index is
+    # labelled older than its contents and simply gets rebuilt
+    generation = int(get_setting(CATALOG_GENERATION_KEY, 0))
+    rows = get_routing_embedding_rows()
+
+    if not rows:
+        print("[Embeddings] No embeddings stored. Index not written.")
+        return
+
+    command_ids, command_names, matrix, row_offsets = build_routing_matrix(rows)
+
+    try:
+        write_command_index(
+            command_ids=command_ids,
+            command_names=command_names,
+            matrix=matrix,
+            row_offsets=row_offsets,
+            generation=generation,
+            model_path=MODEL_PATH
+        )
+    except OSError as e:
+        # The embeddings are already committed; with a stale sidecar
+        # routers load from SQLite until the next rebuild
+        print(f"[Embeddings] Routing index not written ({e}). Routers will read SQLite.")
+        return
+
+    print(
+        f"[Embeddings] Routing index written ({len(command_ids)} commands, "
+        f"{len(rows)} vectors, generation {generation})."
+    )
+
+    lists = write_ivf_index(matrix, generation)
+    print(f"[Embeddings] IVF index written ({lists} lists).")
+
+    if REDUCED_DIM > 0:
+        reduction = write_reduced_index(matrix, generation)
+        print(
+            f"[Embeddings] Reduced index written ({REDUCTION_METHOD}, "
+            f"{matrix.shape[1]} -> {reduction.dim} dims)."
+        )
+
 # ============================================================
 # SCRIPT ENTRY POINT
 # ============================================================
 
 if __name__ == "__main__":
-    generate_and_store_command_embeddings()
+    parser = argparse.ArgumentParser(description="Generate command embeddings")
+    parser.add_argument(
+        "--full", "--force-regenerate",
+        dest="full_rebuild",
+        action="store_true",
+        help="Re-encode every command instead of only changed ones"
+    )
+    args = parser.parse_args()
+
+    generate_and_store_command_embeddings(full_rebuild=args.full_rebuild)
@@ -8,23 +8,223 @@
 #
 # RULES:
 # - Accept primitives only (str, int, bool, float)
-# - Generate timestamps internally
+# - Generate timestamps internally (epoch ms, see timestamps.py)
 # - Never accept raw dicts
+#
+# Per-turn logs (command executions, AI decisions, errors,
+# conversation turns) and query-cache rows are write-behind: they
+# are queued and a
+# background thread commits them in one transaction per flush
+# interval, so the interactive turn never waits on the disk.
+# Sessions, registry entries and routing adaptations are written
+# synchronously. Readers of the logged tables call flush_logs()
+# first (db_reader does), which keeps read-your-writes ordering.
+# ============================================================
+
+import atexit
+import os
+import queue
+import threading
+import time
+from Core.db_connection import connection
+from Core.timestamps import now_ms, to_epoch_ms
+
 # ============================================================
+# WRITE-BEHIND QUEUE
+# ============================================================
+
+# Queue per-turn logs (0 writes each insert synchronously)
+WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "1") == "1"
+
+# Pending inserts before callers block (back-pressure)
+LOG_QUEUE_SIZE = int(os.getenv("DB_LOG_QUEUE_SIZE", "1000"))
+
+# Inserts arriving within this window share one transaction
+LOG_FLUSH_INTERVAL = float(os.getenv("DB_LOG_FLUSH_MS", "200")) / 1000.0
+
+FLUSH_TIMEOUT = 10.0
+
+# Wakes the writer without carrying an insert
+_WAKE = object()
+
+
+class WriteBehindLogger:
+    """
+    Bounded queue of insert groups drained by one background
+    writer thread.
+
+    Groups are committed in submission order. Each batch is one
+    transaction; if it fails, its groups are retried one by one
+    (each still atomic) so a single bad row cannot drop the rest.
+    """
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, interval: float = LOG_FLUSH_INTERVAL):
+        self.pending = queue.Queue(maxsize=maxsize)
+        self.interval = interval
+
+        self.submitted = 0
+        self.committed = 0
+        self.stats = {"batches": 0, "inserts": 0, "failed": 0}
+        self.last_error = None
+
+        self._done = threading.Condition()
+        self._urgent = threading.Event()
+
+        self.thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self.thread.start()
+
+    def submit(self, statements):
+        """
+        Queue a group of (sql, params) inserts that commit together.
+        """
+        with self._done:
+            self.submitted += 1
+        self.pending.put(tuple(statements))
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT) -> bool:
+        """
+        Block until everything submitted so far is committed.
+
+        Returns False on timeout. Free when nothing is pending.
+        """
+        with self._done:
+            target = self.submitted
+            if self.committed >= target:
+                return True
+
+        self._urgent.set()
+        try:
+            self.pending.put_nowait(_WAKE)
+        except queue.Full:
+            pass
+
+        with self._done:
+            return self._done.wait_for(lambda: self.committed >= target, timeout)
+
+    def _collect(self):
+        batch = []
+        first = self.pending.get()
+        if first is not _WAKE:
+            batch.append(first)
+
+        deadline = time.monotonic() + self.interval
+        while not self._urgent.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is not _WAKE:
+                batch.append(item)
+
+        # Whatever is already queued joins this transaction
+        while True:
+            try:
+                item = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _WAKE:
+                batch.append(item)
+
+        self._urgent.clear()
+        return batch
+
+    def _write(self, batch):
+        try:
+            with connection() as conn:
+                for group in batch:
+                    _execute_group(conn, group)
+            self.stats["batches"] += 1
+            self.stats["inserts"] += sum(len(group) for group in batch)
+            return
+        except Exception:
+            pass
+
+        for group in batch:
+            try:
+                with connection() as conn:
+                    _execute_group(conn, group)
+                self.stats["inserts"] += len(group)
+            except Exception as e:
+                self.stats["failed"] += 1
+                self.last_error = e
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+            with self._done:
+                self.committed += len(batch)
+                self._done.notify_all()
+
+
+def _execute_group(conn, statements):
+    for sql, params in statements:
+        conn.execute(sql, params)
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _get_logger() -> WriteBehindLogger:
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = WriteBehindLogger()
+    return _logger
+
+
+def _enqueue_group(statements):
+    """
+    Queue inserts that must commit together, or run them now in
+    one transaction when write-behind is disabled.
+    """
+    if not WRITE_BEHIND:
+        with connection() as conn:
+            _execute_group(conn, statements)
+        return
+
+    _get_logger().submit(statements)
+
+
+def _enqueue(sql: str, params: tuple):
+    _enqueue_group([(sql, params)])
+
+
+def flush_logs(timeout: float = FLUSH_TIMEOUT) -> bool:
+    """
+    Commit every queued log insert before returning.
+
+    Call before reading logged tables (read-your-writes) and on
+    shutdown. Returns False if the writer did not finish in time.
+    """
+    if _logger is None:
+        return True
+    return _logger.flush(timeout)
+
 
-from datetime import datetime
-from Core.db_connection import get_connection
+atexit.register(flush_logs)
 
 # ============================================================
 # SESSION LOGGING
 # ============================================================
 
-def log_session_start(session_id: int, start_timestamp: str):
+def log_session_start(session_id: int, start_timestamp=None):
     """
     Record the start of a shell session.
+
+    start_timestamp may be epoch ms, a datetime or ISO text
+    (defaults to now); it is stored as epoch ms.
     """
-    conn = get_connection()
-    try:
+    start_timestamp = to_epoch_ms(start_timestamp) or now_ms()
+
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -34,17 +234,16 @@ def log_session_start(session_id: int, start_timestamp: str):
             """,
             (session_id, start_timestamp)
         )
-        conn.commit()
-    finally:
-        conn.close()
 
 
-def log_session_end(session_id: int, graceful: bool, end_timestamp: str):
+def log_session_end(session_id: int, graceful: bool, end_timestamp=None):
     """
-    Mark the end of a shell session.
+    Mark the end of a shell session (end_timestamp as in
+    log_session_start).
     """
-    conn = get_connection()
-    try:
+    end_timestamp = to_epoch_ms(end_timestamp) or now_ms()
+
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -54,106 +253,189 @@ def log_session_end(session_id: int, graceful: bool, end_timestamp: str):
             """,
             (end_timestamp, 1 if graceful else 0, session_id)
         )
-        conn.commit()
-    finally:
-        conn.close()
 
 # ============================================================
 # COMMAND EXECUTION LOGGING
 # ============================================================
 
+def _execution_statement(
+    session_id: int,
+    raw_input: str,
+    status: str,
+    mode: str,
+    function_called: str = None,
+    command_id: int = None,
+    duration_ms: int = None
+):
+    """
+    (sql, params) for log_command_execution.
+    """
+    return (
+        """
+        INSERT INTO command_executions
+        (
+            session_id,
+            raw_input,
+            command_id,
+            status,
+            mode,
+            function_called,
+            duration_ms,
+            timestamp
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            session_id,
+            raw_input,
+            command_id,
+            status,
+            mode,
+            function_called,
+            duration_ms,
+            now_ms()
+        )
+    )
+
+
 def log_command_execution(
     session_id: int,
     raw_input: str,
     status: str,
     mode: str,
     function_called: str = None,
-    command_id: int = None
+    command_id: int = None,
+    duration_ms: int = None
 ):
     """
     Log a command execution event.
+
+    duration_ms is the wall time of the whole turn, when known.
     """
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO command_executions
-            (
-                session_id,
-                raw_input,
-                command_id,
-                status,
-                mode,
-                function_called,
-                timestamp
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                session_id,
-                raw_input,
-                command_id,
-                status,
-                mode,
-                function_called,
-                datetime.now().isoformat()
-            )
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    _enqueue(*_execution_statement(
+        session_id,
+        raw_input,
+        status,
+        mode,
+        function_called,
+        command_id,
+        duration_ms
+    ))
 
 # ============================================================
 # AI DECISION LOGGING
 # ============================================================
 
+def _decision_statement(
+    session_id: int,
+    raw_input: str,
+    chosen_command_id: int | None,
+    confidence: float,
+    decision_type: str,
+    reason: str | None = None,
+    margin: float | None = None,
+    truncated_at: int | None = None,
+    turn_id: int | None = None
+):
+    """
+    (sql, params) for log_ai_decision.
+    """
+    return (
+        """
+        INSERT INTO ai_decisions
+        (
+            session_id,
+            raw_input,
+            chosen_command_id,
+            confidence,
+            margin,
+            decision_type,
+            reason,
+            truncated_at,
+            turn_id,
+            timestamp
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            session_id,
+            raw_input,
+            chosen_command_id,
+            confidence,
+            margin,
+            decision_type,
+            reason,
+            truncated_at,
+            turn_id,
+            now_ms()
+        )
+    )
+
+
 def log_ai_decision(
     session_id: int,
     raw_input: str,
     chosen_command_id: int | None,
     confidence: float,
     decision_type: str,
-    reason: str | None = None
+    reason: str | None = None,
+    margin: float | None = None,
+    truncated_at: int | None = None,
+    turn_id: int | None = None
 ):
     """
     Log an AI routing decision for explainability.
+
+    truncated_at is the number of input tokens the router encoded
+    when it had to cut an over-long input (None otherwise).
     """
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO ai_decisions
-            (
-                session_id,
-                raw_input,
-                chosen_command_id,
-                confidence,
-                decision_type,
-                reason,
-                timestamp
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                session_id,
-                raw_input,
-                chosen_command_id,
-                confidence,
-                decision_type,
-                reason,
-                datetime.now().isoformat()
-            )
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    _enqueue(*_decision_statement(
+        session_id,
+        raw_input,
+        chosen_command_id,
+        confidence,
+        decision_type,
+        reason,
+        margin,
+        truncated_at,
+        turn_id
+    ))
 
 # ============================================================
 # ERROR LOGGING
 # ============================================================
 
+def _error_statement(
+    session_id: int,
+    error_name: str,
+    error_description: str,
+    origin_function: str
+):
+    """
+    (sql, params) for log_error.
+    """
+    return (
+        """
+        INSERT INTO errors
+        (
+            session_id,
+            error_name,
+            error_description,
+            origin_function,
+            timestamp
+        )
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            session_id,
+            error_name,
+            error_description,
+            origin_function,
+            now_ms()
+        )
+    )
+
+
 def log_error(
     session_id: int,
     error_name: str,
@@ -163,32 +445,12 @@ def log_error(
     """
     Log a system or command error.
     """
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO errors
-            (
-                session_id,
-                error_name,
-                error_description,
-                origin_function,
-                timestamp
-            )
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (
-                session_id,
-                error_name,
-                error_description,
-                origin_function,
-                datetime.now().isoformat()
-            )
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    _enqueue(*_error_statement(
+        session_id,
+        error_name,
+        error_description,
+        origin_function
+    ))
 
 # ============================================================
 # REGISTRY MANAGEMENT
@@ -198,8 +460,7 @@ def register_entry(name: str, path: str, type_: str):
     """
     Add or update a registry shortcut.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -209,17 +470,13 @@ def register_entry(name: str, path: str, type_: str):
             """,
             (name, path, type_)
         )
-        conn.commit()
-    finally:
-        conn.close()
 
 
 def unregister_entry(name: str):
     """
     Remove a registry shortcut.
     """
-    conn = get_connection()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -228,14 +485,57 @@ def unregister_entry(name: str):
             """,
             (name,)
         )
-        conn.commit()
-    finally:
-        conn.close()
 
 # ============================================================
 # CONVERSATION HISTORY LOGGING
 # ============================================================
 
+def _conversation_statement(
+    session_id: int,
+    turn_id: int,
+    mode: str,
+    user_input: str,
+    assistant_output: str,
+    command_called: str | None = None,
+    status: str | None = None,
+    confidence: float | None = None,
+    context_snapshot: str | None = None
+):
+    """
+    (sql, params) for log_conversation_turn.
+    """
+    return (
+        """
+        INSERT INTO conversation_history
+        (
+            session_id,
+            turn_id,
+            mode,
+            user_input,
+            assistant_output,
+            command_called,
+            status,
+            confidence,
+            context_snapshot,
+            timestamp
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            session_id,
+            turn_id,
+            mode,
+            user_input,
+            assistant_output,
+            command_called,
+            status,
+            confidence,
+            context_snapshot,
+            now_ms()
+        )
+    )
+
+
 def log_conversation_turn(
     session_id: int,
     turn_id: int,
@@ -250,39 +550,253 @@ def log_conversation_turn(
     """
     Persist a single conversation turn (rule / ai / chat).
     """
-    conn = get_connection()
-    try:
+    _enqueue(*_conversation_statement(
+        session_id,
+        turn_id,
+        mode,
+        user_input,
+        assistant_output,
+        command_called,
+        status,
+        confidence,
+        context_snapshot
+    ))
+
+# ============================================================
+# TURN RECORD
+# ============================================================
+# One shell turn touches up to four log tables. Logging them one
+# by one means four commits, and a crash in between leaves the
+# tables disagreeing. A TurnRecord collects the turn's rows and
+# hands them to the writer as one group, committed atomically.
+# ============================================================
+
+class TurnRecord:
+    """
+    Everything one shell turn logs, persisted in one transaction.
+
+    CoreShell opens it when the turn starts, AICore adds its
+    routing decisions, and CoreShell adds the execution,
+    conversation row and any error before calling commit().
+    The turn's wall time is stored with the execution.
+
+    A multi-intent AI turn adds one execution per intent instead
+    (add_execution), each under its segment's text, so every
+    execution row matches the decision it came from.
+    """
+
+    def __init__(self, session_id: int, turn_id: int, mode: str, raw_input: str):
+        self.session_id = session_id
+        self.turn_id = turn_id
+        self.mode = mode
+        self.raw_input = raw_input
+
+        self.started = time.perf_counter()
+        self.committed = False
+
+        self._decisions = []
+        self._execution = None
+        self._executions = []
+        self._conversation = None
+        self._errors = []
+
+    def elapsed_ms(self) -> int:
+        return int((time.perf_counter() - self.started) * 1000)
+
+    def add_decision(
+        self,
+        chosen_command_id: int | None,
+        confidence: float,
+        decision_type: str,
+        reason: str | None = None,
+        margin: float | None = None,
+        truncated_at: int | None = None,
+        raw_input: str | None = None
+    ):
+        """
+        Add an AI routing decision (raw_input defaults to the
+        turn's input; multi-intent turns pass each segment).
+        """
+        self._decisions.append(_decision_statement(
+            self.session_id,
+            raw_input if raw_input is not None else self.raw_input,
+            chosen_command_id,
+            confidence,
+            decision_type,
+            reason,
+            margin,
+            truncated_at,
+            self.turn_id
+        ))
+
+    def add_execution(
+        self,
+        raw_input: str,
+        status: str,
+        function_called: str = None,
+        command_id: int = None,
+        duration_ms: int = None
+    ):
+        """
+        Record the execution of one intent of a multi-intent turn.
+        These rows replace the turn-level execution.
+        """
+        self._executions.append(_execution_statement(
+            self.session_id,
+            raw_input,
+            status,
+            self.mode,
+            function_called,
+            command_id,
+            duration_ms
+        ))
+
+    def set_execution(self, status: str, function_called: str = None, command_id: int = None):
+        """
+        Record the turn's execution; its duration is taken at commit.
+        """
+        self._execution = (status, function_called, command_id)
+
+    def set_conversation(
+        self,
+        assistant_output: str,
+        command_called: str | None = None,
+        status: str | None = None,
+        confidence: float | None = None,
+        context_snapshot: str | None = None
+    ):
+        self._conversation = _conversation_statement(
+            self.session_id,
+            self.turn_id,
+            self.mode,
+            self.raw_input,
+            assistant_output,
+            command_called,
+            status,
+            confidence,
+            context_snapshot
+        )
+
+    def add_error(self, error_name: str, error_description: str, origin_function: str):
+        self._errors.append(_error_statement(
+            self.session_id,
+            error_name,
+            error_description,
+            origin_function
+        ))
+
+    def statements(self):
+        """
+        (sql, params) for every row of the turn, in logging order.
+        """
+        statements = list(self._decisions)
+
+        if self._executions:
+            statements.extend(self._executions)
+        elif self._execution is not None:
+            status, function_called, command_id = self._execution
+            statements.append(_execution_statement(
+                self.session_id,
+                self.raw_input,
+                status,
+                self.mode,
+                function_called,
+                command_id,
+                self.elapsed_ms()
+            ))
+
+        if self._conversation is not None:
+            statements.append(self._conversation)
+
+        statements.extend(self._errors)
+        return statements
+
+    def commit(self):
+        """
+        Persist the turn as one transaction (write-behind unless
+        DB_WRITE_BEHIND=0). A record commits at most once.
+        """
+        if self.committed:
+            return
+
+        statements = self.statements()
+        self.committed = True
+        if statements:
+            _enqueue_group(statements)
+
+# ============================================================
+# ROUTING ADAPTATION
+# ============================================================
+
+def save_command_adaptation(command_id: int, model_id: str, centroid: bytes, hits: int):
+    """
+    Store the routing correction of one command (packed centroid).
+    """
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
-            INSERT INTO conversation_history
-            (
-                session_id,
-                turn_id,
-                mode,
-                user_input,
-                assistant_output,
-                command_called,
-                status,
-                confidence,
-                context_snapshot,
-                timestamp
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO command_adaptations
+            (command_id, model_id, centroid, hits, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(command_id, model_id) DO UPDATE SET
+                centroid = excluded.centroid,
+                hits = excluded.hits,
+                updated_at = excluded.updated_at
             """,
             (
-                session_id,
-                turn_id,
-                mode,
-                user_input,
-                assistant_output,
-                command_called,
-                status,
-                confidence,
-                context_snapshot,
-                datetime.now().isoformat()
+                command_id,
+                model_id,
+                centroid,
+                hits,
+                now_ms()
             )
         )
-        conn.commit()
-    finally:
-        conn.close()
+
+# ============================================================
+# QUERY EMBEDDING CACHE
+# ============================================================
+
+def cache_query_embedding(
+    cache_key: str,
+    model_id: str,
+    query_text: str,
+    embedding: bytes,
+    keep_rows: int = 0
+):
+    """
+    Queue a query vector (packed) for the persistent query cache.
+
+    With keep_rows > 0 the table is pruned to its newest keep_rows
+    entries in the same transaction.
+    """
+    statements = [(
+        """
+        INSERT OR REPLACE INTO query_embedding_cache
+        (cache_key, model_id, query_text, embedding, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            cache_key,
+            model_id,
+            query_text,
+            embedding,
+            now_ms()
+        )
+    )]
+
+    if keep_rows > 0:
+        statements.append((
+            """
+            DELETE FROM query_embedding_cache
+            WHERE cache_key NOT IN (
+                SELECT cache_key
+                FROM query_embedding_cache
+                ORDER BY created_at DESC
+                LIMIT ?
+            )
+            """,
+            (keep_rows,)
+        ))
+
+    _enqueue_group(statements)
@@ -0,0 +1,161 @@
+# ============================================================
+# dim_reduction.py
+# ============================================================
+# Reduced-dimension routing vectors.
+#
+# Methods (ROUTER_REDUCTION):
+#   pca     - projection onto the top principal components of the
+#             routing matrix, fitted by db_vector_manager
+#   prefix  - the first ROUTER_REDUCED_DIM coordinates (useful for
+#             Matryoshka-style models whose leading dims carry most
+#             of the signal)
+#
+# Reduced vectors are re-normalized, so scoring stays a dot
+# product. The reduced matrix and its projection are stored next
+# to the full index (command_index_reduced.npz), tagged with the
+# catalog generation; the full vectors are kept for re-ranking.
+#
+# ROUTER_REDUCED_DIM=0 (default) disables reduction entirely.
+# ============================================================
+
+import os
+
+import numpy as np
+
+from Core.db_connection import BASE_DIR
+from Core.embedding_codec import normalize_rows
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+SUPPORTED_REDUCTIONS = ("pca", "prefix")
+
+REDUCED_DIM = int(os.getenv("ROUTER_REDUCED_DIM", "0"))
+REDUCTION_METHOD = os.getenv("ROUTER_REDUCTION", "pca").lower()
+
+# Commands re-scored with full vectors after a reduced scan (0 = off)
+RERANK_TOP = int(os.getenv("ROUTER_RERANK_TOP", "10"))
+
+REDUCED_INDEX_PATH = BASE_DIR / "command_index_reduced.npz"
+
+# ============================================================
+# PROJECTION
+# ============================================================
+
+class Reduction:
+    """
+    Linear projection (x - mean) @ components, then row-normalized.
+
+    `matrix` holds the projected routing rows.
+    """
+
+    def __init__(self, method: str, mean: np.ndarray, components: np.ndarray, matrix=None):
+        self.method = method
+        self.mean = mean
+        self.components = components
+        self.matrix = matrix
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[1]
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "prefix":
+            return normalize_rows(vectors[..., :self.dim])
+        return normalize_rows((vectors - self.mean) @ self.components)
+
+
+def fit_reduction(matrix: np.ndarray, dim: int, method: str = REDUCTION_METHOD) -> Reduction:
+    """
+    Fit a projection of `matrix` rows down to `dim` dimensions.
+
+    PCA cannot produce more components than there are rows, so
+    small catalogs get min(dim, rows) components.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    full_dim = matrix.shape[1]
+
+    if method not in SUPPORTED_REDUCTIONS:
+        raise ValueError(
+            f"Unknown ROUTER_REDUCTION '{method}'. "
+            f"Expected one of: {', '.join(SUPPORTED_REDUCTIONS)}"
+        )
+
+    if method == "prefix":
+        dim = min(dim, full_dim)
+        mean = np.zeros(full_dim, dtype=np.float32)
+        components = np.eye(full_dim, dim, dtype=np.float32)
+    else:
+        mean = matrix.mean(axis=0)
+        _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+        components = np.ascontiguousarray(vt[:min(dim, vt.shape[0])].T, dtype=np.float32)
+
+    reduction = Reduction(method, mean.astype(np.float32), components)
+    reduction.matrix = reduction.project(matrix)
+    return reduction
+
+# ============================================================
+# PERSISTENCE
+# ============================================================
+
+def write_reduced_index(
+    matrix: np.ndarray,
+    generation: int,
+    dim: int = REDUCED_DIM,
+    method: str = REDUCTION_METHOD
+) -> Reduction:
+    """
+    Fit and persist the reduced routing matrix.
+    """
+    reduction = fit_reduction(matrix, dim, method)
+
+    tmp_path = REDUCED_INDEX_PATH.with_name("command_index_reduced.tmp.npz")
+    np.savez(
+        tmp_path,
+        method=np.array(method),
+        requested_dim=np.int64(dim),
+        mean=reduction.mean,
+        components=reduction.components,
+        matrix=reduction.matrix,
+        generation=np.int64(generation),
+    )
+    os.replace(tmp_path, REDUCED_INDEX_PATH)
+
+    return reduction
+
+
+def load_reduced_index(
+    generation: int,
+    rows: int,
+    dim: int = REDUCED_DIM,
+    method: str = REDUCTION_METHOD
+):
+    """
+    Open the persisted reduced index.
+
+    Returns None if reduction is disabled, or the file is missing,
+    stale, or was built with another method or dimension.
+    """
+    if dim <= 0 or not REDUCED_INDEX_PATH.exists():
+        return None
+
+    try:
+        with np.load(REDUCED_INDEX_PATH) as data:
+            if (
+                int(data["generation"]) != generation
+                or str(data["method"]) != method
+                or int(data["requested_dim"]) != dim
+                or data["matrix"].shape[0] != rows
+            ):
+                return None
+
+            return Reduction(
+                method,
+                data["mean"],
+                data["components"],
+                data["matrix"]
+            )
+    except (OSError, ValueError, KeyError):
+        return None
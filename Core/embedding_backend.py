@@ -0,0 +1,220 @@
+# ============================================================
+# embedding_backend.py
+# ============================================================
+# Inference backends for the JaiShell embedding model.
+#
+# Backends (EMBEDDING_BACKEND):
+#   torch      - SentenceTransformer on PyTorch (default)
+#   onnx       - ONNX Runtime, fp32 export of the same model
+#   onnx-int8  - ONNX Runtime, dynamically int8-quantized export
+#
+# ONNX files are produced by onnx_tools.py and live in
+# EMBEDDING_ONNX_PATH (default: <model dir>/onnx).
+#
+# Every backend exposes the subset of SentenceTransformer used
+# by JaiShell:
+#   - encode(sentences, batch_size=..., normalize_embeddings=...)
+#   - tokenizer
+#   - max_seq_length
+#
+# RULES:
+# - Heavy imports (torch, onnxruntime) happen only on load
+# - Function_Router and db_vector_manager MUST load models here
+# ============================================================
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+SUPPORTED_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+ONNX_FILENAMES = {
+    "onnx": "model.onnx",
+    "onnx-int8": "model.int8.onnx",
+}
+
+
+def onnx_dir(model_path) -> Path:
+    """
+    Directory holding the exported ONNX graphs for `model_path`.
+    """
+    return Path(os.getenv("EMBEDDING_ONNX_PATH", Path(model_path) / "onnx"))
+
+
+def backend_identity(model_path, backend: str = None) -> str:
+    """
+    Stable identity of (model, backend), used to key caches.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    return f"{Path(model_path).resolve()}::{backend}"
+
+
+def model_version(model_path, backend: str = None) -> str:
+    """
+    Identity plus the newest modification time of the model files.
+
+    Retraining a model in place changes the version, so stored
+    embeddings produced by the old weights are recognized as stale.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+
+    roots = [Path(model_path)]
+    if backend in ONNX_FILENAMES:
+        roots.append(onnx_dir(model_path))
+
+    newest = 0
+    for root in roots:
+        try:
+            for entry in root.iterdir():
+                if entry.is_file():
+                    newest = max(newest, int(entry.stat().st_mtime))
+        except OSError:
+            continue
+
+    return f"{backend_identity(model_path, backend)}@{newest}"
+
+# ============================================================
+# SENTENCE-TRANSFORMERS CONFIG HELPERS
+# ============================================================
+
+def _read_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _pooling_mode(model_path: Path) -> str:
+    """
+    Pooling strategy declared by the SentenceTransformer model.
+    """
+    config = _read_json(model_path / "1_Pooling" / "config.json")
+    if config.get("pooling_mode_cls_token"):
+        return "cls"
+    return "mean"
+
+
+def _max_seq_length(model_path: Path) -> int:
+    config = _read_json(model_path / "sentence_bert_config.json")
+    return int(config.get("max_seq_length", 512))
+
+# ============================================================
+# ONNX RUNTIME BACKEND
+# ============================================================
+
+class OnnxEmbeddingModel:
+    """
+    SentenceTransformer-compatible encoder running on ONNX Runtime.
+    """
+
+    def __init__(self, model_path, onnx_path):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = Path(model_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_path))
+        self.pooling = _pooling_mode(model_path)
+        self.max_seq_length = _max_seq_length(model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(
+            str(onnx_path),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        summed = (hidden * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        **_
+    ) -> np.ndarray:
+        """
+        Encode one string (-> 1-D) or a list of strings (-> 2-D).
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {
+                name: encoded[name].astype(np.int64)
+                for name in self.input_names
+                if name in encoded
+            }
+            hidden = self.session.run(None, feeds)[0]
+            batches.append(self._pool(hidden, encoded["attention_mask"]))
+
+        if batches:
+            embeddings = np.vstack(batches).astype(np.float32)
+        else:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+
+        if normalize_embeddings and embeddings.size:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings[0] if single else embeddings
+
+# ============================================================
+# LOADER
+# ============================================================
+
+def load_embedding_model(model_path, backend: str = None):
+    """
+    Build the embedding model for the configured backend.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(
+            f"Unknown EMBEDDING_BACKEND '{backend}'. "
+            f"Expected one of: {', '.join(SUPPORTED_BACKENDS)}"
+        )
+
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(
+            str(model_path),
+            trust_remote_code=True
+        )
+
+    onnx_path = onnx_dir(model_path) / ONNX_FILENAMES[backend]
+    if not onnx_path.exists():
+        raise RuntimeError(
+            f"ONNX model not found at: {onnx_path}. "
+            "Run: python -m Core.onnx_tools export"
+            + (" --quantize" if backend == "onnx-int8" else "")
+        )
+
+    return OnnxEmbeddingModel(model_path, onnx_path)
@@ -0,0 +1,136 @@
+# ============================================================
+# embedding_codec.py
+# ============================================================
+# Binary storage format for command embeddings.
+#
+# Every vector is stored as a single BLOB:
+#
+#   offset  size  field
+#   0       4     magic      b"JEMB"
+#   4       1     version    format version (currently 1)
+#   5       1     dtype      dtype code (1 = little-endian float32)
+#   6       2     reserved   zero padding (keeps payload aligned)
+#   8       4     dim        vector dimension (uint32, little-endian)
+#   12      4*dim payload    raw vector values
+#
+# This module is responsible ONLY for:
+#   - Packing vectors into BLOBs
+#   - Unpacking BLOBs (single or many) into NumPy arrays
+#   - Row normalization of decoded matrices
+#
+# It does NOT touch the database.
+# ============================================================
+
+import struct
+from typing import Iterable, Sequence
+
+import numpy as np
+
+# ============================================================
+# FORMAT DEFINITION
+# ============================================================
+
+MAGIC = b"JEMB"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<4sBBxxI")
+HEADER_SIZE = HEADER.size
+
+DTYPE_CODES = {
+    1: np.dtype("<f4"),
+}
+DTYPE_FLOAT32 = 1
+
+# ============================================================
+# ENCODING
+# ============================================================
+
+def pack_embedding(vector: Sequence[float]) -> bytes:
+    """
+    Pack a 1-D vector into a headered float32 BLOB.
+    """
+    arr = np.ascontiguousarray(vector, dtype=DTYPE_CODES[DTYPE_FLOAT32])
+
+    if arr.ndim != 1:
+        raise ValueError(f"Expected a 1-D vector, got shape {arr.shape}")
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_FLOAT32, arr.shape[0])
+    return header + arr.tobytes()
+
+# ============================================================
+# DECODING
+# ============================================================
+
+def read_header(blob: bytes):
+    """
+    Validate a BLOB header.
+
+    Returns:
+        (dtype, dim)
+    """
+    if len(blob) < HEADER_SIZE:
+        raise ValueError("Embedding blob is shorter than its header")
+
+    magic, version, dtype_code, dim = HEADER.unpack_from(blob)
+
+    if magic != MAGIC:
+        raise ValueError("Embedding blob has an unknown magic number")
+
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version: {version}")
+
+    dtype = DTYPE_CODES.get(dtype_code)
+    if dtype is None:
+        raise ValueError(f"Unsupported embedding dtype code: {dtype_code}")
+
+    if len(blob) != HEADER_SIZE + dim * dtype.itemsize:
+        raise ValueError("Embedding blob size does not match its header")
+
+    return dtype, dim
+
+
+def unpack_embedding(blob: bytes) -> np.ndarray:
+    """
+    Decode a single BLOB into a read-only 1-D view (no copy).
+    """
+    dtype, dim = read_header(blob)
+    return np.frombuffer(blob, dtype=dtype, count=dim, offset=HEADER_SIZE)
+
+
+def unpack_matrix(blobs: Iterable[bytes]) -> np.ndarray:
+    """
+    Decode many BLOBs into one contiguous (n, dim) float32 matrix.
+
+    Payloads are joined into a single buffer and interpreted with
+    one np.frombuffer call, so no per-row Python lists are built.
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return np.empty((0, 0), dtype=DTYPE_CODES[DTYPE_FLOAT32])
+
+    dtype, dim = read_header(blobs[0])
+
+    payloads = []
+    for blob in blobs:
+        if read_header(blob) != (dtype, dim):
+            raise ValueError("Embedding blobs have inconsistent dtype or dimension")
+        payloads.append(memoryview(blob)[HEADER_SIZE:])
+
+    buffer = b"".join(payloads)
+    return np.frombuffer(buffer, dtype=dtype).reshape(len(blobs), dim)
+
+# ============================================================
+# NORMALIZATION
+# ============================================================
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Return a float32 copy of `matrix` with unit-length rows.
+
+    With unit rows, cosine similarity is a plain dot product.
+    Zero rows are left as zeros.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
@@ -0,0 +1,449 @@
+# ============================================================
+# embedding_daemon.py
+# ============================================================
+# Optional local embedding daemon for JaiShell.
+#
+# One process holds the embedding model and the command matrix
+# and serves every shell on the host over a Unix domain socket,
+# instead of each CoreShell (and db_vector_manager) loading its
+# own copy of the model.
+#
+# Usage:
+#   python -m Core.embedding_daemon
+#
+# Operations:
+#   ping    -> model identity / version of the daemon
+#   encode  -> unit-normalized vectors for a list of texts
+#   route   -> route_commands_detailed() results for a list of queries
+#   adapt   -> record_success() for a query the daemon routed
+#
+# Concurrent encode work is coalesced: requests arriving within
+# EMBEDDING_DAEMON_BATCH_MS of each other share one forward pass.
+#
+# Wire format (both directions):
+#   !II header  (JSON length, payload length)
+#   JSON header
+#   payload     (raw little-endian float32 vectors, or empty)
+#
+# The client half of this module is imported by Function_Router
+# and db_vector_manager. It never raises: when the daemon is not
+# running, is unreachable, or serves another model, callers get
+# None and fall back to in-process inference.
+# ============================================================
+
+import getpass
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+DAEMON_SOCKET = os.getenv(
+    "EMBEDDING_DAEMON_SOCKET",
+    os.path.join(tempfile.gettempdir(), f"jaishell-embed-{getpass.getuser()}.sock")
+)
+
+# Clients use the daemon when it is running (0 disables)
+USE_EMBEDDING_DAEMON = os.getenv("EMBEDDING_DAEMON", "1") == "1"
+
+CONNECT_TIMEOUT = 0.05
+REQUEST_TIMEOUT = float(os.getenv("EMBEDDING_DAEMON_TIMEOUT", "30"))
+
+# After a failed contact, do not retry for this many seconds
+RETRY_INTERVAL = 30.0
+
+BATCH_WINDOW = float(os.getenv("EMBEDDING_DAEMON_BATCH_MS", "5")) / 1000.0
+BATCH_MAX_TEXTS = 128
+
+FRAME = struct.Struct("!II")
+
+# ============================================================
+# WIRE FORMAT
+# ============================================================
+
+def _recv_exact(sock, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Connection closed mid-message")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, header: dict, payload: bytes = b""):
+    body = json.dumps(header).encode("utf-8")
+    sock.sendall(FRAME.pack(len(body), len(payload)) + body + payload)
+
+
+def recv_message(sock):
+    """
+    Returns:
+        (header dict, payload bytes), or (None, b"") on a clean EOF
+    """
+    first = sock.recv(FRAME.size)
+    if not first:
+        return None, b""
+    if len(first) < FRAME.size:
+        first += _recv_exact(sock, FRAME.size - len(first))
+
+    header_len, payload_len = FRAME.unpack(first)
+    header = json.loads(_recv_exact(sock, header_len).decode("utf-8"))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+def _vectors_payload(vectors: np.ndarray):
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    return list(vectors.shape), vectors.tobytes()
+
+
+def _vectors_from(header: dict, payload: bytes) -> np.ndarray:
+    return np.frombuffer(payload, dtype="<f4").reshape(header["shape"])
+
+# ============================================================
+# CLIENT
+# ============================================================
+
+_client_lock = threading.Lock()
+_daemon_info = None
+_retry_after = 0.0
+
+
+def _request(header: dict, payload: bytes = b""):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(DAEMON_SOCKET)
+        sock.settimeout(REQUEST_TIMEOUT)
+
+        send_message(sock, header, payload)
+        response, body = recv_message(sock)
+    finally:
+        sock.close()
+
+    if response is None:
+        raise ConnectionError("Daemon closed the connection")
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "daemon error"))
+    return response, body
+
+
+def _mark_unavailable():
+    global _daemon_info, _retry_after
+    with _client_lock:
+        _daemon_info = None
+        _retry_after = time.monotonic() + RETRY_INTERVAL
+
+
+def daemon_info():
+    """
+    The running daemon's ping response, or None if it is not
+    reachable. Failures are remembered for RETRY_INTERVAL seconds
+    so an absent daemon costs one stat() per call at most.
+    """
+    global _daemon_info
+
+    if not USE_EMBEDDING_DAEMON or not hasattr(socket, "AF_UNIX"):
+        return None
+
+    if _daemon_info is not None:
+        return _daemon_info
+
+    if time.monotonic() < _retry_after or not os.path.exists(DAEMON_SOCKET):
+        return None
+
+    try:
+        info, _ = _request({"op": "ping"})
+    except (OSError, ValueError, RuntimeError):
+        _mark_unavailable()
+        return None
+
+    with _client_lock:
+        _daemon_info = info
+    return info
+
+
+def _serves(model_id: str = None, version: str = None) -> bool:
+    info = daemon_info()
+    if info is None:
+        return False
+    if model_id is not None and info.get("model_id") != model_id:
+        return False
+    if version is not None and info.get("model_version") != version:
+        return False
+    return True
+
+
+def daemon_encode(texts, model_id: str = None, version: str = None):
+    """
+    Encode texts on the daemon.
+
+    Returns an (n, dim) float32 matrix, or None when the daemon is
+    unavailable or serves a different model.
+    """
+    if not _serves(model_id, version):
+        return None
+
+    try:
+        header, payload = _request({"op": "encode", "texts": list(texts)})
+    except (OSError, ValueError, RuntimeError):
+        _mark_unavailable()
+        return None
+
+    return _vectors_from(header, payload)
+
+
+def daemon_route(queries, model_id: str = None):
+    """
+    Route queries on the daemon.
+
+    Returns one (command_id, decision, confidence, margin,
+    truncated_at) tuple per query, or None when the daemon is
+    unavailable or serves another model.
+    """
+    if not _serves(model_id):
+        return None
+
+    try:
+        header, _ = _request({"op": "route", "queries": list(queries)})
+    except (OSError, ValueError, RuntimeError):
+        _mark_unavailable()
+        return None
+
+    return [tuple(result) for result in header["results"]]
+
+
+def daemon_adapt(query: str, command_id: int, model_id: str = None):
+    """
+    Record a successful execution on the daemon, whose in-memory
+    corrections are the ones its routing uses.
+
+    Returns True / False as record_success() would, or None when
+    the daemon is unavailable or serves another model.
+    """
+    if not _serves(model_id):
+        return None
+
+    try:
+        header, _ = _request({"op": "adapt", "query": query, "command_id": int(command_id)})
+    except (OSError, ValueError, RuntimeError):
+        _mark_unavailable()
+        return None
+
+    return bool(header["adapted"])
+
+# ============================================================
+# SERVER: BATCHING
+# ============================================================
+
+class EncodeBatcher:
+    """
+    Coalesces concurrent encode requests into shared forward passes.
+    """
+
+    def __init__(self, encode_fn, window: float = BATCH_WINDOW, max_texts: int = BATCH_MAX_TEXTS):
+        self.encode_fn = encode_fn
+        self.window = window
+        self.max_texts = max_texts
+        self.pending = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "texts": 0}
+
+        thread = threading.Thread(target=self._run, name="encode-batcher", daemon=True)
+        thread.start()
+
+    def encode(self, texts) -> np.ndarray:
+        future = Future()
+        self.pending.put((list(texts), future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        count = len(batch[0][0])
+        deadline = time.monotonic() + self.window
+
+        while count < self.max_texts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            count += len(item[0])
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+
+            try:
+                vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(texts)
+
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+# ============================================================
+# SERVER: REQUEST HANDLING
+# ============================================================
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                request, _ = recv_message(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+
+            try:
+                header, payload = server.dispatch(request)
+                header["ok"] = True
+            except Exception as e:
+                header, payload = {"ok": False, "error": str(e)}, b""
+
+            try:
+                send_message(self.request, header, payload)
+            except OSError:
+                return
+
+
+class EmbeddingDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        from Core import Function_Router as router
+        from Core.embedding_backend import model_version
+
+        self.router = router
+        # Includes the sequence caps: a shell configured with other
+        # caps encodes differently and must not be served from here
+        self.model_id = router._query_cache_identity()
+        self.model_version = model_version(router.MODEL_PATH, router.EMBEDDING_BACKEND)
+
+        # Cache misses inside this process go through the batcher,
+        # never back to a daemon
+        self.batcher = EncodeBatcher(router._encode_local)
+        router.set_uncached_encoder(self.batcher.encode)
+
+        super().__init__(path, _Handler)
+
+    def dispatch(self, request: dict):
+        op = request.get("op")
+
+        if op == "ping":
+            return {
+                "model_id": self.model_id,
+                "model_version": self.model_version,
+                "pid": os.getpid(),
+                "stats": dict(self.batcher.stats),
+            }, b""
+
+        if op == "encode":
+            shape, payload = _vectors_payload(self.batcher.encode(request["texts"]))
+            return {"shape": shape}, payload
+
+        if op == "route":
+            results = self.router.route_commands_detailed(request["queries"])
+            return {"results": [list(result) for result in results]}, b""
+
+        if op == "adapt":
+            adapted = self.router.record_success(request["query"], request["command_id"])
+            return {"adapted": adapted}, b""
+
+        raise ValueError(f"Unknown op: {op}")
+
+# ============================================================
+# SCRIPT ENTRY POINT
+# ============================================================
+
+def _socket_in_use(path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def serve(path: str = DAEMON_SOCKET):
+    """
+    Load the model and serve until interrupted.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        print("[Daemon] Unix domain sockets are not available on this platform.")
+        return 1
+
+    if os.path.exists(path):
+        if _socket_in_use(path):
+            print(f"[Daemon] Already running on {path}")
+            return 1
+        os.unlink(path)
+
+    # This process is the daemon: never try to reach one. Under
+    # `python -m` this file is __main__, so also switch off the
+    # copy Function_Router imports
+    global USE_EMBEDDING_DAEMON
+    USE_EMBEDDING_DAEMON = False
+
+    from Core import embedding_daemon as client
+    client.USE_EMBEDDING_DAEMON = False
+
+    from Core.Function_Router import warm_up
+
+    print("[Daemon] Loading model and command embeddings...")
+    warm_up(progress=lambda stage: print(f"[Daemon] {stage}"))
+
+    old_umask = os.umask(0o077)
+    try:
+        server = EmbeddingDaemon(path)
+    finally:
+        os.umask(old_umask)
+
+    print(f"[Daemon] Serving {server.model_id} on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Daemon] Shutting down.")
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(serve())
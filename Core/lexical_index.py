@@ -0,0 +1,213 @@
+# ============================================================
+# lexical_index.py
+# ============================================================
+# In-memory BM25 index over the command catalog.
+#
+# Every command is one document made of three fields:
+#   command_name  (weighted x3)
+#   category      (weighted x1)
+#   description   (weighted x1)
+# Field weights are applied by repeating tokens (simple BM25F).
+#
+# The router uses it two ways:
+#   - Scores are squashed into [0, 1) and added to the semantic
+#     similarity as a small boost (ROUTER_LEXICAL_WEIGHT)
+#   - Optionally (ROUTER_LEXICAL_EARLY_EXIT=1), a query that names
+#     exactly one command verbatim and whose BM25 ranking that
+#     command wins decisively is decided without encoding it. The
+#     router still applies its thresholds and only skips the model
+#     on an AUTO_EXECUTE.
+#
+# This module does NOT load the embedding model or touch the
+# database; callers pass it the rows from db_reader.
+# ============================================================
+
+import math
+import os
+import re
+from collections import defaultdict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+FIELD_WEIGHTS = {
+    "name": 3,
+    "category": 1,
+    "description": 1,
+}
+
+# BM25 score at which the squashed lexical score reaches 0.5
+LEXICAL_SATURATION = 4.0
+
+# Weight of the squashed lexical score in the fused score (0 disables)
+LEXICAL_WEIGHT = float(os.getenv("ROUTER_LEXICAL_WEIGHT", "0.15"))
+
+# Answer from the lexical index alone when a name match is decisive.
+# Off by default: a name inside a sentence ("is port 22 open on my
+# server") does not make that command the intent
+LEXICAL_EARLY_EXIT = os.getenv("ROUTER_LEXICAL_EARLY_EXIT", "0") == "1"
+
+# Lead in squashed BM25 score the named command needs over the runner-up
+LEXICAL_EXIT_MARGIN = float(os.getenv("ROUTER_LEXICAL_EXIT_MARGIN", "0.25"))
+
+# Score of a command invoked by name (whole input or leading tokens)
+NAME_INVOCATION_SCORE = 1.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# ============================================================
+# TOKENIZATION
+# ============================================================
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase alphanumeric tokens; "github-repos" -> github, repos.
+    """
+    return _TOKEN_RE.findall((text or "").lower())
+
+# ============================================================
+# INDEX
+# ============================================================
+
+class LexicalIndex:
+    """
+    BM25 postings over one document per command.
+
+    command_ids is ascending, matching the routing matrix order.
+    """
+
+    def __init__(self, rows: Sequence[Tuple[int, str, str, str]]):
+        self.command_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.command_names = [row[1] for row in rows]
+        self.name_tokens = [tuple(tokenize(row[1])) for row in rows]
+
+        documents = []
+        for _, name, category, description in rows:
+            tokens = (
+                tokenize(name) * FIELD_WEIGHTS["name"]
+                + tokenize(category) * FIELD_WEIGHTS["category"]
+                + tokenize(description) * FIELD_WEIGHTS["description"]
+            )
+            documents.append(tokens)
+
+        lengths = np.array([len(doc) for doc in documents], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+        frequencies = defaultdict(lambda: defaultdict(int))
+        for doc_index, tokens in enumerate(documents):
+            for token in tokens:
+                frequencies[token][doc_index] += 1
+
+        n_docs = len(documents)
+        self.postings = {}
+        for token, by_doc in frequencies.items():
+            docs = np.fromiter(by_doc.keys(), dtype=np.intp, count=len(by_doc))
+            tf = np.fromiter(by_doc.values(), dtype=np.float32, count=len(by_doc))
+
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[docs] / (avg_length or 1.0))
+            weights = idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            self.postings[token] = (docs, weights.astype(np.float32))
+
+    def __len__(self):
+        return len(self.command_ids)
+
+    def score(self, query: str) -> np.ndarray:
+        """
+        Raw BM25 score of every command for `query`.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is not None:
+                docs, weights = posting
+                scores[docs] += weights
+        return scores
+
+    def normalized_scores(self, query: str) -> np.ndarray:
+        """
+        BM25 scores squashed into [0, 1): s / (s + LEXICAL_SATURATION).
+        """
+        scores = self.score(query)
+        return scores / (scores + LEXICAL_SATURATION)
+
+    def decisive_match(self, query: str) -> Optional[List[Tuple[int, str, float]]]:
+        """
+        Ranked top-2 (command_id, command_name, score) for a query
+        that names one command verbatim and whose BM25 ranking that
+        command leads by LEXICAL_EXIT_MARGIN, otherwise None.
+
+        The named command scores NAME_INVOCATION_SCORE when its name
+        is the whole input or its leading tokens (a rule-style call,
+        "weather London"), else its squashed BM25 score; the
+        runner-up keeps its squashed BM25 score. The caller applies
+        the routing thresholds to the result.
+        """
+        tokens = tokenize(query)
+        matches = [
+            i for i, name in enumerate(self.name_tokens)
+            if name and _contains_run(tokens, name)
+        ]
+
+        if len(matches) != 1:
+            return None
+
+        best = matches[0]
+        scores = self.normalized_scores(query)
+
+        others = np.delete(scores, best)
+        runner_up = int(np.argmax(others)) if len(others) else None
+        runner_score = float(others[runner_up]) if runner_up is not None else 0.0
+        if runner_up is not None and runner_up >= best:
+            runner_up += 1
+
+        if scores[best] - runner_score < LEXICAL_EXIT_MARGIN:
+            return None
+
+        name = self.name_tokens[best]
+        invoked = tuple(tokens[:len(name)]) == name
+        best_score = NAME_INVOCATION_SCORE if invoked else float(scores[best])
+
+        ranked = [(int(self.command_ids[best]), self.command_names[best], best_score)]
+        if runner_up is not None:
+            ranked.append((
+                int(self.command_ids[runner_up]),
+                self.command_names[runner_up],
+                runner_score
+            ))
+        return ranked
+
+
+def _contains_run(tokens: List[str], run: Tuple[str, ...]) -> bool:
+    width = len(run)
+    return any(
+        tuple(tokens[i:i + width]) == run
+        for i in range(len(tokens) - width + 1)
+    )
+
+# ============================================================
+# FUSION
+# ============================================================
+
+def fuse_scores(
+    semantic: np.ndarray,
+    lexical: np.ndarray,
+    weight: float = LEXICAL_WEIGHT
+) -> np.ndarray:
+    """
+    Semantic similarity plus a bounded lexical boost, capped at 1.
+
+    Queries with no lexical overlap keep their semantic score, so
+    the router thresholds keep their meaning.
+    """
+    if weight <= 0:
+        return semantic
+    return np.minimum(semantic + weight * lexical, 1.0)
@@ -0,0 +1,209 @@
+# ============================================================
+# onnx_tools.py
+# ============================================================
+# Export and verification tooling for the ONNX Runtime backend.
+#
+# Usage:
+#   python -m Core.onnx_tools export [--quantize]
+#   python -m Core.onnx_tools compare [--backend onnx-int8]
+#
+# export  : converts the fine-tuned transformer to ONNX
+#           (model.onnx) and optionally writes a dynamically
+#           int8-quantized copy (model.int8.onnx)
+# compare : encodes every command description plus a few probe
+#           queries with PyTorch and with the ONNX backend, then
+#           reports vector agreement and routing agreement
+#
+# RULES:
+# - Offline tooling only; never imported by the shell
+# ============================================================
+
+import argparse
+import sys
+
+import numpy as np
+
+from Core.db_connection import get_connection
+from Core.db_vector_manager import MODEL_PATH
+from Core.embedding_backend import (
+    ONNX_FILENAMES,
+    load_embedding_model,
+    onnx_dir,
+)
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+OPSET_VERSION = 17
+
+# Minimum per-vector cosine(torch, onnx) for `compare` to pass
+DEFAULT_MIN_COSINE = 0.99
+
+PROBE_QUERIES = [
+    "is the server up",
+    "what's the weather in Delhi",
+    "show my github repositories",
+    "how long has this laptop been running",
+    "open my downloads folder",
+    "summarize notes.txt",
+]
+
+# ============================================================
+# EXPORT
+# ============================================================
+
+def export_onnx(model_path=MODEL_PATH, quantize: bool = False):
+    """
+    Export the transformer body to ONNX (pooling runs in NumPy).
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = onnx_dir(model_path)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = output_dir / ONNX_FILENAMES["onnx"]
+
+    print(f"[ONNX] Loading model from: {model_path}")
+    st_model = SentenceTransformer(str(model_path), trust_remote_code=True)
+    transformer = st_model[0].auto_model.eval()
+
+    sample = st_model.tokenizer(
+        ["export sample input"],
+        padding=True,
+        return_tensors="pt"
+    )
+    input_names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            kwargs = dict(zip(input_names, inputs))
+            return self.model(**kwargs).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    print(f"[ONNX] Exporting to: {fp32_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer),
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET_VERSION,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = output_dir / ONNX_FILENAMES["onnx-int8"]
+        print(f"[ONNX] Quantizing (dynamic int8) to: {int8_path}")
+        quantize_dynamic(
+            str(fp32_path),
+            str(int8_path),
+            weight_type=QuantType.QInt8
+        )
+
+    print("[ONNX] Export complete.")
+
+# ============================================================
+# COMPARISON
+# ============================================================
+
+def _command_descriptions():
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT command_name, description
+            FROM commands
+            ORDER BY command_id ASC
+            """
+        )
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def compare_backends(
+    backend: str = "onnx",
+    model_path=MODEL_PATH,
+    min_cosine: float = DEFAULT_MIN_COSINE
+) -> bool:
+    """
+    Report how closely `backend` reproduces the PyTorch embeddings.
+
+    Returns True when every vector clears `min_cosine` and every
+    probe query routes to the same command on both backends.
+    """
+    commands = _command_descriptions()
+    if not commands:
+        print("[Compare] No commands found. Seed the database first.")
+        return False
+
+    names = [name for name, _ in commands]
+    texts = [description for _, description in commands] + PROBE_QUERIES
+
+    reference = load_embedding_model(model_path, "torch")
+    candidate = load_embedding_model(model_path, backend)
+
+    ref = np.asarray(reference.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    cand = np.asarray(candidate.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    cosines = np.sum(ref * cand, axis=1)
+
+    n = len(commands)
+    ref_routes = np.argmax(ref[n:] @ ref[:n].T, axis=1)
+    cand_routes = np.argmax(cand[n:] @ cand[:n].T, axis=1)
+    agreement = float(np.mean(ref_routes == cand_routes))
+
+    print(f"[Compare] torch vs {backend} on {len(texts)} texts")
+    print(f"  cosine  min : {cosines.min():.5f}")
+    print(f"  cosine  mean: {cosines.mean():.5f}")
+    print(f"  top-1 routing agreement on probes: {agreement:.0%}")
+
+    for query, r, c in zip(PROBE_QUERIES, ref_routes, cand_routes):
+        marker = "  " if r == c else "!!"
+        print(f"  {marker} {query!r}: torch={names[r]} {backend}={names[c]}")
+
+    return bool(cosines.min() >= min_cosine and agreement == 1.0)
+
+# ============================================================
+# SCRIPT ENTRY POINT
+# ============================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ONNX backend tooling")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    export_cmd = sub.add_parser("export", help="Export the model to ONNX")
+    export_cmd.add_argument("--quantize", action="store_true",
+                            help="Also write a dynamic int8 model")
+
+    compare_cmd = sub.add_parser("compare", help="Compare ONNX against PyTorch")
+    compare_cmd.add_argument("--backend", default="onnx",
+                             choices=[b for b in ONNX_FILENAMES])
+    compare_cmd.add_argument("--min-cosine", type=float, default=DEFAULT_MIN_COSINE)
+
+    args = parser.parse_args(argv)
+
+    if args.action == "export":
+        export_onnx(quantize=args.quantize)
+        return 0
+
+    ok = compare_backends(backend=args.backend, min_cosine=args.min_cosine)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
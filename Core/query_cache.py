@@ -0,0 +1,193 @@
+# ============================================================
+# query_cache.py
+# ============================================================
+# Query-embedding cache for the semantic router.
+#
+# Repeated AI-mode phrasings ("is the server up") should not pay
+# for a transformer forward pass every time. Vectors are cached:
+#   1. In memory (LRU, bounded by ROUTER_QUERY_CACHE_SIZE)
+#   2. Optionally in SQLite (query_embedding_cache table), so the
+#      cache survives restarts and is shared between shells. New
+#      rows are queued on the write-behind logger (db_writer), so a
+#      cache miss never waits on the disk; the LRU already holds them
+#
+# Keys combine the normalized query text with the model identity,
+# so switching models never serves stale vectors.
+#
+# This module does NOT load or run the embedding model.
+# ============================================================
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from Core.db_connection import connection
+from Core.db_writer import cache_query_embedding
+from Core.embedding_codec import pack_embedding, unpack_embedding
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+QUERY_CACHE_SIZE = int(os.getenv("ROUTER_QUERY_CACHE_SIZE", "512"))
+QUERY_CACHE_PERSIST = os.getenv("ROUTER_QUERY_CACHE_PERSIST", "1") == "1"
+QUERY_CACHE_MAX_ROWS = int(os.getenv("ROUTER_QUERY_CACHE_MAX_ROWS", "5000"))
+
+# Prune the persistent table once every N inserts
+PRUNE_INTERVAL = 100
+
+# ============================================================
+# STATE
+# ============================================================
+
+_lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_lock = threading.Lock()
+
+_stats = {
+    "hits": 0,
+    "persistent_hits": 0,
+    "misses": 0,
+}
+_inserts_since_prune = 0
+
+# ============================================================
+# KEYING
+# ============================================================
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form used for cache lookups.
+    """
+    return " ".join(query.lower().split())
+
+
+def cache_key(query: str, model_id: str) -> str:
+    """
+    Stable key for (normalized query, model identity).
+    """
+    raw = f"{model_id}\0{normalize_query(query)}".encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+# ============================================================
+# PERSISTENT LAYER
+# ============================================================
+
+def _read_persistent(key: str):
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT embedding
+            FROM query_embedding_cache
+            WHERE cache_key = ?
+            """,
+            (key,)
+        )
+        row = cur.fetchone()
+        return unpack_embedding(row[0]) if row else None
+
+
+def _write_persistent(key: str, query: str, model_id: str, vector: np.ndarray):
+    global _inserts_since_prune
+
+    with _lock:
+        _inserts_since_prune += 1
+        prune = _inserts_since_prune >= PRUNE_INTERVAL
+        if prune:
+            _inserts_since_prune = 0
+
+    cache_query_embedding(
+        key,
+        model_id,
+        normalize_query(query),
+        pack_embedding(vector),
+        keep_rows=QUERY_CACHE_MAX_ROWS if prune else 0
+    )
+
+# ============================================================
+# PUBLIC API
+# ============================================================
+
+def get_cached_embedding(query: str, model_id: str):
+    """
+    Return the cached vector for `query`, or None on a miss.
+
+    Persistent hits are promoted into the in-memory LRU.
+    """
+    key = cache_key(query, model_id)
+
+    with _lock:
+        vector = _lru.get(key)
+        if vector is not None:
+            _lru.move_to_end(key)
+            _stats["hits"] += 1
+            return vector
+
+    if QUERY_CACHE_PERSIST:
+        try:
+            vector = _read_persistent(key)
+        except Exception:
+            # Cache failures must never break routing
+            vector = None
+
+        if vector is not None:
+            with _lock:
+                _stats["persistent_hits"] += 1
+                _remember(key, vector)
+            return vector
+
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+
+def store_embedding(query: str, model_id: str, vector: np.ndarray):
+    """
+    Cache a freshly computed query vector.
+    """
+    key = cache_key(query, model_id)
+    vector = np.asarray(vector, dtype=np.float32)
+
+    with _lock:
+        _remember(key, vector)
+
+    if QUERY_CACHE_PERSIST:
+        try:
+            _write_persistent(key, query, model_id, vector)
+        except Exception:
+            pass
+
+
+def _remember(key: str, vector: np.ndarray):
+    # Caller holds _lock
+    _lru[key] = vector
+    _lru.move_to_end(key)
+    while len(_lru) > QUERY_CACHE_SIZE:
+        _lru.popitem(last=False)
+
+
+def get_cache_stats() -> dict:
+    """
+    Snapshot of cache counters for status displays.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_lru)
+        stats["capacity"] = QUERY_CACHE_SIZE
+
+    lookups = stats["hits"] + stats["persistent_hits"] + stats["misses"]
+    stats["hit_rate"] = (
+        (stats["hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+    )
+    return stats
+
+
+def clear_memory_cache():
+    """
+    Drop the in-memory LRU (persistent rows are kept).
+    """
+    with _lock:
+        _lru.clear()
@@ -0,0 +1,143 @@
+# ============================================================
+# route_adaptation.py
+# ============================================================
+# Online per-user routing adaptation.
+#
+# Every successful execution of a semantically routed AI query
+# moves a per-command centroid of the query vectors that led to
+# it. At scoring time the best few candidates of each query are
+# pulled towards their centroid similarity:
+#
+#   score' = score + w * max(0, cos(query, centroid) - score)
+#   w      = ROUTER_ADAPT_WEIGHT * hits / (hits + ADAPT_PRIOR)
+#
+# so a phrasing that keeps landing in CONFIRM for the same
+# command climbs towards AUTO_EXECUTE as it keeps succeeding.
+# Adaptation only ever raises a candidate's score.
+#
+# Costs per turn:
+#   update  - one running-mean step on a single centroid, O(dim)
+#   apply   - a fixed number of candidates per query, O(dim)
+#
+# Centroids are stored in the command_adaptations table, keyed
+# on the embedding model identity (vectors of another model are
+# meaningless). hits is capped at ADAPT_MAX_HITS, after which the
+# mean becomes an exponential moving average and keeps tracking
+# how the user phrases things now.
+#
+# ROUTER_ADAPT_WEIGHT=0 disables adaptation.
+# ============================================================
+
+import os
+
+import numpy as np
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+ADAPT_WEIGHT = float(os.getenv("ROUTER_ADAPT_WEIGHT", "0.75"))
+
+# Successes needed for half of ADAPT_WEIGHT
+ADAPT_PRIOR = 3.0
+
+ADAPT_MAX_HITS = 20
+
+# Candidates per query that are adjusted (independent of catalog size)
+ADAPT_CANDIDATES = 5
+
+# ============================================================
+# ADAPTATION TABLE
+# ============================================================
+
+class AdaptationTable:
+    """
+    Per-command centroids aligned with the routing matrix's
+    command order.
+
+    `means` holds the running means as stored, `centroids` their
+    unit-length directions (zero rows for commands never adapted),
+    `weights` the per-command pull w (0 when never adapted).
+    """
+
+    def __init__(self, command_ids, dim: int, rows=()):
+        self.command_ids = np.asarray(command_ids, dtype=np.int64)
+        self.dim = dim
+
+        n = len(self.command_ids)
+        self.means = np.zeros((n, dim), dtype=np.float32)
+        self.centroids = np.zeros((n, dim), dtype=np.float32)
+        self.hits = np.zeros(n, dtype=np.int64)
+        self.weights = np.zeros(n, dtype=np.float32)
+
+        self._position = {int(c): i for i, c in enumerate(self.command_ids)}
+
+        for command_id, mean, hits in rows:
+            i = self._position.get(int(command_id))
+            if i is None or mean.shape != (dim,):
+                continue
+            self._set(i, mean, hits)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.hits))
+
+    def _set(self, i: int, mean: np.ndarray, hits: int):
+        self.means[i] = mean
+        self.hits[i] = hits
+
+        norm = float(np.linalg.norm(mean))
+        self.centroids[i] = mean / norm if norm > 0 else 0.0
+        self.weights[i] = ADAPT_WEIGHT * hits / (hits + ADAPT_PRIOR)
+
+    def update(self, command_id: int, vector: np.ndarray):
+        """
+        Fold one successful query vector into its command's mean.
+
+        Returns:
+            (mean, hits) to persist, or None if the command is not
+            part of the routing matrix
+        """
+        i = self._position.get(int(command_id))
+        if i is None:
+            return None
+
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape != (self.dim,):
+            return None
+
+        hits = min(int(self.hits[i]) + 1, ADAPT_MAX_HITS)
+        mean = self.means[i] + (vector - self.means[i]) / hits
+
+        self._set(i, mean, hits)
+        return self.means[i].copy(), hits
+
+    def apply(
+        self,
+        scores: np.ndarray,
+        q_embeddings: np.ndarray,
+        candidates: np.ndarray
+    ) -> np.ndarray:
+        """
+        Adjusted copy of `scores` (q, n_commands).
+
+        Only `candidates` (q, k) command positions are touched,
+        with one gathered (q, k, dim) product for the whole batch.
+        Candidates that were not scored (-inf) stay that way.
+        """
+        weights = self.weights[candidates]
+        if not weights.any():
+            return scores
+
+        similarities = np.einsum(
+            "qkd,qd->qk",
+            self.centroids[candidates],
+            np.asarray(q_embeddings, dtype=np.float32)
+        )
+
+        current = np.take_along_axis(scores, candidates, axis=-1)
+        finite = np.isfinite(current)
+        lift = np.where(finite, np.maximum(similarities - current, 0.0), 0.0)
+
+        adjusted = np.array(scores, dtype=np.float32, copy=True)
+        np.put_along_axis(adjusted, candidates, current + weights * lift, axis=-1)
+        return adjusted
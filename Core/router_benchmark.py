@@ -0,0 +1,431 @@
+# ============================================================
+# router_benchmark.py
+# ============================================================
+# Latency and accuracy benchmark for Function_Router.
+#
+# Usage:
+#   python -m Core.router_benchmark
+#   python -m Core.router_benchmark --backend onnx-int8
+#   python -m Core.router_benchmark --model-path ./other-model --json
+#   python -m Core.router_benchmark --reduced-dim 256 --reduction pca
+#
+# Dataset: router_benchmark.json, a list of
+#   {"query": "...", "command": "<command_name>" | null}
+# null marks out-of-scope queries the router should REJECT.
+#
+# Reports:
+#   - cold load    : model construction time
+#   - encode       : single-query encode latency p50/p95/p99
+#   - scoring      : ranking latency per query (encode excluded)
+#   - accuracy     : top-1 / top-k over in-scope queries
+#   - decisions    : AUTO_EXECUTE / CONFIRM / REJECT rates under
+#                    the current thresholds, plus how often an
+#                    AUTO_EXECUTE picked the wrong command
+#   - reduction    : with --reduced-dim, top-1 / top-k in the
+#                    reduced space (with and without full-vector
+#                    re-ranking) and the loss against full vectors
+#
+# With the deployed model and backend the stored catalog vectors
+# are used. Any other model or backend re-encodes the catalog in
+# memory, so candidates are compared like for like.
+#
+# Every model goes through the same path: queries are chunked and
+# capped at ROUTER_MAX_SEQ_LENGTH x ROUTER_MAX_CHUNKS as the router
+# encodes them, and the catalog is scanned exactly without per-user
+# adaptations, IVF or ROUTER_REDUCED_DIM (see --reduced-dim), so
+# the deployed run measures the model rather than this host's
+# routing state.
+#
+# RULES:
+# - Offline tooling only; never imported by the shell
+# - Never writes to the database
+# ============================================================
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from Core import Function_Router as router
+from Core.command_index import build_routing_matrix
+from Core.db_reader import get_routing_texts
+from Core.dim_reduction import RERANK_TOP, SUPPORTED_REDUCTIONS, fit_reduction
+from Core.embedding_backend import SUPPORTED_BACKENDS, load_embedding_model
+from Core.embedding_codec import pack_embedding
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+DATASET_PATH = Path(__file__).resolve().parent / "router_benchmark.json"
+
+DEFAULT_TOP_K = 3
+DEFAULT_REPEAT = 3
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def load_dataset(path=DATASET_PATH):
+    """
+    Read the labeled query -> command dataset.
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _percentiles(samples_s):
+    """
+    p50 / p95 / p99 / mean of a list of durations, in milliseconds.
+    """
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    if not ms.size:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "mean": float(ms.mean()),
+    }
+
+
+def encode_catalog(model, batch_size: int = router.ENCODE_BATCH_SIZE):
+    """
+    Encode every routing text with `model`.
+
+    Returns:
+        (command_ids, command_names, matrix, row_offsets)
+    """
+    rows = get_routing_texts()
+    vectors = model.encode(
+        [text for _, _, text in rows],
+        batch_size=batch_size,
+        normalize_embeddings=True
+    )
+    return build_routing_matrix([
+        (command_id, name, pack_embedding(vector))
+        for (command_id, name, _), vector in zip(rows, vectors)
+    ])
+
+
+def _accuracy(rankings, expected, top_k: int):
+    """
+    (top-1, top-k) accuracy over the in-scope queries.
+    """
+    pairs = [
+        ([name for _, name, _ in ranked], target)
+        for ranked, target in zip(rankings, expected)
+        if target is not None
+    ]
+    if not pairs:
+        return 0.0, 0.0
+
+    top1 = sum(names[:1] == [target] for names, target in pairs)
+    topk = sum(target in names[:top_k] for names, target in pairs)
+    return top1 / len(pairs), topk / len(pairs)
+
+
+def _route(query, ranked):
+    """
+    Decision exactly as route_command would take it, given the
+    ranking for `query`.
+    """
+    shortcut = router._lexical_shortcut(query)
+    if shortcut is not None:
+        return shortcut[:3]
+    return router._decide(ranked[:2])
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+def run_benchmark(
+    model_path=None,
+    backend=None,
+    dataset=None,
+    top_k: int = DEFAULT_TOP_K,
+    repeat: int = DEFAULT_REPEAT,
+    reencode: bool = False,
+    reduced_dim: int = 0,
+    reduction_method: str = "pca",
+    rerank_top: int = RERANK_TOP
+) -> dict:
+    """
+    Measure the router on a labeled dataset.
+
+    Returns a report dict (see print_report for its layout).
+    """
+    model_path = str(model_path or router.MODEL_PATH)
+    backend = (backend or router.EMBEDDING_BACKEND).lower()
+    dataset = dataset if dataset is not None else load_dataset()
+
+    queries = [item["query"] for item in dataset]
+    expected = [item.get("command") for item in dataset]
+
+    # Cold load
+    start = time.perf_counter()
+    model = load_embedding_model(model_path, backend)
+    cold_load_s = time.perf_counter() - start
+
+    # First forward pass pays for lazy initialisation; keep it apart
+    start = time.perf_counter()
+    model.encode("warm up", normalize_embeddings=True)
+    first_encode_s = time.perf_counter() - start
+
+    deployed = (
+        Path(model_path).resolve() == Path(router.MODEL_PATH).resolve()
+        and backend == router.EMBEDDING_BACKEND
+    )
+
+    # db_vector_manager encodes the stored catalog without the
+    # query caps, so a candidate's catalog is encoded before them
+    if deployed and not reencode:
+        routing = router._load_command_embeddings()
+    else:
+        routing = encode_catalog(model)
+
+    router._cap_sequence_length(model)
+
+    # Single-query encode latency (the interactive case; no cache)
+    encode_samples = []
+    vectors = []
+    for query in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            vector = router._encode_local([query], model)[0]
+            encode_samples.append(time.perf_counter() - start)
+        vectors.append(np.asarray(vector, dtype=np.float32))
+
+    q_embeddings = np.vstack(vectors)
+
+    # Batched encode of the whole dataset
+    start = time.perf_counter()
+    router._encode_local(queries, model)
+    batch_encode_s = time.perf_counter() - start
+
+    # Scoring latency (ranking only)
+    router.rank_embeddings(queries[:1], q_embeddings[:1], top_k=top_k, routing=routing)
+
+    scoring_samples = []
+    rankings = []
+    for i, query in enumerate(queries):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ranked = router.rank_embeddings(
+                [query], q_embeddings[i:i + 1], top_k=top_k, routing=routing
+            )[0]
+            scoring_samples.append(time.perf_counter() - start)
+        rankings.append(ranked)
+
+    # Accuracy and decisions
+    top1 = topk = in_scope = 0
+    decisions = {"AUTO_EXECUTE": 0, "CONFIRM": 0, "REJECT": 0}
+    wrong_auto = 0
+    out_of_scope_rejected = 0
+    misses = []
+
+    lexical = router._load_lexical_index()
+    names_by_id = dict(zip(lexical.command_ids.tolist(), lexical.command_names))
+
+    for query, target, ranked in zip(queries, expected, rankings):
+        names = [name for _, name, _ in ranked]
+        command_id, decision, _ = _route(query, ranked)
+        decisions[decision] += 1
+
+        chosen = names_by_id.get(command_id)
+
+        if target is None:
+            if decision == "REJECT":
+                out_of_scope_rejected += 1
+            elif decision == "AUTO_EXECUTE":
+                wrong_auto += 1
+            continue
+
+        in_scope += 1
+        if names[:1] == [target]:
+            top1 += 1
+        else:
+            misses.append({"query": query, "expected": target, "got": names[:1]})
+        if target in names[:top_k]:
+            topk += 1
+        if decision == "AUTO_EXECUTE" and chosen != target:
+            wrong_auto += 1
+
+    total = len(queries)
+    out_of_scope = total - in_scope
+
+    reduction_report = None
+    if reduced_dim > 0:
+        reduction_report = _reduction_report(
+            queries, expected, q_embeddings, routing, top_k,
+            reduced_dim, reduction_method, rerank_top, repeat
+        )
+
+    return {
+        "model_path": model_path,
+        "backend": backend,
+        "catalog": "stored" if deployed and not reencode else "re-encoded",
+        "queries": total,
+        "repeat": repeat,
+        "cold_load_s": cold_load_s,
+        "first_encode_s": first_encode_s,
+        "encode_ms": _percentiles(encode_samples),
+        "batch_encode_ms_per_query": batch_encode_s * 1000.0 / max(total, 1),
+        "scoring_ms": _percentiles(scoring_samples),
+        "top_k": top_k,
+        "top1_accuracy": top1 / in_scope if in_scope else 0.0,
+        "topk_accuracy": topk / in_scope if in_scope else 0.0,
+        "decision_rates": {k: v / total for k, v in decisions.items()} if total else decisions,
+        "wrong_auto_execute": wrong_auto,
+        "out_of_scope_reject_rate": (
+            out_of_scope_rejected / out_of_scope if out_of_scope else 0.0
+        ),
+        "thresholds": {
+            "auto_execute": router.AUTO_EXECUTE_THRESHOLD,
+            "confirm": router.CONFIRM_THRESHOLD,
+            "min_margin": router.MIN_MARGIN,
+        },
+        "misses": misses,
+        "reduction": reduction_report,
+    }
+
+
+def _reduction_report(
+    queries, expected, q_embeddings, routing, top_k,
+    dim, method, rerank_top, repeat
+) -> dict:
+    """
+    Accuracy and scoring cost of a reduced-dimension scan, fitted
+    in memory on the same catalog, against the full vectors.
+    """
+    reduction = fit_reduction(np.asarray(routing[2]), dim, method)
+
+    def rank(**kwargs):
+        return router.rank_embeddings(
+            queries, q_embeddings, top_k=top_k, routing=routing, **kwargs
+        )
+
+    def timed(**kwargs):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rank(**kwargs)
+            samples.append((time.perf_counter() - start) / max(len(queries), 1))
+        return _percentiles(samples)
+
+    full = _accuracy(rank(), expected, top_k)
+    reduced = _accuracy(rank(reduction=reduction, rerank_top=0), expected, top_k)
+    reranked = _accuracy(rank(reduction=reduction, rerank_top=rerank_top), expected, top_k)
+
+    return {
+        "method": method,
+        "dim": reduction.dim,
+        "full_dim": int(np.asarray(routing[2]).shape[1]),
+        "rerank_top": rerank_top,
+        "full": {"top1": full[0], "topk": full[1]},
+        "reduced": {"top1": reduced[0], "topk": reduced[1]},
+        "reranked": {"top1": reranked[0], "topk": reranked[1]},
+        "top1_loss": full[0] - reduced[0],
+        "top1_loss_reranked": full[0] - reranked[0],
+        "scoring_ms_per_query": {
+            "full": timed(),
+            "reduced": timed(reduction=reduction, rerank_top=0),
+            "reranked": timed(reduction=reduction, rerank_top=rerank_top),
+        },
+    }
+
+# ============================================================
+# REPORTING
+# ============================================================
+
+def print_report(report: dict):
+    def fmt(p):
+        return f"p50 {p['p50']:.2f}  p95 {p['p95']:.2f}  p99 {p['p99']:.2f}  mean {p['mean']:.2f} ms"
+
+    print(f"[Benchmark] {report['backend']} @ {report['model_path']}")
+    print(f"  queries     : {report['queries']} (x{report['repeat']}), catalog {report['catalog']}")
+    print(f"  cold load   : {report['cold_load_s']:.2f} s (first encode {report['first_encode_s'] * 1000:.1f} ms)")
+    print(f"  encode      : {fmt(report['encode_ms'])}")
+    print(f"  batch encode: {report['batch_encode_ms_per_query']:.2f} ms/query")
+    print(f"  scoring     : {fmt(report['scoring_ms'])}")
+    print(f"  top-1       : {report['top1_accuracy']:.1%}")
+    print(f"  top-{report['top_k']}       : {report['topk_accuracy']:.1%}")
+
+    t = report["thresholds"]
+    print(
+        f"  decisions   : (auto >= {t['auto_execute']}, confirm >= {t['confirm']}, "
+        f"margin >= {t['min_margin']})"
+    )
+    for decision, rate in report["decision_rates"].items():
+        print(f"    {decision:<13}{rate:.1%}")
+    print(f"  wrong AUTO  : {report['wrong_auto_execute']}")
+    print(f"  out-of-scope rejected: {report['out_of_scope_reject_rate']:.1%}")
+
+    r = report.get("reduction")
+    if r:
+        print(f"  reduction   : {r['method']} {r['full_dim']} -> {r['dim']} dims")
+        for label in ("full", "reduced", "reranked"):
+            acc = r[label]
+            cost = r["scoring_ms_per_query"][label]["mean"]
+            name = f"reranked (top {r['rerank_top']})" if label == "reranked" else label
+            print(
+                f"    {name:<20} top-1 {acc['top1']:.1%}  "
+                f"top-{report['top_k']} {acc['topk']:.1%}  {cost:.3f} ms/query"
+            )
+        print(
+            f"    top-1 loss: {r['top1_loss']:+.1%} "
+            f"({r['top1_loss_reranked']:+.1%} with re-ranking)"
+        )
+
+    for miss in report["misses"]:
+        print(f"  !! {miss['query']!r}: expected {miss['expected']}, got {miss['got']}")
+
+# ============================================================
+# SCRIPT ENTRY POINT
+# ============================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the semantic router")
+    parser.add_argument("--model-path", default=None,
+                        help="Model directory (default: EMBEDDING_MODEL_PATH)")
+    parser.add_argument("--backend", default=None, choices=SUPPORTED_BACKENDS,
+                        help="Embedding backend (default: EMBEDDING_BACKEND)")
+    parser.add_argument("--dataset", default=str(DATASET_PATH))
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--reencode", action="store_true",
+                        help="Re-encode the catalog even for the deployed model")
+    parser.add_argument("--reduced-dim", type=int, default=0,
+                        help="Also evaluate scoring in a reduced dimension")
+    parser.add_argument("--reduction", default="pca", choices=SUPPORTED_REDUCTIONS)
+    parser.add_argument("--rerank-top", type=int, default=RERANK_TOP)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        model_path=args.model_path,
+        backend=args.backend,
+        dataset=load_dataset(args.dataset),
+        top_k=args.k,
+        repeat=args.repeat,
+        reencode=args.reencode,
+        reduced_dim=args.reduced_dim,
+        reduction_method=args.reduction,
+        rerank_top=args.rerank_top,
+    )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,11 +3,16 @@
 # ============================================================
 # Seeds the authoritative command registry for JaiShell.
 #
+# Each command may list `examples`: extra user utterances that are
+# embedded alongside the description (see db_vector_manager.py) so
+# routing does not hinge on a single sentence.
+#
 # SAFE TO RUN MULTIPLE TIMES.
 # ============================================================
 
 import json
 from Core.db_connection import get_connection
+from Core.command_index import bump_catalog_generation
 
 # ============================================================
 # COMMAND DEFINITIONS (AUTHORITATIVE)
@@ -22,6 +27,11 @@ COMMANDS = [
         "command_name": "open",
         "category": "system.registry",
         "description": "Open a registered application, folder, or URL.",
+        "examples": [
+            "open my downloads folder",
+            "launch the spotify shortcut",
+            "open the docs link I saved",
+        ],
         "schema": {
             "name": {"type": "string", "required": True}
         },
@@ -32,6 +42,11 @@ COMMANDS = [
         "command_name": "register",
         "category": "system.registry",
         "description": "Register a shortcut for opening an app, folder, or URL.",
+        "examples": [
+            "save this folder as a shortcut called work",
+            "add a shortcut for vscode",
+            "remember this url as dashboard",
+        ],
         "schema": {
             "name": {"type": "string", "required": True},
             "path": {"type": "string", "required": True},
@@ -52,6 +67,10 @@ COMMANDS = [
         "command_name": "server-last-boot",
         "category": "server.monitoring",
         "description": "Check the last boot time of the server.",
+        "examples": [
+            "when did the server last restart",
+            "how long since the server rebooted",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -60,6 +79,11 @@ COMMANDS = [
         "command_name": "server-state",
         "category": "server.monitoring",
         "description": "Check whether the server is reachable.",
+        "examples": [
+            "is the server up",
+            "can you reach my home server",
+            "ping the server",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -68,6 +92,10 @@ COMMANDS = [
         "command_name": "server-ssh",
         "category": "server.control",
         "description": "Open an admin PowerShell session to manage the server.",
+        "examples": [
+            "connect to the server",
+            "give me a shell on the server",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -76,6 +104,10 @@ COMMANDS = [
         "command_name": "nextcloud-status",
         "category": "server.service",
         "description": "Check if the Nextcloud service is reachable.",
+        "examples": [
+            "is nextcloud working",
+            "check my cloud storage service",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -84,6 +116,10 @@ COMMANDS = [
         "command_name": "server-health",
         "category": "server.monitoring",
         "description": "Fetch CPU, RAM, GPU and temperature data from the server.",
+        "examples": [
+            "how hot is the server running",
+            "show server cpu and memory usage",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -96,6 +132,10 @@ COMMANDS = [
         "command_name": "github-repos",
         "category": "github.monitoring",
         "description": "List repositories from your GitHub account.",
+        "examples": [
+            "what repositories do I have",
+            "list my github projects",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -104,6 +144,10 @@ COMMANDS = [
         "command_name": "github-repo-summary",
         "category": "github.monitoring",
         "description": "Show a summary of a specific GitHub repository.",
+        "examples": [
+            "tell me about my jaishell repo",
+            "give me an overview of a repository",
+        ],
         "schema": {
             "repo": {"type": "string", "required": True}
         },
@@ -114,6 +158,10 @@ COMMANDS = [
         "command_name": "github-recent-commits",
         "category": "github.monitoring",
         "description": "Show recent commits of a GitHub repository.",
+        "examples": [
+            "what was committed recently to jaishell",
+            "last commits on my repo",
+        ],
         "schema": {
             "repo": {"type": "string", "required": True}
         },
@@ -124,6 +172,10 @@ COMMANDS = [
         "command_name": "github-repo-activity",
         "category": "github.monitoring",
         "description": "Check recent activity of a GitHub repository.",
+        "examples": [
+            "has anyone worked on this repo lately",
+            "recent activity on my project",
+        ],
         "schema": {
             "repo": {"type": "string", "required": True}
         },
@@ -134,6 +186,10 @@ COMMANDS = [
         "command_name": "github-languages",
         "category": "github.monitoring",
         "description": "Show language breakdown of a GitHub repository.",
+        "examples": [
+            "what languages is jaishell written in",
+            "language stats for my repo",
+        ],
         "schema": {
             "repo": {"type": "string", "required": True}
         },
@@ -148,6 +204,10 @@ COMMANDS = [
         "command_name": "news",
         "category": "info.news",
         "description": "Fetch the latest news headlines.",
+        "examples": [
+            "what's happening in the world",
+            "show me today's headlines",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -156,6 +216,11 @@ COMMANDS = [
         "command_name": "weather",
         "category": "info.weather",
         "description": "Fetch weather information for a city.",
+        "examples": [
+            "what's the weather in Delhi",
+            "is it going to rain in London",
+            "temperature in Mumbai",
+        ],
         "schema": {
             "city": {"type": "string", "required": True}
         },
@@ -170,6 +235,10 @@ COMMANDS = [
         "command_name": "system-specs",
         "category": "system.monitoring",
         "description": "Display local system specifications.",
+        "examples": [
+            "what hardware does this machine have",
+            "show my cpu and ram",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -178,6 +247,10 @@ COMMANDS = [
         "command_name": "system-uptime",
         "category": "system.monitoring",
         "description": "Show local machine uptime.",
+        "examples": [
+            "how long has this laptop been running",
+            "when did I last reboot my computer",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -186,6 +259,10 @@ COMMANDS = [
         "command_name": "wifi-status",
         "category": "system.monitoring",
         "description": "Show currently connected WiFi network.",
+        "examples": [
+            "which wifi am I connected to",
+            "what network am I on",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -198,6 +275,10 @@ COMMANDS = [
         "command_name": "summarize",
         "category": "ai.text",
         "description": "Summarize the contents of a file using AI.",
+        "examples": [
+            "summarize notes.txt",
+            "give me the gist of this file",
+        ],
         "schema": {
             "file_path": {"type": "string", "required": True}
         },
@@ -212,6 +293,10 @@ COMMANDS = [
         "command_name": "analytics",
         "category": "system.analytics",
         "description": "Show analytics about sessions, commands, and errors.",
+        "examples": [
+            "how many sessions have I had",
+            "show usage statistics for the shell",
+        ],
         "schema": {},
         "is_destructive": 0,
         "requires_confirmation": 0,
@@ -222,10 +307,42 @@ COMMANDS = [
 # SEED ROUTINE
 # ============================================================
 
+def _sync_examples(cur, command_name: str, examples: list):
+    """
+    Make command_examples for one command match its seed list.
+    Embeddings of removed examples are dropped via ON DELETE CASCADE.
+    """
+    cur.execute(
+        "SELECT command_id FROM commands WHERE command_name = ?",
+        (command_name,)
+    )
+    command_id = cur.fetchone()[0]
+
+    cur.executemany(
+        """
+        INSERT OR IGNORE INTO command_examples
+        (command_id, utterance)
+        VALUES (?, ?)
+        """,
+        [(command_id, utterance) for utterance in examples]
+    )
+
+    placeholders = ", ".join("?" for _ in examples)
+    cur.execute(
+        f"""
+        DELETE FROM command_examples
+        WHERE command_id = ?
+        AND utterance NOT IN ({placeholders})
+        """,
+        (command_id, *examples)
+    )
+
+
 def seed_commands():
     conn = get_connection()
     try:
         cur = conn.cursor()
+        changes_before = conn.total_changes
 
         for cmd in COMMANDS:
             cur.execute(
@@ -239,6 +356,12 @@ def seed_commands():
                     schema_json = excluded.schema_json,
                     is_destructive = excluded.is_destructive,
                     requires_confirmation = excluded.requires_confirmation
+                WHERE
+                    category IS NOT excluded.category
+                    OR description IS NOT excluded.description
+                    OR schema_json IS NOT excluded.schema_json
+                    OR is_destructive IS NOT excluded.is_destructive
+                    OR requires_confirmation IS NOT excluded.requires_confirmation
                 """,
                 (
                     cmd["command_name"],
@@ -250,6 +373,13 @@ def seed_commands():
                 )
             )
 
+        for cmd in COMMANDS:
+            _sync_examples(cur, cmd["command_name"], cmd.get("examples", []))
+
+        # Running shells reload their routing matrix on the next turn
+        if conn.total_changes != changes_before:
+            bump_catalog_generation(cur)
+
         conn.commit()
         print(f"Seeded / updated {len(COMMANDS)} commands.")
 
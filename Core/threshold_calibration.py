@@ -0,0 +1,416 @@
+# ============================================================
+# threshold_calibration.py
+# ============================================================
+# Offline calibration of the router thresholds from ai_decisions.
+#
+# Usage:
+#   python -m Core.threshold_calibration [--dry-run]
+#
+# Every AUTO_EXECUTE / CONFIRM decision is labelled by what
+# happened next:
+#   bad   - the execution of that turn errored, or the user
+#           re-phrased it: the next AI query came within
+#           REPHRASE_WINDOW seconds and shares at least
+#           REPHRASE_OVERLAP of its words, or a CONFIRM was answered
+#           by a new query routed to the same command. Unrelated
+#           back-to-back commands are not re-phrasings.
+#
+# Each intent of a multi-intent turn is its own decision, matched
+# to its own execution row; intents sharing a turn_id do not count
+# as re-phrasings of each other.
+#   good  - otherwise
+#
+# The table is streamed in chunks into a fixed-size 2-D histogram
+# over (confidence, margin), so memory does not grow with history.
+# From the histogram:
+#   AUTO_EXECUTE_THRESHOLD / MIN_MARGIN
+#       the pair that auto-executes the most turns while keeping
+#       their precision >= AUTO_PRECISION_TARGET; among pairs with
+#       the same coverage the strictest one wins, and the result
+#       never drops below the lowest observed confidence or the
+#       floors (the router's current CONFIRM_THRESHOLD,
+#       MIN_MARGIN_FLOOR)
+#   CONFIRM_THRESHOLD
+#       the lowest confidence whose band below the auto threshold
+#       is still right >= CONFIRM_PRECISION_TARGET of the time
+#
+# Results that are not strictly ordered (0 < confirm < auto) or
+# have a zero margin are refused. Stored results bump the catalog
+# generation, so running shells and the embedding daemon reload
+# them with the command embeddings.
+#
+# Caveats:
+# - REJECTed turns are never executed, so they carry no label;
+#   CONFIRM_THRESHOLD can only move within the observed range
+# - Rows without a margin (logged before margins were recorded,
+#   fast-path and lexical-shortcut decisions, whose scores are not
+#   cosine similarities) are skipped
+# ============================================================
+
+import argparse
+import sys
+
+import numpy as np
+
+from Core.db_connection import get_connection
+from Core import Function_Router as router
+from Core.command_index import bump_catalog_generation
+from Core.db_vector_manager import rebuild_command_index
+from Core.lexical_index import tokenize
+from Core.timestamps import now_ms, to_epoch_ms
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+REPHRASE_WINDOW = 60.0
+REPHRASE_OVERLAP = 0.5  # Jaccard overlap of the two queries' words
+
+AUTO_PRECISION_TARGET = 0.95
+CONFIRM_PRECISION_TARGET = 0.50
+
+MIN_SAMPLES = 30
+
+# Lowest MIN_MARGIN ever recommended (the auto-execute floor is the
+# router's current CONFIRM_THRESHOLD)
+MIN_MARGIN_FLOOR = 0.02
+FETCH_SIZE = 1000
+
+CONFIDENCE_BINS = 101   # 0.00 .. 1.00
+MARGIN_BINS = 51        # 0.00 .. 0.50 (larger margins share the last bin)
+BIN_WIDTH = 0.01
+
+# ============================================================
+# STREAMING
+# ============================================================
+
+OUTCOME_SQL = """
+SELECT
+    d.session_id,
+    d.raw_input,
+    d.confidence,
+    d.margin,
+    d.decision_type,
+    d.timestamp,
+    d.turn_id,
+    d.chosen_command_id,
+    (
+        SELECT e.status
+        FROM command_executions e
+        WHERE e.session_id = d.session_id
+          AND e.mode = 'ai'
+          AND e.raw_input = d.raw_input
+          AND e.timestamp >= d.timestamp
+        ORDER BY e.timestamp ASC
+        LIMIT 1
+    ) AS status
+FROM ai_decisions d
+ORDER BY d.session_id ASC, d.decision_id ASC
+"""
+
+
+def _to_seconds(timestamp) -> float:
+    # Stored timestamps are epoch milliseconds
+    ms = to_epoch_ms(timestamp)
+    return ms / 1000.0 if ms is not None else 0.0
+
+
+def _word_overlap(a: str, b: str) -> float:
+    words_a, words_b = set(tokenize(a)), set(tokenize(b))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def _rephrased(row, next_row) -> bool:
+    """
+    True if next_row is evidence that row's result was not accepted.
+    """
+    session_id, raw_input, _, _, decision_type, ts, turn_id, command_id, _ = row
+
+    if (
+        next_row is None
+        or next_row[0] != session_id
+        or next_row[1] == raw_input
+        # Intents of one multi-intent turn are not re-phrasings
+        or (turn_id is not None and next_row[6] == turn_id)
+        or _to_seconds(next_row[5]) - _to_seconds(ts) > REPHRASE_WINDOW
+    ):
+        return False
+
+    if _word_overlap(raw_input, next_row[1]) >= REPHRASE_OVERLAP:
+        return True
+
+    # Asked to confirm, the user typed the request again instead
+    return decision_type == "CONFIRM" and next_row[7] == command_id
+
+
+def stream_outcomes(conn):
+    """
+    Yield (confidence, margin, good) for every labelable decision.
+
+    A decision's rephrase label depends on the next decision of the
+    same session, so each row is emitted one row late.
+    """
+    cur = conn.cursor()
+    cur.execute(OUTCOME_SQL)
+
+    previous = None
+
+    def emit(row, next_row):
+        _, _, confidence, margin, decision_type, _, _, _, status = row
+        if decision_type not in ("AUTO_EXECUTE", "CONFIRM"):
+            return None
+        if confidence is None or margin is None:
+            return None
+
+        good = status != "error" and not _rephrased(row, next_row)
+        return float(confidence), float(margin), good
+
+    while True:
+        rows = cur.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+
+        for row in rows:
+            if previous is not None:
+                sample = emit(previous, row)
+                if sample is not None:
+                    yield sample
+            previous = row
+
+    if previous is not None:
+        sample = emit(previous, None)
+        if sample is not None:
+            yield sample
+
+
+def build_histograms(samples):
+    """
+    Accumulate (total, good) counts over (confidence, margin) bins.
+    """
+    total = np.zeros((CONFIDENCE_BINS, MARGIN_BINS), dtype=np.int64)
+    good = np.zeros_like(total)
+
+    for confidence, margin, is_good in samples:
+        ci = min(max(int(confidence / BIN_WIDTH), 0), CONFIDENCE_BINS - 1)
+        mi = min(max(int(margin / BIN_WIDTH), 0), MARGIN_BINS - 1)
+        total[ci, mi] += 1
+        good[ci, mi] += is_good
+
+    return total, good
+
+# ============================================================
+# THRESHOLD SEARCH
+# ============================================================
+
+def _suffix_sums(counts: np.ndarray) -> np.ndarray:
+    # out[i, j] = counts[i:, j:].sum()
+    return counts[::-1, ::-1].cumsum(axis=0).cumsum(axis=1)[::-1, ::-1]
+
+
+def _bin(value: float, bins: int) -> int:
+    # Smallest bin whose lower edge is >= value
+    return min(max(int(np.ceil(round(value / BIN_WIDTH, 6))), 0), bins - 1)
+
+
+def recommend_thresholds(
+    total: np.ndarray,
+    good: np.ndarray,
+    auto_target: float = AUTO_PRECISION_TARGET,
+    confirm_target: float = CONFIRM_PRECISION_TARGET,
+    auto_floor: float = None,
+    margin_floor: float = MIN_MARGIN_FLOOR
+) -> dict:
+    """
+    Pick thresholds from the outcome histograms.
+
+    auto_floor defaults to the router's current CONFIRM_THRESHOLD.
+
+    Returns a dict with auto_execute / confirm / min_margin plus the
+    expected auto-execute share and precision.
+    """
+    if auto_floor is None:
+        auto_floor = router.CONFIRM_THRESHOLD
+
+    samples = int(total.sum())
+
+    auto_total = _suffix_sums(total)
+    auto_good = _suffix_sums(good)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(auto_total > 0, auto_good / auto_total, 0.0)
+
+    feasible = (precision >= auto_target) & (auto_total > 0)
+
+    if feasible.any():
+        # Most auto-executed turns. Every bin at or below the lowest
+        # observed value covers the same turns, so among equal
+        # coverage take the highest confidence, then the highest
+        # margin
+        coverage = np.where(feasible, auto_total, -1)
+        ti_all, mi_all = np.nonzero(coverage == coverage.max())
+        ti = int(ti_all.max())
+        mi = int(mi_all[ti_all == ti].max())
+
+        # Never below the lowest observed confidence or the floors
+        observed = np.flatnonzero(total.sum(axis=1))
+        ti = max(ti, int(observed[0]), _bin(auto_floor, CONFIDENCE_BINS))
+        mi = max(mi, _bin(margin_floor, MARGIN_BINS))
+
+        auto_threshold = ti * BIN_WIDTH
+        min_margin = mi * BIN_WIDTH
+        auto_share = auto_total[ti, mi] / samples
+        auto_precision = float(precision[ti, mi])
+    else:
+        auto_threshold = router.AUTO_EXECUTE_THRESHOLD
+        min_margin = router.MIN_MARGIN
+        ti = min(int(round(auto_threshold / BIN_WIDTH)), CONFIDENCE_BINS - 1)
+        auto_share = 0.0
+        auto_precision = None
+
+    # Confirm band [c, auto_threshold), any margin
+    band_total = total.sum(axis=1)[:ti]
+    band_good = good.sum(axis=1)[:ti]
+    band_total_from = band_total[::-1].cumsum()[::-1]
+    band_good_from = band_good[::-1].cumsum()[::-1]
+
+    # Only observed confidences are candidates: below the lowest
+    # logged decision there is no evidence either way
+    confirm_threshold = None
+    for ci in range(ti):
+        if not band_total[ci]:
+            continue
+        if band_good_from[ci] / band_total_from[ci] >= confirm_target:
+            confirm_threshold = ci * BIN_WIDTH
+            break
+
+    if confirm_threshold is None:
+        confirm_threshold = router.CONFIRM_THRESHOLD
+
+    return {
+        "auto_execute": round(float(auto_threshold), 2),
+        "confirm": round(float(confirm_threshold), 2),
+        "min_margin": round(float(min_margin), 2),
+        "samples": samples,
+        "auto_share": float(auto_share),
+        "auto_precision": auto_precision,
+    }
+
+def threshold_problems(recommended: dict) -> list:
+    """
+    Reasons the recommended thresholds must not be stored (empty
+    when they are usable).
+    """
+    auto = recommended["auto_execute"]
+    confirm = recommended["confirm"]
+    margin = recommended["min_margin"]
+
+    problems = []
+    if auto <= 0 or confirm <= 0 or margin <= 0:
+        problems.append("a threshold is zero")
+    if auto <= confirm:
+        problems.append(f"auto-execute {auto:.2f} is not above confirm {confirm:.2f}")
+    return problems
+
+# ============================================================
+# PERSISTENCE
+# ============================================================
+
+def store_thresholds(recommended: dict):
+    """
+    Write the recommended thresholds to the settings table and bump
+    the catalog generation in one transaction, so running routers
+    reload them.
+
+    Raises ValueError for thresholds threshold_problems rejects.
+    """
+    problems = threshold_problems(recommended)
+    if problems:
+        raise ValueError("Refusing to store thresholds: " + "; ".join(problems))
+
+    values = {
+        "router_auto_execute_threshold": recommended["auto_execute"],
+        "router_confirm_threshold": recommended["confirm"],
+        "router_min_margin": recommended["min_margin"],
+        "router_calibration_samples": recommended["samples"],
+        "router_calibrated_at": now_ms(),
+    }
+
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN")
+        conn.executemany(
+            """
+            INSERT INTO settings (key, value)
+            VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """,
+            [(key, str(value)) for key, value in values.items()]
+        )
+        bump_catalog_generation(conn.cursor())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# ============================================================
+# SCRIPT ENTRY POINT
+# ============================================================
+
+def calibrate(dry_run: bool = False) -> dict:
+    conn = get_connection()
+    try:
+        total, good = build_histograms(stream_outcomes(conn))
+    finally:
+        conn.close()
+
+    # Current values first: they are the baseline and the floor
+    router.load_calibrated_thresholds()
+    recommended = recommend_thresholds(total, good)
+
+    print(f"[Calibration] {recommended['samples']} labelled decisions")
+    if recommended["samples"] < MIN_SAMPLES:
+        print(f"[Calibration] Need at least {MIN_SAMPLES}. Thresholds unchanged.")
+        return recommended
+
+    print(f"  AUTO_EXECUTE_THRESHOLD : {router.AUTO_EXECUTE_THRESHOLD:.2f} -> {recommended['auto_execute']:.2f}")
+    print(f"  CONFIRM_THRESHOLD      : {router.CONFIRM_THRESHOLD:.2f} -> {recommended['confirm']:.2f}")
+    print(f"  MIN_MARGIN             : {router.MIN_MARGIN:.2f} -> {recommended['min_margin']:.2f}")
+
+    if recommended["auto_precision"] is None:
+        print(f"  No auto-execute setting reaches {AUTO_PRECISION_TARGET:.0%} precision; kept current.")
+    else:
+        print(
+            f"  expected auto-execute: {recommended['auto_share']:.1%} of turns "
+            f"at {recommended['auto_precision']:.1%} precision"
+        )
+
+    problems = threshold_problems(recommended)
+    if problems:
+        print("[Calibration] Not usable (" + "; ".join(problems) + "). Thresholds unchanged.")
+        return recommended
+
+    if dry_run:
+        print("[Calibration] Dry run. Nothing stored.")
+    else:
+        store_thresholds(recommended)
+        rebuild_command_index()
+        print("[Calibration] Stored in settings. Running shells apply them on their next routing call.")
+
+    return recommended
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate router thresholds from ai_decisions")
+    parser.add_argument("--dry-run", action="store_true", help="Print without storing")
+    args = parser.parse_args(argv)
+
+    calibrate(dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# ============================================================
+# timestamps.py
+# ============================================================
+# Timestamp representation shared by every table.
+#
+# All stored timestamps are INTEGER milliseconds since the Unix
+# epoch (UTC). Integers compare, index and subtract without any
+# parsing, so time-window queries are plain range scans.
+#
+# This module is responsible ONLY for:
+#   - Producing the current time in epoch milliseconds
+#   - Converting legacy values (ISO-8601 text, datetimes) to it
+#   - Formatting stored values for display (local time)
+#
+# It does NOT touch the database.
+# ============================================================
+
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+# ============================================================
+# CONVERSION
+# ============================================================
+
+def now_ms() -> int:
+    """
+    Current time in epoch milliseconds.
+    """
+    return time.time_ns() // 1_000_000
+
+
+def to_epoch_ms(value) -> Optional[int]:
+    """
+    Convert a timestamp to epoch milliseconds.
+
+    Accepts epoch milliseconds (int / float / digit strings),
+    datetimes and ISO-8601 text. Naive values are local time,
+    which is how datetime.now().isoformat() wrote them.
+
+    Returns None for None or unparseable input.
+    """
+    if value is None:
+        return None
+
+    if isinstance(value, bool):
+        return None
+
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+
+    text = str(value).strip()
+    if text.lstrip("-").isdigit():
+        return int(text)
+
+    try:
+        return int(datetime.fromisoformat(text).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    """
+    Local datetime for an epoch-millisecond value.
+    """
+    return datetime.fromtimestamp(ms / 1000)
+
+
+def format_ms(ms, fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
+    """
+    Display string for a stored timestamp ("" when missing).
+    """
+    ms = to_epoch_ms(ms)
+    if ms is None:
+        return ""
+    return from_epoch_ms(ms).strftime(fmt)
+
+# ============================================================
+# WINDOWS
+# ============================================================
+
+def window(days: float = 0, hours: float = 0, minutes: float = 0) -> Tuple[int, int]:
+    """
+    (start_ms, end_ms) covering the given span up to now.
+    """
+    end = now_ms()
+    span = ((days * 24 + hours) * 60 + minutes) * 60_000
+    return end - int(span), end
@@ -0,0 +1,296 @@
+# ============================================================
+# vector_index.py
+# ============================================================
+# Pluggable vector indexes for the semantic router.
+#
+# Indexes (ROUTER_INDEX):
+#   exact  - brute-force scan of every routing row (default)
+#   ivf    - inverted-file index: rows are clustered around
+#            spherical k-means centroids; a query only scores the
+#            rows of its ROUTER_IVF_NPROBE closest clusters
+#
+# Every index exposes:
+#   score(queries) -> (q, rows) float32 scores
+# Rows that were not visited score -inf, so per-command pooling
+# and top-k selection in Function_Router work unchanged.
+#
+# The IVF index is built by db_vector_manager and persisted next
+# to the database (command_ivf.npz), tagged with the catalog
+# generation it was built from.
+#
+# Usage (recall against the exact scan):
+#   python -m Core.vector_index recall [--nprobe 4] [--k 3]
+# ============================================================
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from Core.db_connection import BASE_DIR
+from Core.embedding_codec import normalize_rows
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+SUPPORTED_INDEXES = ("exact", "ivf")
+
+ROUTER_INDEX = os.getenv("ROUTER_INDEX", "exact").lower()
+IVF_NPROBE = int(os.getenv("ROUTER_IVF_NPROBE", "4"))
+
+IVF_INDEX_PATH = BASE_DIR / "command_ivf.npz"
+IVF_KMEANS_ITERATIONS = 20
+IVF_SEED = 13
+
+# ============================================================
+# EXACT INDEX
+# ============================================================
+
+class ExactIndex:
+    """
+    Brute-force scan: one matrix product over every row.
+    """
+
+    name = "exact"
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def score(self, queries: np.ndarray) -> np.ndarray:
+        return queries @ self.matrix.T
+
+# ============================================================
+# IVF INDEX
+# ============================================================
+
+class IVFIndex:
+    """
+    Inverted-file index over unit-normalized rows.
+
+    list_rows holds row numbers grouped by cluster; cluster c owns
+    list_rows[list_offsets[c]:list_offsets[c + 1]].
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_rows: np.ndarray,
+        nprobe: int = IVF_NPROBE
+    ):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = max(1, min(nprobe, len(centroids)))
+
+    def _probe_rows(self, query: np.ndarray) -> np.ndarray:
+        centroid_scores = self.centroids @ query
+        if self.nprobe < len(centroid_scores):
+            lists = np.argpartition(-centroid_scores, self.nprobe - 1)[:self.nprobe]
+        else:
+            lists = np.arange(len(centroid_scores))
+
+        return np.concatenate([
+            self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]]
+            for c in lists
+        ])
+
+    def score(self, queries: np.ndarray) -> np.ndarray:
+        scores = np.full((queries.shape[0], self.matrix.shape[0]), -np.inf, dtype=np.float32)
+
+        for q, query in enumerate(queries):
+            rows = self._probe_rows(query)
+            scores[q, rows] = self.matrix[rows] @ query
+
+        return scores
+
+# ============================================================
+# IVF BUILD / PERSISTENCE
+# ============================================================
+
+def _default_list_count(rows: int) -> int:
+    return max(1, int(np.sqrt(rows)))
+
+
+def build_ivf(matrix: np.ndarray, n_lists: int = None):
+    """
+    Spherical k-means over unit rows.
+
+    Returns:
+        (centroids, list_offsets, list_rows)
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    rows = matrix.shape[0]
+    n_lists = min(n_lists or _default_list_count(rows), rows)
+
+    rng = np.random.default_rng(IVF_SEED)
+    centroids = matrix[rng.choice(rows, size=n_lists, replace=False)].copy()
+
+    assignment = np.zeros(rows, dtype=np.intp)
+    for _ in range(IVF_KMEANS_ITERATIONS):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, matrix)
+
+        # Empty clusters keep their previous centroid
+        empty = ~np.any(sums, axis=1)
+        sums[empty] = centroids[empty]
+        centroids = normalize_rows(sums)
+
+    assignment = np.argmax(matrix @ centroids.T, axis=1)
+
+    list_rows = np.argsort(assignment, kind="stable").astype(np.intp)
+    counts = np.bincount(assignment, minlength=n_lists)
+    list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.intp)
+
+    return centroids, list_offsets, list_rows
+
+
+def write_ivf_index(matrix: np.ndarray, generation: int, n_lists: int = None):
+    """
+    Build and persist the IVF index for a routing matrix.
+    """
+    centroids, list_offsets, list_rows = build_ivf(matrix, n_lists)
+
+    tmp_path = IVF_INDEX_PATH.with_name("command_ivf.tmp.npz")
+    np.savez(
+        tmp_path,
+        centroids=centroids,
+        list_offsets=list_offsets,
+        list_rows=list_rows,
+        generation=np.int64(generation),
+        rows=np.int64(matrix.shape[0]),
+    )
+    os.replace(tmp_path, IVF_INDEX_PATH)
+
+    return len(centroids)
+
+
+def load_ivf_index(matrix: np.ndarray, generation: int, nprobe: int = IVF_NPROBE):
+    """
+    Open the persisted IVF index for `matrix`.
+
+    Returns None if it is missing or built from another generation.
+    """
+    if not IVF_INDEX_PATH.exists():
+        return None
+
+    try:
+        with np.load(IVF_INDEX_PATH) as data:
+            if int(data["generation"]) != generation or int(data["rows"]) != matrix.shape[0]:
+                return None
+
+            return IVFIndex(
+                matrix,
+                data["centroids"],
+                data["list_offsets"],
+                data["list_rows"],
+                nprobe=nprobe
+            )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def create_index(kind: str, matrix: np.ndarray, generation: int):
+    """
+    Index of the requested kind, falling back to the exact scan
+    when an approximate index is unavailable.
+    """
+    if kind == "ivf":
+        index = load_ivf_index(matrix, generation)
+        if index is not None:
+            return index
+
+    return ExactIndex(matrix)
+
+# ============================================================
+# RECALL MEASUREMENT
+# ============================================================
+
+def _top_commands(scores: np.ndarray, row_offsets: np.ndarray, k: int):
+    pooled = np.maximum.reduceat(scores, row_offsets, axis=-1)
+    order = np.argsort(-pooled, axis=-1, kind="stable")[:, :k]
+    return [
+        {c for c in row if np.isfinite(p[c])}
+        for row, p in zip(order, pooled)
+    ]
+
+
+def measure_recall(
+    index,
+    matrix: np.ndarray,
+    row_offsets: np.ndarray,
+    queries: np.ndarray,
+    k: int = 3
+) -> float:
+    """
+    Mean fraction of the exact top-k commands that `index` returns.
+    """
+    exact = _top_commands(ExactIndex(matrix).score(queries), row_offsets, k)
+    approx = _top_commands(index.score(queries), row_offsets, k)
+
+    hits = [len(e & a) / len(e) for e, a in zip(exact, approx) if e]
+    return float(np.mean(hits)) if hits else 1.0
+
+
+def synthetic_queries(matrix: np.ndarray, count: int = 200, noise: float = 0.5):
+    """
+    Perturbed copies of stored rows: near-neighbour queries that do
+    not exactly coincide with an indexed vector.
+    """
+    rng = np.random.default_rng(IVF_SEED)
+    picks = matrix[rng.integers(0, matrix.shape[0], size=count)]
+    jitter = rng.standard_normal(picks.shape).astype(np.float32)
+    jitter = normalize_rows(jitter) * noise
+    return normalize_rows(picks + jitter)
+
+# ============================================================
+# SCRIPT ENTRY POINT
+# ============================================================
+
+def main(argv=None):
+    from Core.db_reader import get_setting
+    from Core.command_index import CATALOG_GENERATION_KEY, load_command_index
+
+    parser = argparse.ArgumentParser(description="Vector index tooling")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    recall_cmd = sub.add_parser("recall", help="Measure IVF recall against the exact scan")
+    recall_cmd.add_argument("--nprobe", type=int, default=IVF_NPROBE)
+    recall_cmd.add_argument("--k", type=int, default=3)
+    recall_cmd.add_argument("--queries", type=int, default=200)
+
+    args = parser.parse_args(argv)
+
+    generation = int(get_setting(CATALOG_GENERATION_KEY, 0))
+    loaded = load_command_index(generation)
+    if loaded is None:
+        print("[Index] Routing index missing or stale. Run db_vector_manager first.")
+        return 1
+
+    _, _, matrix, row_offsets = loaded
+    index = load_ivf_index(matrix, generation, nprobe=args.nprobe)
+    if index is None:
+        print("[Index] IVF index missing or stale. Run db_vector_manager first.")
+        return 1
+
+    queries = synthetic_queries(np.asarray(matrix), count=args.queries)
+    recall = measure_recall(index, matrix, row_offsets, queries, k=args.k)
+
+    print(
+        f"[Index] IVF recall@{args.k}: {recall:.3f} "
+        f"(lists={len(index.centroids)}, nprobe={index.nprobe}, "
+        f"rows={matrix.shape[0]}, queries={len(queries)})"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
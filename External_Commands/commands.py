@@ -704,17 +704,28 @@ def shell_analytics_overview(args, context):
         from Core.db_reader import (
             get_total_sessions,
             get_recent_commands,
-            get_recent_errors
+            get_recent_errors,
+            get_command_counts_between,
+            get_errors_between
         )
+        from Core.timestamps import window
 
         sessions = get_total_sessions()
         commands = len(get_recent_commands(100))
         errors = len(get_recent_errors(100))
 
+        day_start, day_end = window(days=1)
+        day_commands = sum(
+            count for _, _, count in get_command_counts_between(day_start, day_end)
+        )
+        day_errors = len(get_errors_between(day_start, day_end))
+
         content = [
             f"Total sessions : {sessions}",
             f"Commands logged: {commands}",
             f"Errors recorded: {errors}",
+            f"Commands (24h) : {day_commands}",
+            f"Errors (24h)   : {day_errors}",
         ]
 
         return command_result(
@@ -10,7 +10,11 @@
 #
 # ============================================================
 
+import sys
+
 from Core.command_contract import command_result
+from Core.ContextManager import get_flag
+from Core.timestamps import format_ms
 from Core.db_reader import (
     get_total_sessions,
     get_recent_commands,
@@ -47,6 +51,24 @@ def shell_clear(args, context):
 # STATUS
 # ============================================================
 
+def _query_cache_summary() -> str:
+    """
+    One-line router query-cache summary.
+
+    The cache module is only consulted once AI mode has loaded it,
+    so RULE-only sessions never import the router stack.
+    """
+    query_cache = sys.modules.get("Core.query_cache")
+    if query_cache is None:
+        return "inactive"
+
+    stats = query_cache.get_cache_stats()
+    return (
+        f"{stats['hits']} hits, {stats['persistent_hits']} disk hits, "
+        f"{stats['misses']} misses ({stats['hit_rate']:.0%})"
+    )
+
+
 def shell_status(args, context):
     """
     Display current session status.
@@ -73,6 +95,8 @@ def shell_status(args, context):
         f"Session ID    : {session_id}",
         f"Commands Run  : {command_count}",
         f"Total Sessions: {total_sessions}",
+        f"AI Engine     : {get_flag(context, 'ai_warmup', 'not loaded')}",
+        f"Query Cache   : {_query_cache_summary()}",
         "────────────────────────────────────────"
     ]
 
@@ -155,8 +179,7 @@ def shell_history(args, context):
         content.append("No history available.")
     else:
         for raw_input, status, mode, ts in rows:
-            time_str = ts[11:19] if len(ts) >= 19 else ts
-            content.append(f"[{time_str}] {raw_input} ({status}, {mode})")
+            content.append(f"[{format_ms(ts, '%H:%M:%S')}] {raw_input} ({status}, {mode})")
 
     content.append("────────────────────────────────────────")
 
@@ -188,7 +211,7 @@ def shell_logs(args, context):
         content.append("No recent errors recorded.")
     else:
         for name, desc, origin, ts in rows:
-            content.append(f"[{ts}] {name} ({origin}): {desc}")
+            content.append(f"[{format_ms(ts)}] {name} ({origin}): {desc}")
 
     content.append("────────────────────────────────────────")
 
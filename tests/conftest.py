@@ -0,0 +1,18 @@
+import pytest
+
+import Core.db_connection as db_connection
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """
+    Fresh, initialized database for one test.
+    """
+    monkeypatch.setattr(db_connection, "DB_PATH", tmp_path / "shell.db")
+
+    from Core.db_init import init_db
+    init_db()
+
+    yield db_connection.DB_PATH
+
+    db_connection.close_thread_connection()
@@ -0,0 +1,35 @@
+import pytest
+
+from Core import Function_Router as router
+from Core import embedding_daemon
+
+
+@pytest.fixture
+def daemon(monkeypatch):
+    served = {}
+
+    def request(message):
+        served["op"] = message["op"]
+        return {"results": []}, b""
+
+    def serve(model_id):
+        monkeypatch.setattr(embedding_daemon, "daemon_info", lambda: {"model_id": model_id})
+        monkeypatch.setattr(embedding_daemon, "_request", request)
+        return served
+
+    return serve
+
+
+def test_daemon_with_other_sequence_caps_is_not_used(daemon, monkeypatch):
+    monkeypatch.setattr(router, "MAX_SEQ_LENGTH", 128)
+    served = daemon(f"{router._model_identity()}|seq=512x4")
+
+    assert embedding_daemon.daemon_route(["weather"], model_id=router._query_cache_identity()) is None
+    assert served == {}
+
+
+def test_daemon_with_same_identity_is_used(daemon):
+    served = daemon(router._query_cache_identity())
+
+    assert embedding_daemon.daemon_route(["weather"], model_id=router._query_cache_identity()) == []
+    assert served == {"op": "route"}
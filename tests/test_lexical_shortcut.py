@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+from Core import Function_Router as router
+from Core import threshold_calibration as tc
+from Core.lexical_index import LexicalIndex
+
+COMMANDS = [
+    (1, "open", "registry", "Open a registered program, folder or url"),
+    (2, "register", "registry", "Register a program, folder or url shortcut"),
+    (3, "server-ssh", "server", "Open an admin ssh session on the server"),
+    (4, "weather", "info", "Current weather for a city"),
+]
+
+
+@pytest.fixture
+def shortcut_router(monkeypatch):
+    index = LexicalIndex(COMMANDS)
+    monkeypatch.setattr(router, "LEXICAL_EARLY_EXIT", True)
+    monkeypatch.setattr(router, "_load_lexical_index", lambda: index)
+
+    def no_encode(*args, **kwargs):
+        raise AssertionError("a lexical shortcut must not encode")
+
+    monkeypatch.setattr(router, "_encode_queries", no_encode)
+    monkeypatch.setattr(router, "daemon_route", no_encode)
+    return router
+
+
+def test_shortcut_reports_no_margin(shortcut_router):
+    command_id, decision, confidence, margin, truncated_at = (
+        shortcut_router.route_command_detailed("weather London")
+    )
+
+    assert (command_id, decision) == (4, "AUTO_EXECUTE")
+    assert margin is None
+    assert truncated_at is None
+
+
+def test_name_inside_a_sentence_is_not_a_shortcut(shortcut_router):
+    assert shortcut_router._lexical_shortcut("is port 22 open on my server") is None
+    assert shortcut_router._lexical_shortcut("open an admin session on my server") is None
+
+
+def test_shortcut_decisions_are_excluded_from_calibration(temp_db):
+    conn = sqlite3.connect(temp_db)
+    conn.execute("INSERT INTO sessions (session_id, start_timestamp) VALUES (1, 0)")
+    conn.executemany(
+        """
+        INSERT INTO ai_decisions
+        (session_id, raw_input, confidence, margin, decision_type, turn_id, timestamp)
+        VALUES (1, ?, ?, ?, 'AUTO_EXECUTE', ?, ?)
+        """,
+        [
+            ("weather London", 1.0, None, 1, 1000),            # lexical shortcut
+            ("how cold is it outside", 0.82, 0.2, 2, 900_000),  # semantic
+        ]
+    )
+    conn.commit()
+
+    samples = list(tc.stream_outcomes(conn))
+    conn.close()
+
+    assert samples == [(pytest.approx(0.82), pytest.approx(0.2), True)]
+
+
+def test_shortcut_routes_are_not_adapted(shortcut_router):
+    semantic = (2, "AUTO_EXECUTE", 0.82, 0.2, None)
+    shortcut = shortcut_router.route_command_detailed("weather London")
+
+    assert shortcut_router.is_semantic_route(semantic)
+    assert not shortcut_router.is_semantic_route(shortcut)
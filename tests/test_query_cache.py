@@ -0,0 +1,28 @@
+import numpy as np
+
+from Core import db_writer, query_cache
+
+
+def test_store_queues_the_persistent_write(temp_db, monkeypatch):
+    monkeypatch.setattr(query_cache, "QUERY_CACHE_PERSIST", True)
+    queued = []
+    monkeypatch.setattr(db_writer, "_enqueue_group", queued.append)
+    vector = np.array([0.6, 0.8], dtype=np.float32)
+
+    query_cache.store_embedding("Is the server up", "model", vector)
+
+    # Served from the LRU straight away; the row only sits in the queue
+    assert np.allclose(query_cache.get_cached_embedding("is the  server up", "model"), vector)
+    assert len(queued) == 1
+    assert query_cache._read_persistent(query_cache.cache_key("is the server up", "model")) is None
+
+
+def test_queued_row_is_readable_after_flush(temp_db, monkeypatch):
+    monkeypatch.setattr(query_cache, "QUERY_CACHE_PERSIST", True)
+    vector = np.array([0.6, 0.8], dtype=np.float32)
+
+    query_cache.store_embedding("weather in London", "model", vector)
+    assert db_writer.flush_logs()
+
+    key = query_cache.cache_key("weather in London", "model")
+    assert np.allclose(query_cache._read_persistent(key), vector)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from Core import Function_Router as router
+
+
+class WordTokenizer:
+    def __call__(self, text, add_special_tokens=False):
+        return {"input_ids": text.split()}
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+class FakeModel:
+    tokenizer = WordTokenizer()
+
+    def encode(self, texts, batch_size=None, normalize_embeddings=True):
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+@pytest.fixture
+def small_caps(monkeypatch):
+    monkeypatch.setattr(router, "MAX_SEQ_LENGTH", 6)
+    monkeypatch.setattr(router, "MAX_CHUNKS", 2)
+    monkeypatch.setattr(router, "_truncations", {})
+    router._chunk_query.cache_clear()
+    yield
+    router._chunk_query.cache_clear()
+
+
+def test_unencoded_query_does_not_load_the_model(small_caps, monkeypatch):
+    def no_model():
+        raise AssertionError("query_truncation must not load the model")
+
+    monkeypatch.setattr(router, "get_model", no_model)
+
+    assert router.query_truncation("word " * 50) is None
+
+
+def test_local_encode_reports_truncation_once(small_caps, monkeypatch):
+    monkeypatch.setattr(router, "get_model", FakeModel)
+    long_query = " ".join(f"w{i}" for i in range(20))
+
+    router._encode_local([long_query, "short"])
+
+    # 4 tokens per chunk, 2 chunks kept
+    assert router.query_truncation(long_query) == 8
+    assert router.query_truncation(long_query) is None
+    assert router.query_truncation("short") is None
@@ -0,0 +1,51 @@
+import numpy as np
+
+from Core import Function_Router as router
+from Core import router_benchmark
+
+CATALOG = (
+    np.array([1, 2]),
+    ["weather", "open"],
+    np.eye(2, dtype=np.float32),
+    np.array([0, 1]),
+)
+
+
+class FakeModel:
+    max_seq_length = 512
+    tokenizer = None
+
+    def encode(self, texts, batch_size=None, normalize_embeddings=True):
+        if isinstance(texts, str):
+            return np.array([1.0, 0.0], dtype=np.float32)
+        return np.tile(np.array([1.0, 0.0], dtype=np.float32), (len(texts), 1))
+
+
+def test_deployed_and_candidate_runs_share_the_scoring_path(monkeypatch):
+    monkeypatch.setattr(router, "LEXICAL_WEIGHT", 0)
+    monkeypatch.setattr(router, "LEXICAL_EARLY_EXIT", False)
+    monkeypatch.setattr(router, "_load_command_embeddings", lambda: CATALOG)
+    monkeypatch.setattr(router, "_load_lexical_index", lambda: router.LexicalIndex(
+        [(1, "weather", "info", ""), (2, "open", "registry", "")]
+    ))
+    monkeypatch.setattr(router_benchmark, "encode_catalog", lambda model: CATALOG)
+    models = []
+    monkeypatch.setattr(
+        router_benchmark, "load_embedding_model",
+        lambda *args: models.append(FakeModel()) or models[-1]
+    )
+
+    def no_live_state(*args, **kwargs):
+        raise AssertionError("the benchmark must not use live routing state")
+
+    monkeypatch.setattr(router, "_get_adaptations", no_live_state)
+    monkeypatch.setattr(router, "_get_vector_index", no_live_state)
+
+    dataset = [{"query": "weather in London", "command": "weather"}]
+    deployed = router_benchmark.run_benchmark(dataset=dataset, repeat=1)
+    candidate = router_benchmark.run_benchmark(dataset=dataset, repeat=1, reencode=True)
+
+    assert (deployed["catalog"], candidate["catalog"]) == ("stored", "re-encoded")
+    assert deployed["top1_accuracy"] == candidate["top1_accuracy"] == 1.0
+    assert deployed["decision_rates"] == candidate["decision_rates"]
+    assert [model.max_seq_length for model in models] == [router.MAX_SEQ_LENGTH] * 2
@@ -0,0 +1,118 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from Core import threshold_calibration as tc
+
+
+def _histograms(samples):
+    return tc.build_histograms(samples)
+
+
+def _outcomes(db_path, decisions):
+    """
+    Labels stream_outcomes gives a session of
+    (raw_input, command_id, decision_type, seconds) decisions.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO sessions (session_id, start_timestamp) VALUES (1, 0)")
+    conn.executemany(
+        """
+        INSERT INTO commands (command_id, command_name, category, description, schema_json)
+        VALUES (?, ?, 'test', '', '{}')
+        """,
+        {(command_id, f"cmd{command_id}") for _, command_id, _, _ in decisions}
+    )
+    conn.executemany(
+        """
+        INSERT INTO ai_decisions
+        (session_id, raw_input, chosen_command_id, confidence, margin,
+         decision_type, turn_id, timestamp)
+        VALUES (1, ?, ?, 0.8, 0.2, ?, ?, ?)
+        """,
+        [
+            (raw_input, command_id, decision_type, turn, int(seconds * 1000))
+            for turn, (raw_input, command_id, decision_type, seconds)
+            in enumerate(decisions, start=1)
+        ]
+    )
+    conn.commit()
+
+    labels = [good for _, _, good in tc.stream_outcomes(conn)]
+    conn.close()
+    return labels
+
+
+def _mostly_good(good_share: float, n: int = 400, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    confidence = rng.uniform(0.45, 0.95, n)
+    margin = rng.uniform(0.05, 0.40, n)
+    good = rng.random(n) < good_share
+    return list(zip(confidence, margin, good))
+
+
+@pytest.mark.parametrize("good_share", [1.0, 0.97])
+def test_mostly_good_log_gives_sane_thresholds(good_share):
+    total, good = _histograms(_mostly_good(good_share))
+
+    recommended = tc.recommend_thresholds(total, good, auto_floor=0.60)
+
+    assert recommended["auto_execute"] >= 0.60
+    assert recommended["min_margin"] >= tc.MIN_MARGIN_FLOOR
+    assert 0 < recommended["confirm"] < recommended["auto_execute"]
+    assert tc.threshold_problems(recommended) == []
+
+    # Without a floor, never below the lowest observed confidence
+    unfloored = tc.recommend_thresholds(total, good, auto_floor=0.0)
+    assert unfloored["auto_execute"] >= 0.45
+
+
+def test_equal_coverage_prefers_strictest_setting():
+    # Every sample sits at confidence 0.80 / margin 0.30 and is good:
+    # all bins at or below it cover the same turns
+    total, good = _histograms([(0.80, 0.30, True)] * 50)
+
+    recommended = tc.recommend_thresholds(total, good, auto_floor=0.60)
+
+    assert recommended["auto_execute"] == pytest.approx(0.80)
+    assert recommended["min_margin"] == pytest.approx(0.30)
+    assert recommended["auto_share"] == pytest.approx(1.0)
+
+
+def test_unordered_or_zero_thresholds_are_refused():
+    bad = {"auto_execute": 0.60, "confirm": 0.60, "min_margin": 0.05, "samples": 50}
+    zero = {"auto_execute": 0.0, "confirm": 0.0, "min_margin": 0.0, "samples": 50}
+
+    assert tc.threshold_problems(bad)
+    assert tc.threshold_problems(zero)
+
+    with pytest.raises(ValueError):
+        tc.store_thresholds(zero)
+
+
+def test_unrelated_back_to_back_commands_stay_good(temp_db):
+    labels = _outcomes(temp_db, [
+        ("open chrome", 1, "AUTO_EXECUTE", 0),
+        ("open spotify", 1, "AUTO_EXECUTE", 5),
+        ("weather in London", 2, "AUTO_EXECUTE", 10),
+        ("summarize my notes", 3, "CONFIRM", 20),
+        ("what is the weather like", 2, "AUTO_EXECUTE", 30),
+    ])
+
+    assert labels == [True] * 5
+
+
+def test_rephrasings_are_labelled_bad(temp_db):
+    labels = _outcomes(temp_db, [
+        # Shares most of its words with the next query
+        ("show the weather in London", 2, "AUTO_EXECUTE", 0),
+        ("show the weather for London", 2, "AUTO_EXECUTE", 10),
+        # A CONFIRM answered by a new query for the same command
+        ("tidy my notes", 3, "CONFIRM", 100),
+        ("summarize notes", 3, "AUTO_EXECUTE", 110),
+        # Same words, but outside the window
+        ("summarize notes please", 3, "AUTO_EXECUTE", 500),
+    ])
+
+    assert labels == [False, True, False, True, True]